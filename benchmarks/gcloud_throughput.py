@@ -0,0 +1,135 @@
+"""
+Benchmark the throughput of `gcloud_client`'s GCS and Pub/Sub code paths offline.
+
+Runs against the local storage and Pub/Sub stand-ins in `cidc_api.shared.local_gcloud`,
+with a simulated per-request latency and bandwidth, so the effect of request counts and
+concurrency shows up the way it would against GCP - without any network access.
+
+Usage:
+    python benchmarks/gcloud_throughput.py [--objects 2000] [--latency 0.03] [--bandwidth 50e6]
+
+Uses the settings in .env, so run it from the repository root.
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import wait
+
+# Settings are read at import time, so configure the local backend before importing the API
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ["TESTING"] = "True"
+os.environ["GCLOUD_BACKEND"] = "local"
+
+TRIALS = [f"trial-{i}" for i in range(20)]
+EMAIL = "benchmark@email.com"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--objects", type=int, default=2000)
+    parser.add_argument("--object-bytes", type=int, default=10_000)
+    parser.add_argument("--latency", type=float, default=0.03)
+    parser.add_argument("--bandwidth", type=float, default=50e6)
+    parser.add_argument("--bundle-size", type=int, default=100)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="local_gcloud_")
+    os.environ["LOCAL_GCLOUD_ROOT"] = root
+    os.environ["LOCAL_GCLOUD_LATENCY"] = str(args.latency)
+    os.environ["LOCAL_GCLOUD_BANDWIDTH"] = str(args.bandwidth)
+
+    from cidc_api.config.settings import (
+        GOOGLE_ACL_DATA_BUCKET,
+        GOOGLE_EPHEMERAL_BUCKET,
+        GOOGLE_UPLOAD_BUCKET,
+    )
+    from cidc_api.shared import gcloud_client
+    from cidc_api.shared.local_gcloud import Latency
+    from cidc_api.resources.downloadable_files import build_compressed_batch
+
+    storage_client = gcloud_client._get_storage_client()
+    for bucket_name in [
+        GOOGLE_ACL_DATA_BUCKET,
+        GOOGLE_UPLOAD_BUCKET,
+        GOOGLE_EPHEMERAL_BUCKET,
+    ]:
+        storage_client.create_bucket(bucket_name)
+
+    # Seed the data bucket without simulated latency
+    print(f"seeding {args.objects} objects in {root}...")
+    storage_client.latency = Latency()
+    data_bucket = storage_client.bucket(GOOGLE_ACL_DATA_BUCKET)
+    object_names = [
+        f"{TRIALS[i % len(TRIALS)]}/wes/CTTTP{i:05d}.01/reads.bam"
+        for i in range(args.objects)
+    ]
+    data = os.urandom(args.object_bytes)
+    for name in object_names:
+        data_bucket.blob(name).upload_from_string(data)
+    storage_client.latency = Latency(args.latency, args.bandwidth)
+
+    # List every trial's wes prefix, as when granting access across all trials
+    gcloud_client._build_trial_upload_prefixes = lambda *_: [
+        f"{trial}/wes" for trial in TRIALS
+    ]
+
+    def upload_xlsx():
+        for i in range(10):
+            gcloud_client.upload_xlsx_to_gcs(
+                TRIALS[0], "manifests", "pbmc", io.BytesIO(data), f"moment-{i}"
+            )
+
+    def publish():
+        reports = gcloud_client.publish_artifact_uploads(object_names)
+        wait(reports)
+
+    benchmarks = [
+        (
+            "list blob names",
+            len(object_names),
+            lambda: list(gcloud_client.get_blob_names(None, "wes")),
+        ),
+        (
+            "grant ACLs",
+            len(object_names),
+            lambda: gcloud_client.grant_download_access_to_blob_names(
+                [EMAIL], object_names
+            ),
+        ),
+        (
+            "revoke ACLs",
+            len(object_names),
+            lambda: gcloud_client.revoke_download_access_from_blob_names(
+                [EMAIL], object_names
+            ),
+        ),
+        (
+            "sign URLs",
+            len(object_names),
+            lambda: gcloud_client.get_signed_urls(object_names),
+        ),
+        ("publish", len(object_names), publish),
+        ("upload xlsx", 10, upload_xlsx),
+        (
+            "build bundle",
+            args.bundle_size,
+            lambda: build_compressed_batch(object_names[: args.bundle_size]),
+        ),
+    ]
+
+    print(
+        f"simulating {args.latency * 1000:.0f}ms per request and {args.bandwidth / 1e6:.0f}MB/s\n"
+    )
+    print(f"{'operation':<20}{'count':>8}{'seconds':>10}{'per second':>12}")
+    for name, count, run in benchmarks:
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        print(f"{name:<20}{count:>8}{elapsed:>10.2f}{count / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Profile the import-time cost of the API, to keep worker cold starts fast.
+
+Imports `--module` (by default, the whole app) in a fresh interpreter with
+`python -X importtime` and reports the total import time, the packages that
+contribute the most to it, and the slowest individual imports. With `--budget`,
+exits with an error if the total exceeds that many seconds, so the check can
+run in CI.
+
+Usage:
+    python benchmarks/import_profile.py [--module cidc_api.app] [--top 15] [--budget 5]
+
+Runs with TESTING=True, so no secrets are fetched, but importing `cidc_api.app`
+still connects to the test database at TEST_POSTGRES_URI.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# e.g., "import time:       191 |        344 |   pandas.core.arrays"
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def profile_imports(module: str) -> list:
+    """Return (self seconds, cumulative seconds, depth, module name) for every import."""
+    env = {**os.environ, "TESTING": "True"}
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT,
+        env=env,
+        check=True,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    ).stderr
+
+    imports = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append(
+                (int(self_us) / 1e6, int(cumulative_us) / 1e6, len(indent), name)
+            )
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--module", default="cidc_api.app")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget", type=float, help="maximum total seconds")
+    args = parser.parse_args()
+
+    imports = profile_imports(args.module)
+    total = sum(self_s for self_s, *_ in imports)
+
+    by_package = defaultdict(float)
+    for self_s, _, _, name in imports:
+        by_package[name.split(".")[0]] += self_s
+
+    print(f"importing {args.module} took {total:.2f}s\n")
+    print(f"{'package':<40}{'seconds':>10}{'share':>8}")
+    for package, seconds in sorted(by_package.items(), key=lambda p: -p[1])[: args.top]:
+        print(f"{package:<40}{seconds:>10.2f}{seconds / total:>8.0%}")
+
+    print(f"\n{'slowest imports (cumulative)':<40}{'seconds':>10}")
+    for _, cumulative, _, name in sorted(imports, key=lambda i: -i[1])[: args.top]:
+        print(f"{name:<40}{cumulative:>10.2f}")
+
+    if args.budget is not None and total > args.budget:
+        sys.exit(f"\nimport time {total:.2f}s exceeds budget of {args.budget:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark how long it takes to read the relational records from a large PBMC manifest.
+
+Builds a manifest with `--rows` data rows by repeating the data rows of the example
+PBMC manifest, parses it once, then times `PbmcManifest.read` on the parsed rows, so
+only the work of turning rows into deduplicated `MetadataModel` instances is measured.
+
+Usage:
+    python benchmarks/pbmc_read.py [--rows 2000] [--runs 5]
+
+Uses the settings in .env, so run it from the repository root.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ["TESTING"] = "True"
+
+from xlsx_read import EXAMPLE_MANIFEST, build_manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    from cidc_api.models.templates import PbmcManifest, read_worksheet_rows
+
+    path = build_manifest(EXAMPLE_MANIFEST, args.rows)
+    try:
+        worksheet_rows = read_worksheet_rows(path)
+    finally:
+        os.remove(path)
+
+    times = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        records = PbmcManifest.read(worksheet_rows)
+        times.append(time.perf_counter() - start)
+
+    median = statistics.median(times)
+    print(f"read {args.rows} data rows into:")
+    for model, instances in records.items():
+        print(f"    {len(instances):>6} {model.__name__}")
+    print(
+        f"median {median:.3f}s over {args.runs} runs ({args.rows / median:.0f} rows/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark substring search over downloadable file object URLs and metadata.
+
+Builds a synthetic, million-row copy of the columns that `DownloadableFiles.build_file_filter`
+searches in a temporary table, then times the search query with and without the trigram
+indexes added in migration 7c2e4b90d1a3.
+
+Usage:
+    python benchmarks/search_downloadable_files.py [--rows 1000000] [--db-uri postgresql://...]
+
+Defaults to the database at TEST_POSTGRES_URI. Requires the pg_trgm extension.
+"""
+import argparse
+import os
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+load_dotenv()
+
+SETUP = """
+CREATE TEMPORARY TABLE bench_files (
+    id serial PRIMARY KEY,
+    object_url varchar NOT NULL,
+    additional_metadata jsonb NOT NULL
+);
+INSERT INTO bench_files (object_url, additional_metadata)
+SELECT
+    format(
+        '%s/%s/CTTT%sPP.%s/%s',
+        'trial-' || (i % 40),
+        (ARRAY['wes', 'rna', 'cytof', 'olink', 'ihc'])[1 + i % 5],
+        lpad((i % 100000)::text, 5, '0'),
+        lpad((i % 7)::text, 2, '0'),
+        (ARRAY['reads.bam', 'report.html', 'analysis.zip', 'npx.xlsx'])[1 + i % 4]
+    ),
+    jsonb_build_object(
+        'assays.wes.records.cimac_id', format('CTTT%sPP.%s', lpad((i % 100000)::text, 5, '0'), lpad((i % 7)::text, 2, '0')),
+        'assays.wes.records.sample_name', 'sample_' || i
+    )
+FROM generate_series(1, :rows) AS i;
+ANALYZE bench_files;
+"""
+
+INDEXES = """
+CREATE INDEX ON bench_files USING gin (object_url gin_trgm_ops);
+CREATE INDEX ON bench_files USING gin ((CAST(additional_metadata AS TEXT)) gin_trgm_ops);
+ANALYZE bench_files;
+"""
+
+SEARCH = """
+SELECT count(*) FROM (
+    SELECT id FROM bench_files
+    WHERE object_url ILIKE :pattern OR CAST(additional_metadata AS TEXT) ILIKE :pattern
+    LIMIT 200
+) q
+"""
+
+SEARCH_TERMS = ["CTTT01234PP", "sample_98765", "report.html", "trial-7/olink"]
+
+
+def time_searches(conn, repeats: int) -> dict:
+    timings = {}
+    for term in SEARCH_TERMS:
+        params = {"pattern": f"%{term}%"}
+        start = time.perf_counter()
+        for _ in range(repeats):
+            conn.execute(text(SEARCH), params).scalar()
+        timings[term] = (time.perf_counter() - start) / repeats * 1000
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--db-uri", default=os.environ.get("TEST_POSTGRES_URI"))
+    args = parser.parse_args()
+
+    engine = create_engine(args.db_uri)
+    with engine.connect() as conn:
+        print(f"building {args.rows} synthetic rows...")
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        start = time.perf_counter()
+        conn.execute(text(SETUP), rows=args.rows)
+        print(f"  done in {time.perf_counter() - start:.1f}s")
+
+        unindexed = time_searches(conn, args.repeats)
+
+        print("building trigram indexes...")
+        start = time.perf_counter()
+        conn.execute(text(INDEXES))
+        print(f"  done in {time.perf_counter() - start:.1f}s")
+
+        indexed = time_searches(conn, args.repeats)
+
+    print(f"\n{'search term':<20}{'seq scan (ms)':>16}{'trigram (ms)':>16}")
+    for term in SEARCH_TERMS:
+        print(f"{term:<20}{unindexed[term]:>16.1f}{indexed[term]:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
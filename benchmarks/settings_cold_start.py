@@ -0,0 +1,60 @@
+"""
+Measure cold-start time for loading the API's settings, which fetches its secrets.
+
+Each run imports `cidc_api.config.settings` in a fresh interpreter, so nothing is shared
+between runs except the on-disk secrets cache (if SECRETS_CACHE_KEY is set). Run it with
+the environment of a deployed instance, e.g. ENV, GOOGLE_SECRETS_BUCKET and credentials
+that can read the secrets bucket, and check out the revision to compare against to get
+a "before" measurement. To run it without a real bucket, point STORAGE_EMULATOR_HOST
+(and, for credentials, GCE_METADATA_HOST) at a local server that emulates them.
+
+Usage:
+    python benchmarks/settings_cold_start.py [--runs 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+IMPORT_SETTINGS = """
+import time
+start = time.perf_counter()
+import cidc_api.config.settings
+print(time.perf_counter() - start)
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    settings_times, process_times = [], []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SETTINGS],
+            cwd=REPO_ROOT,
+            check=True,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+        ).stdout
+        process_times.append(time.perf_counter() - start)
+        settings_times.append(float(output.strip().splitlines()[-1]))
+
+    print(f"{'':<20}{'median (s)':>12}{'min (s)':>12}{'max (s)':>12}")
+    for name, times in [
+        ("settings import", settings_times),
+        ("whole process", process_times),
+    ]:
+        print(
+            f"{name:<20}{statistics.median(times):>12.2f}{min(times):>12.2f}{max(times):>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark the time and memory it takes to read large metadata spreadsheets.
+
+Builds a manifest with `--rows` data rows by repeating the data rows of an example
+manifest, then compares loading it in openpyxl's full (editable) mode, as
+`MetadataTemplate.read` used to, against the streaming `read_worksheet_rows`.
+Memory is the peak traced by `tracemalloc` during a separate, untimed read.
+
+Usage:
+    python benchmarks/xlsx_read.py [--rows 10000] [--runs 3] [--manifest path/to/manifest.xlsx]
+
+Uses the settings in .env, so run it from the repository root.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ["TESTING"] = "True"
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+EXAMPLE_MANIFEST = os.path.join(
+    REPO_ROOT, "tests", "models", "templates", "examples", "pbmc_manifest.xlsx"
+)
+
+
+def build_manifest(example_path: str, rows: int) -> str:
+    """Save a copy of `example_path` with each worksheet's data rows repeated up to `rows` rows."""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(example_path)
+    for worksheet in workbook.worksheets:
+        data_rows = [
+            [cell.value for cell in row]
+            for row in worksheet.iter_rows()
+            if row[0].value == "#data" and any(c.value is not None for c in row[1:])
+        ]
+        for i in range(rows - len(data_rows)):
+            worksheet.append(data_rows[i % len(data_rows)] if data_rows else [])
+
+    _, path = tempfile.mkstemp(".xlsx")
+    workbook.save(path)
+    return path
+
+
+def read_full_workbook(path: str):
+    """Read every cell the way `MetadataTemplate.read` did before streaming."""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path)
+    return {
+        worksheet.title: [[cell.value for cell in row] for row in worksheet.iter_rows()]
+        for worksheet in workbook.worksheets
+    }
+
+
+def measure(read, path: str, runs: int):
+    """Return the median seconds over `runs` reads, and the peak bytes allocated by one more."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        read(path)
+        times.append(time.perf_counter() - start)
+
+    # Tracing allocations slows reads down a lot, so it's kept out of the timed runs
+    tracemalloc.start()
+    read(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return statistics.median(times), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--manifest", default=EXAMPLE_MANIFEST)
+    args = parser.parse_args()
+
+    from cidc_api.models.templates.core import read_worksheet_rows
+
+    path = build_manifest(args.manifest, args.rows)
+    try:
+        print(f"reading {args.rows} data rows ({os.path.getsize(path) / 1e6:.1f}MB)\n")
+        print(f"{'reader':<24}{'median (s)':>12}{'peak memory (MB)':>18}")
+        for name, read in [
+            ("full workbook", read_full_workbook),
+            ("read_worksheet_rows", read_worksheet_rows),
+        ]:
+            seconds, peak = measure(read, path, args.runs)
+            print(f"{name:<24}{seconds:>12.2f}{peak / 1e6:>18.1f}")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1 @@
-__version__ = "0.26.1"
+__version__ = "0.26.26"
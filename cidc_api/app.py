@@ -9,7 +9,13 @@ from .config.db import init_db
 from .config.settings import SETTINGS
 from .config.logging import get_logger
 from .shared.auth import validate_api_auth
+from .shared.outbox import init_outbox
+from .shared.ingestion_worker import init_ingestion_workers
+from .shared.bundle_worker import init_bundle_workers
+from .shared.upload_status import init_upload_status_listener
 from .resources import register_resources
+from .resources.downloadable_files import build_compressed_batch
+from .resources.upload_jobs import ingest_queued_manifest
 from .dashboards import register_dashboards
 
 logger = get_logger(__name__)
@@ -26,6 +32,18 @@ init_db(app)
 # Wire up the API
 register_resources(app)
 
+# Start publishing Pub/Sub messages staged by API requests
+init_outbox(app)
+
+# Start merging manifest uploads queued by API requests
+init_ingestion_workers(app, ingest_queued_manifest)
+
+# Start building compressed batches queued by API requests
+init_bundle_workers(app, build_compressed_batch)
+
+# Start listening for upload job status changes, for long-polling clients
+init_upload_status_listener(app)
+
 # Check that its auth configuration is validate
 validate_api_auth(app)
 
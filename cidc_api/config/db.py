@@ -2,6 +2,7 @@ from os import environ
 
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from alembic.script import ScriptDirectory
 from flask_migrate import Migrate, upgrade
 from sqlalchemy.engine.url import URL
 from sqlalchemy.ext.declarative import declarative_base
@@ -14,13 +15,47 @@ BaseModel = declarative_base(bind=db)
 db.Model = BaseModel
 
 
+class DatabaseNotMigratedError(Exception):
+    pass
+
+
 def init_db(app: Flask):
-    """Connect `app` to the database and run migrations"""
+    """
+    Connect `app` to the database and run migrations. If MIGRATE_ON_STARTUP is off,
+    only check that migrations have already been run (see `cidc_api.migrate`).
+    """
     db.init_app(app)
     db.Model = BaseModel
     Migrate(app, db, app.config["MIGRATIONS_PATH"])
     with app.app_context():
-        upgrade(app.config["MIGRATIONS_PATH"])
+        if app.config["MIGRATE_ON_STARTUP"]:
+            upgrade(app.config["MIGRATIONS_PATH"])
+        else:
+            check_db_revision(app.config["MIGRATIONS_PATH"])
+
+
+def check_db_revision(migrations_path: str):
+    """
+    Check that the database has been migrated to the latest revision in `migrations_path`,
+    raising a `DatabaseNotMigratedError` if it's behind. This takes a single query.
+
+    A database revision that isn't in `migrations_path` at all is assumed to be newer,
+    since during a deploy the database is migrated before older instances are replaced.
+    """
+    scripts = ScriptDirectory(migrations_path)
+    head = scripts.get_current_head()
+    current = db.session.execute("select version_num from alembic_version").scalar()
+    db.session.remove()
+
+    if current == head:
+        return
+
+    known_revisions = {script.revision for script in scripts.walk_revisions()}
+    if current in known_revisions or current is None:
+        raise DatabaseNotMigratedError(
+            f"database is at revision {current}, but the latest is {head}: "
+            "run `python -m cidc_api.migrate` before serving"
+        )
 
 
 def get_sqlalchemy_database_uri(testing: bool = False) -> str:
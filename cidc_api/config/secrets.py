@@ -1,6 +1,16 @@
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from os import environ
+from typing import Dict, Iterable, Optional
+
+from google.api_core.exceptions import NotFound
 from google.cloud import storage
 
+# Secrets managers are expensive to create, so share one per secrets bucket
+_secrets_managers: Dict[str, "CloudStorageSecretManager"] = {}
+
 
 def get_secrets_manager(is_testing=False):
     """Get a secrets manager based on whether the app is running in test mode"""
@@ -11,45 +21,124 @@ def get_secrets_manager(is_testing=False):
         return MagicMock()
     else:
         secrets_bucket = environ.get("GOOGLE_SECRETS_BUCKET")
-        return CloudStorageSecretManager(secrets_bucket)
+        if secrets_bucket not in _secrets_managers:
+            _secrets_managers[secrets_bucket] = CloudStorageSecretManager(
+                secrets_bucket, cache=SecretsFileCache.from_env(secrets_bucket)
+            )
+        return _secrets_managers[secrets_bucket]
 
 
 class SecretNotFoundError(Exception):
     pass
 
 
+class SecretsFileCache:
+    """
+        An encrypted on-disk cache of secrets, so that processes started on the same
+        instance (e.g., gunicorn workers) within `ttl` seconds of each other don't all
+        have to fetch secrets from Cloud Storage.
+
+        Requires the `cryptography` package. `key` is a Fernet key, e.g., from
+        `cryptography.fernet.Fernet.generate_key()`.
+    """
+
+    def __init__(self, path: str, key: str, ttl: int):
+        from cryptography.fernet import Fernet
+
+        self.path = path
+        self.fernet = Fernet(key)
+        self.ttl = ttl
+
+    @classmethod
+    def from_env(cls, bucket_name: str) -> Optional["SecretsFileCache"]:
+        """
+            Build a cache for secrets from `bucket_name` if SECRETS_CACHE_KEY is set.
+            SECRETS_CACHE_TTL (in seconds) and SECRETS_CACHE_DIR are optional.
+        """
+        key = environ.get("SECRETS_CACHE_KEY")
+        if not key:
+            return None
+        cache_dir = environ.get("SECRETS_CACHE_DIR", tempfile.gettempdir())
+        path = os.path.join(cache_dir, f"{bucket_name}.secrets")
+        return cls(path, key, ttl=int(environ.get("SECRETS_CACHE_TTL", 3600)))
+
+    def load(self) -> Dict[str, str]:
+        """
+            Load all cached secrets. Returns nothing if the cache is missing,
+            older than `ttl`, or can't be decrypted with this cache's key.
+        """
+        from cryptography.fernet import InvalidToken
+
+        try:
+            with open(self.path, "rb") as f:
+                token = f.read()
+            return json.loads(self.fernet.decrypt(token, ttl=self.ttl))
+        except (OSError, InvalidToken, ValueError):
+            return {}
+
+    def save(self, secrets: Dict[str, str]):
+        """Encrypt and cache `secrets`, replacing anything cached before."""
+        token = self.fernet.encrypt(json.dumps(secrets).encode("utf-8"))
+        # Write to a private temporary file, then move it into place,
+        # so that concurrent readers never see a partially written cache.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(token)
+        os.replace(tmp_path, self.path)
+
+
 class CloudStorageSecretManager:
     """
         Get and set secrets (e.g., API keys, db passwords) in Google Cloud Storage
         to leverage GCS's default at-rest encryption.
     """
 
-    def __init__(self, bucket_name):
+    def __init__(self, bucket_name, cache: Optional[SecretsFileCache] = None):
         """
             Initialize a CloudStorageSecretManager with a connection to a Cloud Storage bucket.
+            Secrets are kept in memory once fetched, and also in `cache`, if provided.
         """
         assert bucket_name, "a bucket name is required to manage secrets"
 
         self.bucket_name = bucket_name
-        self.bucket = storage.Client().get_bucket(bucket_name)
+        # This doesn't make a request; a missing bucket is reported when getting a secret
+        self.bucket = storage.Client().bucket(bucket_name)
+        self.cache = cache
+        self.secrets: Dict[str, str] = cache.load() if cache else {}
+
+    def _fetch(self, secret_name):
+        """Download a secret from Google Cloud Storage, without consulting any cache."""
+        try:
+            secret = self.bucket.blob(secret_name).download_as_bytes()
+        except NotFound:
+            raise SecretNotFoundError(
+                f'no secret "{secret_name}" in bucket "{self.bucket_name}'
+            )
+
+        return secret.decode("utf-8")
 
     def get(self, secret_name):
         """
             Try to find a secret in Google Cloud Storage.
             Raises a SecretNotFound exception if the secret doesn't exist.
         """
-        # Look for the secret in Cloud Storage
-        secret_blob = self.bucket.get_blob(secret_name)
+        return self.get_many([secret_name])[secret_name]
 
-        if not secret_blob:
-            raise SecretNotFoundError(
-                f'no secret "{secret_name}" in bucket "{self.bucket_name}'
-            )
-
-        # Download the secret_blob (as bytes) and decode to a string
-        secret = secret_blob.download_as_string().decode("utf-8")
+    def get_many(self, secret_names: Iterable[str]) -> Dict[str, str]:
+        """
+            Get several secrets at once, fetching any that aren't cached concurrently.
+            Raises a SecretNotFound exception if any of the secrets doesn't exist.
+        """
+        secret_names = list(secret_names)
+        missing = [name for name in secret_names if name not in self.secrets]
+        if missing:
+            with ThreadPoolExecutor(len(missing)) as pool:
+                fetched = dict(zip(missing, pool.map(self._fetch, missing)))
+            self.secrets.update(fetched)
+            if self.cache:
+                self.cache.save(self.secrets)
 
-        return secret
+        return {name: self.secrets[name] for name in secret_names}
 
     def set(self, secret_name, secret):
         """
@@ -57,3 +146,7 @@ class CloudStorageSecretManager:
         """
         blob = self.bucket.blob(secret_name)
         blob.upload_from_string(secret)
+
+        self.secrets[secret_name] = secret
+        if self.cache:
+            self.cache.save(self.secrets)
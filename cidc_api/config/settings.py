@@ -6,8 +6,7 @@ in the `SETTINGS` dictionary defined at the bottom of this file.
 """
 
 import tempfile
-import shutil
-from os import environ, path, mkdir
+from os import environ, path
 
 from dotenv import load_dotenv
 
@@ -35,14 +34,31 @@ PAGINATION_PAGE_SIZE = 25
 MAX_PAGINATION_PAGE_SIZE = 200
 INACTIVE_USER_DAYS = 60
 MAX_THREADPOOL_WORKERS = 32
+# The number of background workers per process for manifest uploads queued with "async"
+INGESTION_WORKERS = int(environ.get("INGESTION_WORKERS", 1))
+# The number of background workers per process for compressed batches requested with "async"
+BUNDLE_WORKERS = int(environ.get("BUNDLE_WORKERS", 1))
+# Generated templates are shared by all workers on an instance, and rebuilt when
+# gunicorn starts (see gunicorn.conf.py), so this directory isn't cleared here.
 TEMPLATES_DIR = path.join("/tmp", "templates")
-# Also, set up the directories for holding generated templates
-if path.exists(TEMPLATES_DIR):
-    shutil.rmtree(TEMPLATES_DIR)
-mkdir(TEMPLATES_DIR)
-for family in ["manifests", "metadata", "analyses"]:
-    family_dir = path.join(TEMPLATES_DIR, family)
-    mkdir(family_dir)
+TEMPLATES_MAX_AGE = 24 * 60 * 60  # seconds
+
+### Load secrets ###
+# Fetch every secret needed at startup in one concurrent batch, rather than one by one.
+# `get_sqlalchemy_database_uri` reads the DB password from the same (shared) manager.
+if not TESTING:
+    _secret_names = [
+        "PRISM_ENCRYPT_KEY",
+        "CSMS_BASE_URL",
+        "CSMS_TOKEN_URL",
+        "CSMS_CLIENT_SECRET",
+        "CSMS_CLIENT_ID",
+    ]
+    if not environ.get("GOOGLE_APPLICATION_CREDENTIALS"):
+        _secret_names.append("APP_ENGINE_CREDENTIALS")
+    if not environ.get("POSTGRES_URI"):
+        _secret_names.append("CLOUD_SQL_DB_PASS")
+    _secrets = get_secrets_manager().get_many(_secret_names)
 
 # Download the credentials file to a temporary file,
 # then set the GOOGLE_APPLICATION_CREDENTIALS env variable
@@ -53,16 +69,14 @@ for family in ["manifests", "metadata", "analyses"]:
 # fails with a credentials-related error unless this is explicitly
 # set.
 if not environ.get("GOOGLE_APPLICATION_CREDENTIALS") and not TESTING:
-    secret_manager = get_secrets_manager()
     _, creds_file_name = tempfile.mkstemp(".json")
     with open(creds_file_name, "w") as creds_file:
-        creds_file.write(secret_manager.get("APP_ENGINE_CREDENTIALS"))
+        creds_file.write(_secrets["APP_ENGINE_CREDENTIALS"])
     environ["GOOGLE_APPLICATION_CREDENTIALS"] = creds_file_name
 
 ### Configure prism encrypt ###
 if not TESTING:
-    secret_manager = get_secrets_manager()
-    PRISM_ENCRYPT_KEY = secret_manager.get("PRISM_ENCRYPT_KEY")
+    PRISM_ENCRYPT_KEY = _secrets["PRISM_ENCRYPT_KEY"]
 else:
     PRISM_ENCRYPT_KEY = environ.get("PRISM_ENCRYPT_KEY")
 
@@ -110,18 +124,37 @@ GOOGLE_MAX_DOWNLOAD_CONDITIONS = (GOOGLE_MAX_CONDITIONAL_OPERATORS + 1) * (
 )
 GOOGLE_AND_OPERATOR = " && "
 GOOGLE_OR_OPERATOR = " || "
+# Set GCLOUD_BACKEND to "local" to use the filesystem-backed storage and in-process
+# Pub/Sub stand-ins in `cidc_api.shared.local_gcloud`, e.g. for offline benchmarks.
+# LOCAL_GCLOUD_LATENCY is the simulated delay per API request in seconds, and
+# LOCAL_GCLOUD_BANDWIDTH the simulated transfer rate in bytes per second.
+GCLOUD_BACKEND = environ.get("GCLOUD_BACKEND", "gcloud")
+assert GCLOUD_BACKEND in (
+    "gcloud",
+    "local",
+), "GCLOUD_BACKEND environment variable must be 'gcloud' or 'local'"
+LOCAL_GCLOUD_ROOT = environ.get("LOCAL_GCLOUD_ROOT", path.join("/tmp", "local_gcloud"))
+LOCAL_GCLOUD_LATENCY = float(environ.get("LOCAL_GCLOUD_LATENCY", 0))
+LOCAL_GCLOUD_BANDWIDTH = (
+    float(environ["LOCAL_GCLOUD_BANDWIDTH"])
+    if environ.get("LOCAL_GCLOUD_BANDWIDTH")
+    else None
+)
 
 ### File paths ###
 this_directory = path.dirname(path.abspath(__file__))
 MIGRATIONS_PATH = path.join(this_directory, "..", "..", "migrations")
+# Whether to migrate the database when the app starts. If this is off (as it should be
+# for serving), app instances only check that the database is already migrated, and
+# migrations run separately before deploys via `python -m cidc_api.migrate`.
+MIGRATE_ON_STARTUP = environ.get("MIGRATE_ON_STARTUP", "True") == "True"
 
 # CSMS Integration Values
 if not TESTING:
-    secret_manager = get_secrets_manager()
-    CSMS_BASE_URL = secret_manager.get("CSMS_BASE_URL")
-    CSMS_TOKEN_URL = secret_manager.get("CSMS_TOKEN_URL")
-    CSMS_CLIENT_SECRET = secret_manager.get("CSMS_CLIENT_SECRET")
-    CSMS_CLIENT_ID = secret_manager.get("CSMS_CLIENT_ID")
+    CSMS_BASE_URL = _secrets["CSMS_BASE_URL"]
+    CSMS_TOKEN_URL = _secrets["CSMS_TOKEN_URL"]
+    CSMS_CLIENT_SECRET = _secrets["CSMS_CLIENT_SECRET"]
+    CSMS_CLIENT_ID = _secrets["CSMS_CLIENT_ID"]
 else:
     CSMS_BASE_URL = environ.get("CSMS_BASE_URL")
     CSMS_TOKEN_URL = environ.get("CSMS_TOKEN_URL")
@@ -1,8 +1,68 @@
+import threading
+from typing import Dict, Optional
+
 from flask import Flask
+from flask_cors import CORS
+
+from ..config.db import db
+
+# All dashboards are served under this path prefix
+DASHBOARDS_PREFIX = "/dashboards/"
+
+
+def init_dashboard_servers(app: Flask) -> Dict[str, Flask]:
+    """
+    Import the dashboards and configure the Flask server that each one runs on
+    to share `app`'s configuration, database, CORS policy and error handlers.
+    Returns a mapping from each dashboard's base URL to its server.
+    """
+    # Dash, its components and pandas are slow to import, so this is deferred until
+    # a dashboard is first requested rather than done on application startup.
+    from .shipments import shipments_dashboard
+
+    servers = {}
+    for dashboard in [shipments_dashboard]:
+        server = dashboard.server
+        server.config.update(app.config)
+        db.init_app(server)
+        CORS(server, resources={r"*": {"origins": app.config["ALLOWED_CLIENT_URL"]}})
+        # Handle errors like the rest of the API does, e.g., by formatting them as JSON
+        for handlers in app.error_handler_spec.get(None, {}).values():
+            for exc_class, handler in handlers.items():
+                server.register_error_handler(exc_class, handler)
+        servers[dashboard.config.url_base_pathname] = server
+
+    return servers
+
+
+class LazyDashboards:
+    """
+    WSGI middleware that sends requests for dashboard URLs to the dashboards' servers,
+    loading the dashboards on the first such request, and all other requests to `app`.
+    """
+
+    def __init__(self, app: Flask):
+        self.app = app
+        self.wsgi_app = app.wsgi_app
+        self._servers: Optional[Dict[str, Flask]] = None
+        self._lock = threading.Lock()
+
+    def _get_servers(self) -> Dict[str, Flask]:
+        if self._servers is None:
+            with self._lock:
+                if self._servers is None:
+                    self._servers = init_dashboard_servers(self.app)
+        return self._servers
 
-from .shipments import shipments_dashboard
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        if path.startswith(DASHBOARDS_PREFIX):
+            for base_url, server in self._get_servers().items():
+                if path.startswith(base_url) or f"{path}/" == base_url:
+                    return server.wsgi_app(environ, start_response)
+        return self.wsgi_app(environ, start_response)
 
 
 def register_dashboards(app: Flask):
     """Add dashboard endpoints to the provided Flask app instance."""
-    shipments_dashboard.init_app(app)
+    app.wsgi_app = LazyDashboards(app)
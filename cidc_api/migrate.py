@@ -0,0 +1,28 @@
+"""
+Migrate the database to the latest revision, then exit.
+
+Run this once before deploying, so that serving instances can start with
+MIGRATE_ON_STARTUP=False and skip migrations:
+
+    python -m cidc_api.migrate
+"""
+from flask import Flask
+
+from .config.db import init_db
+from .config.settings import SETTINGS
+from .config.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def migrate():
+    """Run all pending migrations on the database configured in settings."""
+    app = Flask(__name__)
+    app.config.update(SETTINGS)
+    app.config["MIGRATE_ON_STARTUP"] = True
+    init_db(app)
+    logger.info("database migrated to the latest revision")
+
+
+if __name__ == "__main__":
+    migrate()
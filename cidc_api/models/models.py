@@ -1,5 +1,7 @@
 __all__ = [
     "BaseModel",
+    "BundleJobs",
+    "BundleJobStatus",
     "CIDCRole",
     "Column",
     "CommonColumns",
@@ -8,6 +10,7 @@ __all__ = [
     "IntegrityError",
     "IAMException",
     "NoResultFound",
+    "OutboxMessages",
     "Permissions",
     "prism",  # for CFns
     "ROLES",
@@ -24,26 +27,39 @@ __all__ = [
 
 from collections import defaultdict
 import re
+import json
 import hashlib
 import os
 
 os.environ["TZ"] = "UTC"
 from datetime import datetime, timedelta
 from enum import Enum as EnumBaseClass
-from functools import wraps
-from typing import Any, BinaryIO, Dict, Optional, List, Union, Callable, Tuple
+from functools import lru_cache, wraps
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterator,
+    Optional,
+    List,
+    Union,
+    Callable,
+    Tuple,
+)
 
-import pandas as pd
 from flask import current_app as app
 from google.cloud.storage import Blob
 from sqlalchemy import (
     and_,
+    cast,
     Column,
     Boolean,
     DateTime,
     Integer,
     BigInteger,
+    LargeBinary,
     String,
+    Text,
     Enum,
     Index,
     func,
@@ -69,7 +85,7 @@ from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.orm.session import Session
 from sqlalchemy.orm.query import Query
 from sqlalchemy.sql import text
-from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.dialects.postgresql import JSONB, UUID, insert as postgresql_insert
 from sqlalchemy.engine import ResultProxy
 
 from cidc_schemas import prism, unprism, json_validation
@@ -93,9 +109,11 @@ from ..config.settings import (
 )
 from ..shared import emails
 from ..shared.gcloud_client import (
+    batch_iam_changes,
     grant_lister_access,
     grant_download_access,
     publish_artifact_upload,
+    publish_artifact_uploads,
     refresh_intake_access,
     revoke_download_access,
     revoke_intake_access,
@@ -404,7 +422,7 @@ class Users(CommonColumns):
 
     @staticmethod
     @with_default_session
-    def get_data_access_report(io: BinaryIO, session: Session) -> pd.DataFrame:
+    def get_data_access_report(io: BinaryIO, session: Session) -> "pd.DataFrame":
         """
         Generate an XLSX containing an overview of trial/assay data access permissions
         for every active user in the database. The report will have a sheet per protocol
@@ -414,6 +432,8 @@ class Users(CommonColumns):
         Save an excel file to the given file handler, and return the pandas dataframe
         used to generate that excel file.
         """
+        import pandas as pd
+
         user_columns = (Users.email, Users.organization, Users.role)
 
         query = (
@@ -597,31 +617,36 @@ class Permissions(CommonColumns):
         for perm in perms_to_delete:
             session.delete(perm)
 
-        # Always commit, because we don't want to grant IAM download unless this insert succeeds.
-        super().insert(session=session, commit=True, compute_etag=compute_etag)
+        super().insert(session=session, commit=False, compute_etag=compute_etag)
 
         # Don't make any GCS changes if this user doesn't have download access
         if is_network_viewer:
+            session.commit()
             return
 
+        # Stage ACL download permission changes in the outbox, so that they're
+        # published if and only if this insert succeeds. The lister role is granted
+        # before committing, so if that fails, rolling back discards the insert, the
+        # related deletions and the staged ACL changes together.
+        outbox = OutboxMessages.writer(session)
         try:
-            # Grant ACL download permissions in GCS
-            # if they have any download permissions, they need the CIDC Lister role
-            grant_lister_access(grantee.email)
-            grant_download_access(grantee.email, self.trial_id, self.upload_type)
+            grant_download_access(
+                grantee.email, self.trial_id, self.upload_type, outbox=outbox
+            )
             # Remove permissions staged for deletion, if any
             for perm in perms_to_delete:
-                revoke_download_access(grantee.email, perm.trial_id, perm.upload_type)
+                revoke_download_access(
+                    grantee.email, perm.trial_id, perm.upload_type, outbox=outbox
+                )
+            # if they have any download permissions, they need the CIDC Lister role
+            grant_lister_access(grantee.email)
         except Exception as e:
-            # Add back deleted permissions, if any
-            for perm in perms_to_delete:
-                perm.insert(session=session)
-            # Delete the just-created permissions record
-            super().delete(session=session)
-
+            session.rollback()
             logger.warning(str(e))
             raise IAMException("IAM grant failed.") from e
 
+        session.commit()
+
     @with_default_session
     def delete(
         self, deleted_by: Union[Users, int], session: Session, commit: bool = True
@@ -646,8 +671,14 @@ class Permissions(CommonColumns):
         # Only make GCS ACL changes if this user has download access
         if grantee.role != CIDCRole.NETWORK_VIEWER.value:
             try:
-                # Revoke ACL permission in GCS
-                revoke_download_access(grantee.email, self.trial_id, self.upload_type)
+                # Stage the ACL permission revocation in GCS, to be published
+                # once this record's deletion commits.
+                revoke_download_access(
+                    grantee.email,
+                    self.trial_id,
+                    self.upload_type,
+                    outbox=OutboxMessages.writer(session),
+                )
 
                 # If the permission to delete is the last one, also revoke Lister access
                 filter_ = lambda q: q.filter(Permissions.granted_to_user == grantee.id)
@@ -656,6 +687,7 @@ class Permissions(CommonColumns):
                     revoke_lister_access(grantee.email)
 
             except Exception as e:
+                session.rollback()
                 raise IAMException(
                     "IAM revoke failed, and permission db record not removed."
                 ) from e
@@ -869,20 +901,22 @@ class Permissions(CommonColumns):
         sorted_permissions = defaultdict(lambda: defaultdict(list))
         # also handle user lister IAM permission if granting
         already_listed: List[str] = []
-        for perm, user in perms_and_users:
-            # make sure we put it only for the desired scope
-            sorted_permissions[trial_id if trial_id else perm.trial_id][
-                upload_type if upload_type else perm.upload_type
-            ].append(user.email)
-
-            # if granting things, grant_lister_access on every user
-            # idempotent, amounting to "add or refresh"
-            if grant and user.email not in already_listed:
-                grant_lister_access(user.email)
-                already_listed.append(user.email)
-            # if un-granting ie revoking things, don't call revoke_lister_access
-            # with the filtering, we don't know if the users have any other
-            # ACL permissions remaining that weren't affected here
+        # apply all lister grants with a single IAM policy update
+        with batch_iam_changes():
+            for perm, user in perms_and_users:
+                # make sure we put it only for the desired scope
+                sorted_permissions[trial_id if trial_id else perm.trial_id][
+                    upload_type if upload_type else perm.upload_type
+                ].append(user.email)
+
+                # if granting things, grant_lister_access on every user
+                # idempotent, amounting to "add or refresh"
+                if grant and user.email not in already_listed:
+                    grant_lister_access(user.email)
+                    already_listed.append(user.email)
+                # if un-granting ie revoking things, don't call revoke_lister_access
+                # with the filtering, we don't know if the users have any other
+                # ACL permissions remaining that weren't affected here
 
         # now that we've filtered and separated, just do them all
         # new values will override passed args
@@ -899,11 +933,20 @@ class ValidationMultiError(Exception):
     pass
 
 
-trial_metadata_validator: json_validation._Validator = (
-    json_validation.load_and_validate_schema(
+@lru_cache(maxsize=None)
+def get_trial_metadata_validator() -> json_validation._Validator:
+    """Load the clinical trial schema validator on first use, since loading it is slow."""
+    return json_validation.load_and_validate_schema(
         "clinical_trial.json", return_validator=True
     )
-)
+
+
+def __getattr__(name: str) -> Any:
+    # `trial_metadata_validator` used to be built on import, so keep it importable
+    if name == "trial_metadata_validator":
+        return get_trial_metadata_validator()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 FileBundle = Dict[str, Dict[FilePurpose, List[int]]]
 
@@ -919,7 +962,7 @@ class TrialMetadata(CommonColumns):
 
     @staticmethod
     def validate_metadata_json(metadata_json: dict) -> dict:
-        errs = trial_metadata_validator.iter_error_messages(metadata_json)
+        errs = get_trial_metadata_validator().iter_error_messages(metadata_json)
         messages = list(f"'metadata_json': {err}" for err in errs)
         if messages:
             raise ValidationMultiError(messages)
@@ -957,6 +1000,8 @@ class TrialMetadata(CommonColumns):
                 session.query(TrialMetadata)
                 .filter_by(trial_id=trial_id)
                 .with_for_update()
+                # If the trial was already loaded, it may have changed before the lock
+                .populate_existing()
                 .one()
             )
         except NoResultFound as e:
@@ -980,40 +1025,65 @@ class TrialMetadata(CommonColumns):
     @staticmethod
     @with_default_session
     def patch_manifest(
-        trial_id: str, manifest_patch: dict, session: Session, commit: bool = False
+        trial_id: str,
+        manifest_patch: dict,
+        session: Session,
+        commit: bool = False,
+        merged_metadata: Optional[dict] = None,
+        merged_etag: Optional[str] = None,
     ):
         """
         Applies manifest updates to the metadata object from the trial with id `trial_id`.
+        See `_patch_trial_metadata` for `merged_metadata` and `merged_etag`.
 
         TODO: apply this update directly to the not-yet-existent TrialMetadata.assays field
         """
         return TrialMetadata._patch_trial_metadata(
-            trial_id, manifest_patch, session=session, commit=commit
+            trial_id,
+            manifest_patch,
+            session=session,
+            commit=commit,
+            merged_metadata=merged_metadata,
+            merged_etag=merged_etag,
         )
 
     @staticmethod
     @with_default_session
     def _patch_trial_metadata(
-        trial_id: str, json_patch: dict, session: Session, commit: bool = False
+        trial_id: str,
+        json_patch: dict,
+        session: Session,
+        commit: bool = False,
+        merged_metadata: Optional[dict] = None,
+        merged_etag: Optional[str] = None,
     ):
         """
         Applies updates to the metadata object from the trial with id `trial_id`
         and commits current session.
 
+        If `merged_metadata` is the result of an error-free `prism.merge_clinical_trial_metadata`
+        of `json_patch` into the trial when its `_etag` was `merged_etag`, and the trial is
+        unchanged once it's locked, `merged_metadata` is saved without merging again.
+
         TODO: remove this function and dependency on it, in favor of separate assay
         and manifest patch strategies.
         """
 
         trial = TrialMetadata.select_for_update_by_trial_id(trial_id, session=session)
 
-        # Merge assay metadata into the existing clinical trial metadata
-        updated_metadata, errs = prism.merge_clinical_trial_metadata(
-            json_patch, trial.metadata_json
-        )
-        if errs:
-            raise ValidationMultiError(errs)
-        # Save updates to trial record
-        trial.safely_set_metadata_json(updated_metadata)
+        if merged_metadata is not None and trial._etag == merged_etag:
+            # The merge already validated `merged_metadata` against the trial schema
+            updated_metadata = merged_metadata
+            trial.metadata_json = updated_metadata
+        else:
+            # Merge assay metadata into the existing clinical trial metadata
+            updated_metadata, errs = prism.merge_clinical_trial_metadata(
+                json_patch, trial.metadata_json
+            )
+            if errs:
+                raise ValidationMultiError(errs)
+            # Save updates to trial record
+            trial.safely_set_metadata_json(updated_metadata)
         trial._etag = make_etag([trial.trial_id, updated_metadata])
 
         session.add(trial)
@@ -1699,6 +1769,8 @@ class TrialMetadata(CommonColumns):
         summaries = [summary for (summary,) in session.execute(combined_query)]
 
         # Shortcut to impute 0 values for assays where trials don't yet have data
+        import pandas as pd
+
         summaries = pd.DataFrame(summaries).fillna(0).to_dict("records")
 
         return summaries
@@ -1706,6 +1778,8 @@ class TrialMetadata(CommonColumns):
 
 class UploadJobStatus(EnumBaseClass):
     STARTED = "started"
+    # Set by the API for manifest uploads to be merged by a background worker
+    QUEUED = "queued"
     # Set by CLI based on GCS upload results
     UPLOAD_COMPLETED = "upload-completed"
     UPLOAD_FAILED = "upload-failed"
@@ -1729,6 +1803,10 @@ class UploadJobStatus(EnumBaseClass):
         if c != t:
             if t == cls.STARTED:
                 return False
+            if t == cls.QUEUED and c != cls.STARTED:
+                return False
+            if c == cls.QUEUED and t not in merge_statuses:
+                return False
             if c in upload_statuses:
                 if t not in merge_statuses:
                     return False
@@ -1758,6 +1836,10 @@ class UploadJobs(CommonColumns):
             ["trial_metadata.trial_id"],
             name="assay_uploads_trial_id_fkey",
         ),
+        # Workers claim the oldest queued job, so index just the queued ones
+        Index(
+            "upload_jobs_queued_idx", "id", postgresql_where=text("status = 'queued'")
+        ),
     )
 
     # The current status of the upload job
@@ -1775,6 +1857,8 @@ class UploadJobs(CommonColumns):
     gcs_file_map = Column(JSONB, nullable=True)
     # track the GCS URI of the .xlsx file used for this upload
     gcs_xlsx_uri = Column(String, nullable=True)
+    # The .xlsx file for a queued upload, held until a worker has processed it
+    queued_xlsx = Column(LargeBinary, nullable=True)
     # The parsed JSON metadata blob associated with this upload
     metadata_patch = Column(JSONB, nullable=False)
     # The type of upload (pbmc, wes, olink, wes_analysis, ...)
@@ -1811,10 +1895,19 @@ class UploadJobs(CommonColumns):
         assert TESTING, "status_no_validation should only be used in tests"
         self._status = status
 
-    def alert_upload_success(self, trial: TrialMetadata):
-        """Send an email notification that an upload has succeeded."""
+    @with_default_session
+    def alert_upload_success(self, trial: TrialMetadata, session: Session):
+        """
+        Stage an email notification that an upload has succeeded in `session`'s outbox.
+        The email is sent once `session` is committed.
+        """
         # Send admin notification email
-        emails.new_upload_alert(self, trial.metadata_json, send_email=True)
+        emails.new_upload_alert(
+            self,
+            trial.metadata_json,
+            send_email=True,
+            outbox=OutboxMessages.writer(session),
+        )
 
     def upload_uris_with_data_uris_with_uuids(self):
         for upload_uri, uuid in (self.gcs_file_map or {}).items():
@@ -1859,11 +1952,16 @@ class UploadJobs(CommonColumns):
             gcs_xlsx_uri=gcs_xlsx_uri,
             status=status,
         )
-        job.insert(session=session, commit=commit)
+        job.insert(session=session, commit=False)
 
         if send_email:
-            trial = TrialMetadata.find_by_trial_id(trial_id)
-            job.alert_upload_success(trial)
+            # The email includes the job's ID, so make sure it has one
+            session.flush()
+            trial = TrialMetadata.find_by_trial_id(trial_id, session=session)
+            job.alert_upload_success(trial, session=session)
+
+        if commit:
+            session.commit()
 
         return job
 
@@ -1931,11 +2029,128 @@ class UploadJobs(CommonColumns):
             )
         self.status = UploadJobStatus.MERGE_COMPLETED.value
 
+        if send_email:
+            self.alert_upload_success(trial, session=session)
+
         if commit:
             session.commit()
 
-        if send_email:
-            self.alert_upload_success(trial)
+
+class BundleJobStatus(EnumBaseClass):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+BUNDLE_JOB_STATUSES = [s.value for s in BundleJobStatus]
+
+
+class BundleJobs(CommonColumns):
+    """
+    Tracks the state of compressed file bundles that are built in the background
+    rather than inside the request that asked for them.
+    """
+
+    __tablename__ = "bundle_jobs"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["requester_email"],
+            ["users.email"],
+            name="bundle_jobs_requester_email_fkey",
+            onupdate="CASCADE",
+            ondelete="CASCADE",
+        ),
+    )
+
+    status = Column(
+        Enum(*BUNDLE_JOB_STATUSES, name="bundle_job_status"),
+        nullable=False,
+        default=BundleJobStatus.QUEUED.value,
+    )
+    # Text containing feedback on why the job status is what it is
+    status_details = Column(String, nullable=True)
+    # The user who requested this bundle
+    requester_email = Column(String, nullable=False, index=True)
+    # The (already permission-filtered) object URLs to include in the bundle
+    object_urls = Column(JSONB, nullable=False)
+    # The name of the finished archive in GOOGLE_EPHEMERAL_BUCKET
+    bundle_name = Column(String, nullable=True)
+
+    @staticmethod
+    @with_default_session
+    def create(
+        requester_email: str,
+        object_urls: List[str],
+        session: Session,
+        commit: bool = True,
+    ) -> "BundleJobs":
+        """Create a new queued bundle job for the given object URLs."""
+        job = BundleJobs(
+            requester_email=requester_email,
+            object_urls=object_urls,
+            status=BundleJobStatus.QUEUED.value,
+        )
+        job.insert(session=session, commit=commit)
+
+        return job
+
+    @with_default_session
+    def set_status(
+        self,
+        status: str,
+        session: Session,
+        status_details: Optional[str] = None,
+        bundle_name: Optional[str] = None,
+        commit: bool = True,
+    ):
+        """Record a status change for this job, along with any details or output."""
+        self.status = BundleJobStatus(status).value
+        self.status_details = status_details
+        if bundle_name is not None:
+            self.bundle_name = bundle_name
+        self._updated = datetime.now()
+        self._etag = self.compute_etag()
+
+        session.merge(self)
+        if commit:
+            session.commit()
+
+
+class OutboxMessages(CommonColumns):
+    """
+    Pub/Sub messages waiting to be published. Messages are written in the same
+    transaction as the database changes they announce, then published by a background
+    dispatcher (see `cidc_api.shared.outbox`), so delivery is at-least-once.
+    """
+
+    __tablename__ = "outbox_messages"
+
+    # The Pub/Sub topic name (not path) to publish to
+    topic = Column(String, nullable=False)
+    # The message content
+    data = Column(String, nullable=False)
+    # The number of failed attempts to publish this message
+    attempts = Column(Integer, nullable=False, default=0)
+    # The error from the most recent failed attempt
+    last_error = Column(String, nullable=True)
+    # The earliest time the dispatcher should (re)try publishing this message
+    available_at = Column(DateTime, nullable=False, default=func.now(), index=True)
+
+    @staticmethod
+    def writer(session: Session) -> Callable[[str, str], None]:
+        """
+        Build an `outbox` for the `gcloud_client.publish_*` helpers that stages messages
+        in `session`, to be committed or rolled back with the rest of the transaction.
+        """
+
+        def write(content: str, topic: str):
+            message = OutboxMessages(topic=topic, data=content)
+            message.insert(session=session, commit=False)
+            # Let the dispatcher know to check for new messages once this commits
+            session.info["outbox_pending"] = True
+
+        return write
 
 
 class DownloadableFiles(CommonColumns):
@@ -1982,8 +2197,33 @@ class DownloadableFiles(CommonColumns):
     file_name = Column(String, nullable=True)
     data_format = Column(String, nullable=True)
 
+    # Trigram indexes supporting substring search over object URLs and a text
+    # projection of additional metadata (see `additional_metadata_text`).
+    # NOTE: these require the pg_trgm extension.
+    _object_url_trgm_idx = Index(
+        "downloadable_files_object_url_trgm_idx",
+        object_url,
+        postgresql_using="gin",
+        postgresql_ops={"object_url": "gin_trgm_ops"},
+    )
+    _additional_metadata_trgm_idx = Index(
+        "downloadable_files_additional_metadata_trgm_idx",
+        cast(additional_metadata, Text).label("additional_metadata_text"),
+        postgresql_using="gin",
+        postgresql_ops={"additional_metadata_text": "gin_trgm_ops"},
+    )
+
     FILE_EXT_REGEX = r"\.([^./]*(\.gz)?)$"
 
+    @hybrid_property
+    def additional_metadata_text(self):
+        return json.dumps(self.additional_metadata)
+
+    @additional_metadata_text.expression
+    def additional_metadata_text(cls):
+        # This must match the expression in `_additional_metadata_trgm_idx`
+        return cast(cls.additional_metadata, Text)
+
     @hybrid_property
     def file_ext(self):
         match = re.search(self.FILE_EXT_REGEX, self.object_url)
@@ -2092,7 +2332,10 @@ class DownloadableFiles(CommonColumns):
 
     @staticmethod
     def build_file_filter(
-        trial_ids: List[str] = [], facets: List[List[str]] = [], user: Users = None
+        trial_ids: List[str] = [],
+        facets: List[List[str]] = [],
+        user: Users = None,
+        search: Optional[str] = None,
     ) -> Callable[[Query], Query]:
         """
         Build a file filter function based on the provided parameters. The resultant
@@ -2105,6 +2348,8 @@ class DownloadableFiles(CommonColumns):
             analysis_friendly: if True, the filter will include only files that are "analysis-friendly".
             non_admin_user_id: if provided, the filter will include only files that satisfy
                 this user's data access permissions.
+            search: if provided, the filter will include only files whose object URL or
+                additional metadata contain this string (case-insensitive).
         Returns:
             A function that adds filters to a query against the DownloadableFiles table.
         """
@@ -2114,6 +2359,15 @@ class DownloadableFiles(CommonColumns):
         if facets:
             facet_groups = get_facet_groups_for_paths(facets)
             file_filters.append(DownloadableFiles.facet_group.in_(facet_groups))
+        if search:
+            # Escape LIKE wildcards so the search string is matched literally
+            pattern = "%{}%".format(re.sub(r"([\\%_])", r"\\\1", search))
+            file_filters.append(
+                or_(
+                    DownloadableFiles.object_url.ilike(pattern),
+                    DownloadableFiles.additional_metadata_text.ilike(pattern),
+                )
+            )
         # Admins and NCI biobank users can view all files
         if user and not user.is_admin() and not user.is_nci_user():
             permissions = Permissions.find_for_user(user.id)
@@ -2142,21 +2396,13 @@ class DownloadableFiles(CommonColumns):
         return filter_files
 
     @staticmethod
-    @with_default_session
-    def create_from_metadata(
+    def _filter_file_metadata(
         trial_id: str,
         upload_type: str,
         file_metadata: dict,
-        session: Session,
-        additional_metadata: Optional[dict] = None,
-        commit: bool = True,
-        alert_artifact_upload: bool = False,
-    ):
-        """
-        Create a new DownloadableFiles record from artifact metadata.
-        """
-
-        # Filter out keys that aren't columns
+        additional_metadata: Optional[dict],
+    ) -> dict:
+        """Build DownloadableFiles column values from artifact metadata, dropping keys that aren't columns."""
         supported_columns = DownloadableFiles.__table__.columns.keys()
         filtered_metadata = {
             "trial_id": trial_id,
@@ -2169,6 +2415,25 @@ class DownloadableFiles(CommonColumns):
                 filtered_metadata[key] = value
         # TODO maybe put non supported stuff from file_metadata to some misc jsonb column?
 
+        return filtered_metadata
+
+    @staticmethod
+    @with_default_session
+    def create_from_metadata(
+        trial_id: str,
+        upload_type: str,
+        file_metadata: dict,
+        session: Session,
+        additional_metadata: Optional[dict] = None,
+        commit: bool = True,
+        alert_artifact_upload: bool = False,
+    ):
+        """
+        Create a new DownloadableFiles record from artifact metadata.
+        """
+        filtered_metadata = DownloadableFiles._filter_file_metadata(
+            trial_id, upload_type, file_metadata, additional_metadata
+        )
         etag = make_etag(filtered_metadata.values())
 
         object_url = filtered_metadata["object_url"]
@@ -2185,13 +2450,86 @@ class DownloadableFiles(CommonColumns):
         else:
             df = DownloadableFiles(_etag=etag, **filtered_metadata)
 
-        df.insert(session=session, commit=commit)
+        df.insert(session=session, commit=False)
 
         if alert_artifact_upload:
-            publish_artifact_upload(object_url)
+            publish_artifact_upload(object_url, outbox=OutboxMessages.writer(session))
+
+        if commit:
+            session.commit()
 
         return df
 
+    @staticmethod
+    @with_default_session
+    def bulk_create_from_metadata(
+        trial_id: str,
+        upload_type: str,
+        files: List[Tuple[dict, Optional[dict]]],
+        session: Session,
+        commit: bool = True,
+        alert_artifact_upload: bool = False,
+        chunk_size: int = 500,
+    ) -> Dict[str, int]:
+        """
+        Create or update many DownloadableFiles records from artifact metadata at once.
+        `files` is a list of (file_metadata, additional_metadata) pairs, as would be
+        passed to `create_from_metadata`.
+
+        Records are upserted `chunk_size` at a time with `INSERT ... ON CONFLICT (object_url)
+        DO UPDATE`, and artifact upload notifications (if requested) are staged in the
+        outbox in the same transaction.
+
+        Returns a mapping from object_url to record ID.
+        """
+        table = DownloadableFiles.__table__
+
+        # Build one row per object_url. Postgres won't update the same row twice
+        # in one statement, so later entries for an object_url take precedence.
+        rows_by_url = {}
+        for file_metadata, additional_metadata in files:
+            row = DownloadableFiles._filter_file_metadata(
+                trial_id, upload_type, file_metadata, additional_metadata
+            )
+            row["_etag"] = make_etag(row.values())
+            # Core inserts skip ORM validators, so apply the default here
+            row["additional_metadata"] = (
+                {} if additional_metadata in ["null", None, {}] else additional_metadata
+            )
+            rows_by_url[row["object_url"]] = row
+        if not rows_by_url:
+            return {}
+
+        # Multi-row VALUES clauses need every row to share the same keys, so group
+        # rows by the keys they set. Like `create_from_metadata`, an existing record
+        # is only updated in the columns its entry supplies.
+        groups: Dict[Tuple[str, ...], List[dict]] = defaultdict(list)
+        for row in rows_by_url.values():
+            groups[tuple(sorted(row))].append(row)
+
+        ids_by_url = {}
+        for keys, rows in groups.items():
+            for i in range(0, len(rows), chunk_size):
+                insert_stmt = postgresql_insert(table).values(rows[i : i + chunk_size])
+                upsert_stmt = insert_stmt.on_conflict_do_update(
+                    index_elements=[table.c.object_url],
+                    set_={
+                        **{key: insert_stmt.excluded[key] for key in keys},
+                        "_updated": func.now(),
+                    },
+                ).returning(table.c.object_url, table.c.id)
+                ids_by_url.update(dict(session.execute(upsert_stmt).fetchall()))
+
+        if alert_artifact_upload:
+            publish_artifact_uploads(
+                list(ids_by_url.keys()), outbox=OutboxMessages.writer(session)
+            )
+
+        if commit:
+            session.commit()
+
+        return ids_by_url
+
     @staticmethod
     @with_default_session
     def create_from_blob(
@@ -2230,10 +2568,13 @@ class DownloadableFiles(CommonColumns):
         df.crc32c_hash = blob.crc32c
         df.uploaded_timestamp = blob.time_created
 
-        df.insert(session=session, commit=commit)
+        df.insert(session=session, commit=False)
 
         if alert_artifact_upload:
-            publish_artifact_upload(blob.name)
+            publish_artifact_upload(blob.name, outbox=OutboxMessages.writer(session))
+
+        if commit:
+            session.commit()
 
         return df
 
@@ -2256,6 +2597,34 @@ class DownloadableFiles(CommonColumns):
         query = filter_(query)
         return [r[0] for r in query.all()]
 
+    @classmethod
+    @with_default_session
+    def stream_object_urls(
+        cls,
+        ids: List[int],
+        session: Session,
+        filter_: Callable[[Query], Query],
+        batch_size: int = 1000,
+    ) -> Iterator[str]:
+        """
+        Lazily yield the object_urls for a batch of downloadable file record IDs,
+        fetching them `batch_size` rows at a time from a server-side cursor.
+        """
+        query = session.query(cls.object_url).filter(cls.id.in_(ids))
+        query = filter_(query).execution_options(stream_results=True)
+        for (object_url,) in query.yield_per(batch_size):
+            yield object_url
+
+    @classmethod
+    @with_default_session
+    def list_object_urls_by_id(
+        cls, ids: List[int], session: Session, filter_: Callable[[Query], Query]
+    ) -> Dict[int, str]:
+        """Get a mapping from ID to object_url for a batch of downloadable file record IDs"""
+        query = session.query(cls.id, cls.object_url).filter(cls.id.in_(ids))
+        query = filter_(query)
+        return dict(query.all())
+
     @classmethod
     def build_file_bundle_query(cls) -> Query:
         """
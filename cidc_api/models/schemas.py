@@ -55,7 +55,8 @@ def _make_list_schema(schema: BaseSchema):
 class UploadJobSchema(BaseSchema):
     class Meta(BaseSchema.Meta):
         model = UploadJobs
-        exclude = ["_status"]
+        # Queued spreadsheets are only for the ingestion workers
+        exclude = ["_status", "queued_xlsx"]
 
     status = auto_field(column_name="_status")
 
@@ -3,9 +3,11 @@ __all__ = [
     "ExcelStyles",
     "MetadataTemplate",
     "MODEL_INSERTION_ORDER",
+    "read_worksheet_rows",
     "row_type_from_string",
     "RowType",
     "WorksheetConfig",
+    "WorksheetRows",
 ]
 
 import os
@@ -28,13 +30,12 @@ from typing import (
     Union,
 )
 
-import openpyxl
 from sqlalchemy import Column, Enum as SqlEnum
 import xlsxwriter
 from xlsxwriter.utility import xl_rowcol_to_cell, xl_range
 
 from .model_core import MetadataModel
-from .utils import _all_bases, _get_global_insertion_order, insert_record_batch
+from .utils import _get_global_insertion_order, insert_record_batch
 
 MODEL_INSERTION_ORDER = _get_global_insertion_order()
 
@@ -46,6 +47,48 @@ filterwarnings(
 )
 
 
+# A mapping from worksheet names to the cell values in each of their rows
+WorksheetRows = Dict[str, List[Tuple[Any, ...]]]
+
+
+def read_worksheet_rows(filename: Union[str, BinaryIO]) -> WorksheetRows:
+    """
+    Load the cell values from every worksheet in an Excel file, so that the file
+    only needs to be parsed once however many times its contents are read.
+
+    The file is streamed in read-only mode, without building cell objects or styles.
+    Rows after the last one with any values (besides its row type, in column A) are
+    dropped, since templates are annotated with many more data rows than are used.
+    """
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(filename, read_only=True)
+    try:
+        worksheet_rows = {}
+        for worksheet in workbook.worksheets:
+            # Don't trust the dimensions recorded in the file; read every row
+            worksheet.reset_dimensions()
+
+            rows, trailing_empty_rows = [], []
+            for row in worksheet.iter_rows(values_only=True):
+                if all(value is None for value in row[1:]):
+                    trailing_empty_rows.append(row)
+                else:
+                    rows.extend(trailing_empty_rows)
+                    trailing_empty_rows = []
+                    rows.append(row)
+
+            # Without dimensions, rows end at their last cell, so pad them to a common width
+            width = max((len(row) for row in rows), default=0)
+            worksheet_rows[worksheet.title] = [
+                tuple(row) + (None,) * (width - len(row)) for row in rows
+            ]
+        return worksheet_rows
+    finally:
+        # Read-only workbooks hold their file open until closed
+        workbook.close()
+
+
 def _format_for_json_serialization(value):
     if isinstance(value, datetime.date):
         return value.strftime("%Y%m%d")
@@ -126,6 +169,10 @@ class Entry:
 
         try:
             # Handle date/time parsing funkiness
+            if self.pytype in (datetime.time, datetime.date):
+                # openpyxl is slow to import, so only load it when it's needed
+                import openpyxl
+
             if self.pytype == datetime.time:
                 try:
                     if not isinstance(value, datetime.datetime):
@@ -325,7 +372,9 @@ class MetadataTemplate:
         self.worksheet_configs = worksheet_configs
         self.constants = constants
 
-    def read_and_insert(self, filename: Union[str, BinaryIO]) -> List[Exception]:
+    def read_and_insert(
+        self, filename: Union[str, BinaryIO, WorksheetRows]
+    ) -> List[Exception]:
         """
         Extract the models from a populated instance of this template and try to
         insert them, rolling back and returning a list of errors if any are encountered.
@@ -335,16 +384,20 @@ class MetadataTemplate:
         except Exception as e:
             return [e]
         else:
-            return insert_record_batch(records)
+            return insert_record_batch(records, bulk=True)
 
     def read(
-        self, filename: Union[str, BinaryIO]
+        self, filename: Union[str, BinaryIO, WorksheetRows]
     ) -> OrderedDict_Type[Type, List[MetadataModel]]:
         """
         Extract a list of SQLAlchemy models in insertion order from a populated
-        instance of this template.
+        instance of this template, given either the template's Excel file or
+        its rows as loaded by `read_worksheet_rows`.
         """
-        workbook = openpyxl.load_workbook(filename)
+        if isinstance(filename, dict):
+            worksheet_rows = filename
+        else:
+            worksheet_rows = read_worksheet_rows(filename)
 
         # The preamble values flow across all sheets for context
         # (such as trial_id) to only need to collect each value once.
@@ -355,7 +408,7 @@ class MetadataTemplate:
         model_instances: List[MetadataModel] = []
         model_dicts: List[Dict[Column, Any]] = []
         for config in self.worksheet_configs:
-            if config.name not in workbook:
+            if config.name not in worksheet_rows:
                 raise Exception(
                     f"Missing expected worksheet {config.name}, please include even if all fields are optional"
                 )
@@ -364,13 +417,13 @@ class MetadataTemplate:
             preamble_rows = []
             data_rows = []
             data_header = None
-            for n, row in enumerate(workbook[config.name].iter_rows()):
+            for n, row in enumerate(worksheet_rows[config.name]):
                 # if no entries, skip it
-                if all(cell.value is None for cell in row[1:]):
+                if all(value is None for value in row[1:]):
                     continue
                 # row[0] is the type
                 row_type: RowType = row_type_from_string(
-                    row[0].value
+                    row[0]
                 )  # None if not a valid type
 
                 # only pay attention if we have a reason to care
@@ -400,9 +453,9 @@ class MetadataTemplate:
 
             # turn the preamble into a mapping
             preamble_values = {
-                str(row[0].value).lower(): row[1].value
+                str(row[0]).lower(): row[1]
                 for row in preamble_rows
-                if row[0].value is not None
+                if row[0] is not None
             }
             # check the shape of the preamble
             if len(preamble_values) != len(config.preamble):
@@ -435,7 +488,7 @@ class MetadataTemplate:
                 entry for entries in config.data_sections.values() for entry in entries
             ]
             if len(data_rows):
-                header_width = len([c for c in data_header if c.value is not None])
+                header_width = len([v for v in data_header if v is not None])
                 # check the shape of the data
                 if header_width != len(data_configs):
                     raise Exception(
@@ -444,9 +497,9 @@ class MetadataTemplate:
 
             for n, row in enumerate(data_rows):
                 data_values = {
-                    str(title_cell.value).lower(): data_cell.value
-                    for title_cell, data_cell in zip(data_header, row)
-                    if title_cell.value is not None
+                    str(title).lower(): value
+                    for title, value in zip(data_header, row)
+                    if title is not None
                 }
 
                 # context will be updated by every cell for each row,
@@ -487,7 +540,7 @@ class MetadataTemplate:
                     [
                         kwargs.update(other_kwargs)
                         for other_model, other_kwargs in model_groups.items()
-                        if other_model in _all_bases(model)
+                        if other_model in model.model_info.bases
                     ]
                     model_instances.append(model(**kwargs))
 
@@ -510,23 +563,10 @@ class MetadataTemplate:
             # keep track of which columns can be set later by fk
             # can only set if there's only a single foreign instance
             # also look at all the superclasses for hidden fk's
-            fk_to_check = [fk for fk in model.__table__.foreign_keys]
-            fk_to_check.extend(
-                [
-                    fk
-                    for b in _all_bases(model)
-                    if hasattr(b, "__table__")
-                    for fk in b.__table__.foreign_keys
-                ]
-            )
             columns_to_set_later_by_fk = []
             for k, v in deduped_instances.items():
-                for fk in fk_to_check:
-                    if len(v) == 1 and fk.column.table.name in [k.__tablename__] + [
-                        b.__tablename__
-                        for b in _all_bases(k)
-                        if hasattr(b, "__tablename__")
-                    ]:
+                for fk in model.model_info.foreign_keys:
+                    if len(v) == 1 and fk.column.table.name in k.model_info.tablenames:
                         columns_to_set_later_by_fk.append(fk.parent)
 
             # special value None for all(unique_values is None)
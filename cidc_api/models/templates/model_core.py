@@ -3,13 +3,15 @@ __all__ = [
     "get_property",
     "identity",
     "MetadataModel",
+    "ModelInfo",
     "with_default_session",
 ]
 
 from functools import wraps
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, FrozenSet, NamedTuple, Optional, Tuple, Type
 
 from flask import current_app
+from sqlalchemy import Column, ForeignKey
 from sqlalchemy.orm import Session
 
 from ...config.db import BaseModel
@@ -46,9 +48,64 @@ def with_default_session(f):
     return wrapped
 
 
+class ModelInfo(NamedTuple):
+    """
+    Column metadata for a model class, covering the tables of the class and all
+    its superclasses, with this class's table first.
+    """
+
+    bases: FrozenSet[Type]
+    tablenames: FrozenSet[str]
+    columns: Tuple[Column, ...]
+    primary_key_columns: Tuple[Column, ...]
+    # primary key or unique-constrained columns
+    unique_columns: Tuple[Column, ...]
+    foreign_keys: FrozenSet[ForeignKey]
+
+
+def _build_model_info(model: Type) -> ModelInfo:
+    bases = model.__mro__[1:]
+
+    # with single-table inheritance, a class shares its superclass's table
+    tables = []
+    for c in (model,) + bases:
+        table = getattr(c, "__table__", None)
+        if table is not None and table not in tables:
+            tables.append(table)
+
+    columns = tuple(c for table in tables for c in table.columns)
+    return ModelInfo(
+        bases=frozenset(bases),
+        tablenames=frozenset(
+            c.__tablename__ for c in (model,) + bases if hasattr(c, "__tablename__")
+        ),
+        columns=columns,
+        primary_key_columns=tuple(c for c in columns if c.primary_key),
+        unique_columns=tuple(c for c in columns if c.unique or c.primary_key),
+        foreign_keys=frozenset(fk for table in tables for fk in table.foreign_keys),
+    )
+
+
+_model_infos: Dict[Type, ModelInfo] = {}
+
+
+class cached_model_info:
+    """
+    Descriptor for a model class's `ModelInfo`, which is built on first access
+    (once all tables are defined, so foreign keys can be resolved) and cached.
+    """
+
+    def __get__(self, instance, owner: Type) -> ModelInfo:
+        if owner not in _model_infos:
+            _model_infos[owner] = _build_model_info(owner)
+        return _model_infos[owner]
+
+
 class MetadataModel(BaseModel):
     __abstract__ = True
 
+    model_info = cached_model_info()
+
     def primary_key_values(self) -> Optional[Tuple[Any]]:
         """
         Returns a tuple of the values of the primary key values
@@ -62,18 +119,10 @@ class MetadataModel(BaseModel):
         Returns a dict of Column: value for any primary key column.
         Special value None if all of the pk columns are None
         """
-        from .utils import _all_bases
-
-        columns_to_check = [c for c in self.__table__.columns]
-        for c in _all_bases(type(self)):
-            if hasattr(c, "__table__"):
-                columns_to_check.extend(c.__table__.columns)
-
-        primary_key_values = {}
-        for column in columns_to_check:
-            if column.primary_key:
-                value = getattr(self, column.name)
-                primary_key_values[column] = value
+        primary_key_values = {
+            column: getattr(self, column.name)
+            for column in self.model_info.primary_key_columns
+        }
 
         if all(v is None for v in primary_key_values.values()):
             return None  # special value
@@ -85,24 +134,15 @@ class MetadataModel(BaseModel):
         Returns a tuple of all values that are uniquely constrained (pk or unique).
         Special value None if all of the unique columns are None
         """
-        from .utils import _all_bases
-
-        columns_to_check = [c for c in self.__table__.columns]
-        for c in _all_bases(type(self)):
-            if hasattr(c, "__table__"):
-                columns_to_check.extend(c.__table__.columns)
-
-        unique_field_values = []
-        for column in columns_to_check:
-            # column.primary_key == True for 1+ column guaranteed
-            if column.unique or column.primary_key:
-                value = getattr(self, column.name)
-                unique_field_values.append(value)
+        # column.primary_key == True for 1+ column guaranteed
+        unique_field_values = tuple(
+            getattr(self, column.name) for column in self.model_info.unique_columns
+        )
 
         if all(v is None for v in unique_field_values):
             return None  # special value
 
-        return tuple(unique_field_values)
+        return unique_field_values
 
     def merge(self, other):
         """
@@ -115,14 +155,7 @@ class MetadataModel(BaseModel):
             )
 
         # also need to handle columns for all superclasses
-        from .utils import _all_bases
-
-        for column in self.__table__.columns + [
-            c
-            for b in _all_bases(type(self))
-            if hasattr(b, "__table__")
-            for c in b.__table__.columns
-        ]:
+        for column in self.model_info.columns:
             if hasattr(self, column.name):
                 current = getattr(self, column.name)
                 incoming = getattr(other, column.name)
@@ -155,17 +188,9 @@ class MetadataModel(BaseModel):
 
     def to_dict(self) -> Dict[str, Any]:
         """Returns a dict of all non-null columns (by name) and their values"""
-        # avoid circular imports
-        from .utils import _all_bases
-
-        columns_to_check = [c for c in type(self).__table__.columns]
-        for b in _all_bases(type(self)):
-            if hasattr(b, "__table__"):
-                columns_to_check.extend(b.__table__.columns)
-
         ret = {
             c.name: getattr(self, c.name)
-            for c in columns_to_check
+            for c in self.model_info.columns
             if hasattr(self, c.name)
         }
         ret = {k: v for k, v in ret.items() if v is not None}
@@ -156,10 +156,7 @@ def _get_all_values(
     target: MetadataModel, old: dict, drop: List[str] = []
 ) -> Dict[str, Any]:
     """Returns all of the values from `old` that are columns of `target` excepting anything keys in `drop`"""
-    columns_to_check = [c for c in target.__table__.columns]
-    for b in _all_bases(type(target)):
-        if hasattr(b, "__table__"):
-            columns_to_check.extend(b.__table__.columns)
+    columns_to_check = target.model_info.columns
 
     ret = {
         c.name: old[c.name]
@@ -9,7 +9,7 @@ __all__ = [
 ]
 
 from collections import defaultdict
-from typing import Any, Callable, Dict, List, OrderedDict, Set, Type
+from typing import Any, Callable, Dict, List, OrderedDict, Set, Tuple, Type
 
 from psycopg2.errors import (
     CheckViolation,
@@ -17,6 +17,8 @@ from psycopg2.errors import (
     InvalidTextRepresentation,
     NotNullViolation,
 )
+from sqlalchemy import inspect
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import DataError, IntegrityError
 from sqlalchemy.orm import Session
 
@@ -54,14 +56,7 @@ def _get_global_insertion_order() -> List[MetadataModel]:
     fks_on_model = defaultdict(set)
     fks_to_parents = defaultdict(set)
     for model in models:
-        fks_on_model[model] = model.__table__.foreign_keys.union(
-            {
-                fk
-                for b in _all_bases(model)
-                if hasattr(b, "__table__")
-                for fk in b.__table__.foreign_keys
-            }
-        )
+        fks_on_model[model] = model.model_info.foreign_keys
         for fk in fks_on_model[model]:
             fk_models = table_to_model.get(fk.column.table.name, [])
             for fk_model in fk_models:
@@ -155,12 +150,107 @@ def _handle_postgres_error(error: IntegrityError, model: Type) -> Exception:
         return error
 
 
+# Rows per multi-row INSERT in `insert_record_batch(..., bulk=True)`, to bound statement size
+BULK_INSERT_CHUNK_SIZE = 1000
+
+
+def _supports_bulk_insert(model: Type) -> bool:
+    """Whether `model` maps to a single table with no inheritance, so its rows can be upserted directly."""
+    mapper = inspect(model)
+    return mapper.inherits is None and mapper.polymorphic_on is None
+
+
+def _merge_records(
+    model: Type, records: List[MetadataModel], session: Session
+) -> List[Exception]:
+    """
+    `session.merge` each of `records` in place, then flush them to generate db-derived
+    values, in case they're needed for later fk's. Returns any errors.
+    """
+    for n, record in enumerate(records):
+        try:
+            records[n] = session.merge(record)
+        except Exception as e:
+            return [_handle_postgres_error(e, model)]
+
+    try:
+        session.flush()
+    except (DataError, IntegrityError) as e:
+        return [_handle_postgres_error(e, model=model)]
+
+    return []
+
+
+def _upsert_records(model: Type, records: List[MetadataModel], session: Session):
+    """
+    Upsert `records` with multi-row `INSERT ... ON CONFLICT (<primary key>) DO UPDATE`
+    statements. Like `session.merge`, only the columns set on a record are written, and
+    a later record with the same primary key as an earlier one overrides its values.
+    Generated primary keys are set on the records, which are otherwise left as they are.
+    """
+    table = model.__table__
+    pk_columns = list(table.primary_key.columns)
+    pk_keys = {c.key for c in pk_columns}
+    column_attrs = [(attr.key, attr.columns[0]) for attr in inspect(model).column_attrs]
+
+    # Group rows by the columns they set, since each statement needs the same columns
+    # for every row, and combine rows with the same primary key
+    groups: Dict[Tuple[str, ...], Dict[Any, dict]] = defaultdict(dict)
+    generated: Dict[int, MetadataModel] = {}
+    for n, record in enumerate(records):
+        state = inspect(record)
+        row = {
+            column.key: state.dict[key]
+            for key, column in column_attrs
+            if key in state.dict
+        }
+        pk = tuple(row.get(c.key) for c in pk_columns)
+        if None in pk:
+            # rows without a complete primary key can't conflict, so are never combined,
+            # and the database generates the missing values
+            row = {k: v for k, v in row.items() if k not in pk_keys or v is not None}
+            generated[n] = record
+            groups[tuple(sorted(row))][n] = row
+            continue
+        for keys, rows in groups.items():
+            if pk in rows:
+                row = {**rows.pop(pk), **row}
+                break
+        groups[tuple(sorted(row))][pk] = row
+
+    for keys, rows in groups.items():
+        has_pk = pk_keys.issubset(keys)
+        updates = [c for c in table.columns if c.key in keys and not c.primary_key]
+        keyed_rows = list(rows.items())
+        for start in range(0, len(keyed_rows), BULK_INSERT_CHUNK_SIZE):
+            chunk = keyed_rows[start : start + BULK_INSERT_CHUNK_SIZE]
+            stmt = insert(table).values([row for _, row in chunk])
+            if has_pk and updates:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=pk_columns,
+                    set_={c.name: stmt.excluded[c.key] for c in updates},
+                )
+            elif has_pk:
+                stmt = stmt.on_conflict_do_nothing(index_elements=pk_columns)
+            else:
+                # rows without primary keys never conflict, so every row is returned
+                # in the order it was inserted in
+                stmt = stmt.returning(*pk_columns)
+
+            result = session.execute(stmt)
+            if not has_pk:
+                for (n, _), returned in zip(chunk, result):
+                    for column, value in zip(pk_columns, returned):
+                        setattr(generated[n], column.key, value)
+
+
 @with_default_session
 def insert_record_batch(
     ordered_records: OrderedDict[Type, List[MetadataModel]],
     *,
     dry_run: bool = False,
     hold_commit: bool = False,
+    bulk: bool = False,
     session: Session,
 ) -> List[Exception]:
     """
@@ -169,6 +259,11 @@ def insert_record_batch(
     rollback the transaction regardless of whether any errors are encountered.
     Uses session.merge, so not a "true" insert.
     If `hold_commit` is passed, all rollback / commit are ignored.
+
+    If `bulk` is passed, models that map to a single table are upserted with a few
+    multi-row statements (see `_upsert_records`) instead of a `session.merge` per
+    record, and their records aren't added to the session. If that fails, the model's
+    records are merged one by one instead, to find which record caused the error.
     """
     errors = []
     for model in ordered_records.keys():
@@ -177,23 +272,11 @@ def insert_record_batch(
         # set any columns that were left to fill in by fk
         # can only set if there's only a single foreign instance
         # also look at all the superclasses for hidden fk's
-        fk_to_check = [fk for fk in model.__table__.foreign_keys]
-        fk_to_check.extend(
-            [
-                fk
-                for b in _all_bases(model)
-                if hasattr(b, "__table__")
-                for fk in b.__table__.foreign_keys
-            ]
-        )
         for fk, target_class in {
             fk: k
             for k, v in ordered_records.items()
-            for fk in fk_to_check
-            if len(v) == 1
-            and fk.column.table.name
-            in [k.__tablename__]
-            + [b.__tablename__ for b in _all_bases(k) if hasattr(b, "__tablename__")]
+            for fk in model.model_info.foreign_keys
+            if len(v) == 1 and fk.column.table.name in k.model_info.tablenames
         }.items():
             for n in range(len(records)):
                 setattr(
@@ -202,25 +285,21 @@ def insert_record_batch(
                     getattr(ordered_records[target_class][0], fk.column.name),
                 )
 
-        # merge all records into session and keep a copy
-        for n, record in enumerate(records):
+        if bulk and _supports_bulk_insert(model):
+            savepoint = session.begin_nested()
             try:
-                record = session.merge(record)
-                ordered_records[model][n] = record
-            except Exception as e:
-                errors.append(_handle_postgres_error(e, model))
-                break
+                _upsert_records(model, records, session)
+            except (DataError, IntegrityError):
+                # merge record by record to report the error the same way as otherwise
+                savepoint.rollback()
+                errors.extend(_merge_records(model, records, session))
+            else:
+                savepoint.commit()
+        else:
+            errors.extend(_merge_records(model, records, session))
 
         if len(errors) != 0:  # if we've hit an error, we're done
             break
-        else:
-            # flush these records to generate db-derived values
-            # in case they're needed for later fk's
-            try:
-                session.flush()
-            except (DataError, IntegrityError) as e:
-                errors.append(_handle_postgres_error(e, model=model))
-                break  # if it fails in a flush, it's done done
 
     if len(errors):
         session.rollback()
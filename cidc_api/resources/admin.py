@@ -1,8 +1,11 @@
 from flask import Blueprint, jsonify
+from webargs import fields
+from webargs.flaskparser import use_args
 
 from ..csms import get_with_authorization as csms_get
 from ..models import CIDCRole, syncall_from_blobs
 from ..shared.auth import requires_auth
+from ..shared.iam_reconciler import reconcile_iam
 
 admin_bp = Blueprint("admin", __name__)
 
@@ -25,3 +28,15 @@ def load_from_blobs():
         res = jsonify(status="success")
         res.status_code = 200
         return res
+
+
+@admin_bp.route("/reconcile_iam", methods=["POST"])
+@requires_auth("admin", [CIDCRole.ADMIN.value])
+@use_args({"dry_run": fields.Bool(missing=True)}, location="query")
+def reconcile_iam_bindings(args):
+    """
+    Make lister, upload and intake bucket IAM bindings match the database. Defaults
+    to a dry run; pass `dry_run=false` to apply the changes. Returns the changes.
+    """
+    diffs = reconcile_iam(dry_run=args["dry_run"])
+    return jsonify(dry_run=args["dry_run"], changes=[d._asdict() for d in diffs])
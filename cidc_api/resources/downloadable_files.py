@@ -1,18 +1,28 @@
+import itertools
 import os
 import shutil
 import tempfile
 from uuid import uuid4
-from io import BytesIO
 from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
-from flask import Blueprint, jsonify, send_file
+from flask import (
+    Blueprint,
+    Response,
+    jsonify,
+    request,
+    stream_with_context,
+)
+from marshmallow import validate
 from webargs import fields
 from webargs.flaskparser import use_args
+from sqlalchemy.orm.session import Session
 from werkzeug.exceptions import BadRequest, NotFound, Unauthorized
 
 
 from ..models import (
+    BundleJobs,
+    BundleJobStatus,
     DownloadableFiles,
     DownloadableFileSchema,
     DownloadableFileListSchema,
@@ -22,12 +32,16 @@ from ..models import (
 )
 from ..shared import gcloud_client
 from ..shared.auth import get_current_user, requires_auth
+from ..shared.bundle_worker import queue_bundle
 from ..shared.rest_utils import with_lookup, marshal_response, use_args_with_pagination
 from ..config.settings import (
     GOOGLE_ACL_DATA_BUCKET,
     GOOGLE_EPHEMERAL_BUCKET,
     MAX_THREADPOOL_WORKERS,
 )
+from ..config.logging import get_logger
+
+logger = get_logger(__name__)
 
 
 downloadable_files_bp = Blueprint("downloadable_files", __name__)
@@ -39,6 +53,8 @@ downloadable_files_list_schema = DownloadableFileListSchema()
 file_filter_schema = {
     "trial_ids": fields.DelimitedList(fields.Str),
     "facets": fields.DelimitedList(fields.DelimitedList(fields.Str, delimiter="|")),
+    # case-insensitive substring match on object URLs and additional metadata
+    "search": fields.Str(validate=validate.Length(min=3, max=256)),
 }
 
 
@@ -117,30 +133,17 @@ def _get_object_urls_or_404(ids: List[int]) -> List[str]:
 
 
 MAX_BUNDLE_BYTES = int(1e8)  # 100MB
+# Bundles built in the background aren't bound by the request timeout, but they
+# are still staged on the instance's (in-memory) /tmp, so keep them bounded.
+MAX_ASYNC_BUNDLE_BYTES = int(1e9)  # 1GB
 
 
-@downloadable_files_bp.route("/compressed_batch", methods=["POST"])
-@requires_auth("compressed_batch")
-@use_args({"file_ids": fields.List(fields.Int, required=True)}, location="json")
-def create_compressed_batch(args):
+def build_compressed_batch(urls: List[str]) -> str:
     """
-    Given a list of file ids, download those files from GCS and compress them
-    into a single file. Respond with a GCS signed URL for downloading the
-    compressed file.
-
-    Currently, onl file batches with size <=100MB are supported. If the total file
-    size of the requested files is greater than 100MB, respond with HTTP status code
-    400 (Bad Request).
+    Download the objects at `urls` from GCS, compress them into a single
+    gzipped tarball, and upload that tarball to the ephemeral bucket.
+    Returns the name of the uploaded archive.
     """
-    urls = _get_object_urls_or_404(args["file_ids"])
-
-    # Check that total requested file size doesn't exceed the maximum
-    file_filter = lambda q: q.filter(DownloadableFiles.object_url.in_(urls))
-    if DownloadableFiles.get_total_bytes(filter_=file_filter) > MAX_BUNDLE_BYTES:
-        raise BadRequest(
-            f"batch too large: can't directly download a batch with more than {MAX_BUNDLE_BYTES} bytes"
-        )
-
     data_bucket = gcloud_client._get_bucket(GOOGLE_ACL_DATA_BUCKET)
     # Using a temporary directory allows us to avoid collisions
     # with other possible concurrent requests to this endpoint
@@ -157,7 +160,8 @@ def create_compressed_batch(args):
             download = lambda url: data_bucket.get_blob(url).download_to_filename(
                 filename(url)
             )
-            pool.map(download, urls)
+            # Consume the results so that download errors are raised here
+            list(pool.map(download, urls))
 
         # Create a compressed file from the contents of the temporary directory
         random_filename = str(uuid4())
@@ -171,12 +175,99 @@ def create_compressed_batch(args):
         blob = ephemeral_bucket.blob(os.path.basename(outpath))
         blob.upload_from_filename(outpath)
 
+    return blob.name
+
+
+@downloadable_files_bp.route("/compressed_batch", methods=["POST"])
+@requires_auth("compressed_batch")
+@use_args(
+    {
+        "file_ids": fields.List(fields.Int, required=True),
+        "async": fields.Bool(missing=False),
+    },
+    location="json",
+)
+def create_compressed_batch(args):
+    """
+    Given a list of file ids, download those files from GCS and compress them
+    into a single file. Respond with a GCS signed URL for downloading the
+    compressed file.
+
+    Currently, only file batches with size <=100MB are supported. If the total file
+    size of the requested files is greater than 100MB, respond with HTTP status code
+    400 (Bad Request).
+
+    If `async` is true, build the bundle in the background instead (for batches
+    up to 1GB), and respond with HTTP status code 202 and the id of a bundle job.
+    Poll `/downloadable_files/compressed_batch/<job_id>` for the signed URL.
+    """
+    urls = _get_object_urls_or_404(args["file_ids"])
+    run_async = args["async"]
+    max_bytes = MAX_ASYNC_BUNDLE_BYTES if run_async else MAX_BUNDLE_BYTES
+
+    # Check that total requested file size doesn't exceed the maximum
+    file_filter = lambda q: q.filter(DownloadableFiles.object_url.in_(urls))
+    if DownloadableFiles.get_total_bytes(filter_=file_filter) > max_bytes:
+        raise BadRequest(
+            f"batch too large: can't directly download a batch with more than {max_bytes} bytes"
+        )
+
+    if run_async:
+        job = BundleJobs.create(get_current_user().email, urls, commit=False)
+        session = Session.object_session(job)
+        queue_bundle(job, session)
+        session.commit()
+        res = jsonify(
+            {
+                "job_id": job.id,
+                "status": job.status,
+                "status_url": f"{request.base_url}/{job.id}",
+            }
+        )
+        res.status_code = 202
+        return res
+
+    bundle_name = build_compressed_batch(urls)
+
     # Get a signed URL for the download blob
-    download_url = gcloud_client.get_signed_url(blob.name, GOOGLE_EPHEMERAL_BUCKET)
+    download_url = gcloud_client.get_signed_url(bundle_name, GOOGLE_EPHEMERAL_BUCKET)
 
     return jsonify(download_url)
 
 
+@downloadable_files_bp.route("/compressed_batch/<int:bundle_job>", methods=["GET"])
+@requires_auth("compressed_batch")
+@with_lookup(BundleJobs, "bundle_job")
+def get_compressed_batch_status(bundle_job: BundleJobs):
+    """
+    Check the status of a background bundle job.
+
+    Response: application/json
+        job_id {int}: the id of the bundle job
+        status {str}: one of "queued", "running", "completed", or "failed"
+        status_details {str or None}: information about `status` (e.g., error details)
+        download_url {str}: a signed URL for the bundle (only present if `status` is "completed")
+        retry_in {int}: the time in seconds to wait before polling again (only present if the job isn't finished)
+    """
+    user = get_current_user()
+    if not user.is_admin() and bundle_job.requester_email != user.email:
+        raise NotFound()
+
+    response = {
+        "job_id": bundle_job.id,
+        "status": bundle_job.status,
+        "status_details": bundle_job.status_details,
+    }
+    if bundle_job.status == BundleJobStatus.COMPLETED.value:
+        response["download_url"] = gcloud_client.get_signed_url(
+            bundle_job.bundle_name, GOOGLE_EPHEMERAL_BUCKET
+        )
+    elif bundle_job.status != BundleJobStatus.FAILED.value:
+        response["retry_in"] = 5
+
+    return jsonify(response)
+
+
 @downloadable_files_bp.route("/filelist", methods=["POST"])
 @requires_auth("filelist")
 @use_args({"file_ids": fields.List(fields.Int, required=True)}, location="json")
@@ -184,24 +275,32 @@ def generate_filelist(args):
     """
     Return a file `filelist.tsv` mapping GCS URIs to flat filenames for the
     provided set of file ids.
+
+    Rows are streamed to the client as they're read from the database, so
+    memory use doesn't grow with the size of the selection.
     """
-    urls = _get_object_urls_or_404(args["file_ids"])
+    current_user = get_current_user()
+    user_perms_filter = DownloadableFiles.build_file_filter(user=current_user)
+    urls = DownloadableFiles.stream_object_urls(
+        args["file_ids"], filter_=user_perms_filter
+    )
 
-    # Build TSV mapping GCS URIs to flat filenames
-    # (bytes because that's what send_file knows how to send)
-    tsv = b""
-    for url in urls:
-        flat_url = url.replace("/", "_")
-        full_gcs_uri = f"gs://{GOOGLE_ACL_DATA_BUCKET}/{url}"
-        tsv += bytes(f"{full_gcs_uri}\t{flat_url}\n", "utf-8")
+    # Check for an empty result before we start responding, so that
+    # we can still respond with 404 if no files were found.
+    first_url = next(urls, None)
+    if first_url is None:
+        raise NotFound()
 
-    buffer = BytesIO(tsv)
+    def tsv_rows():
+        for url in itertools.chain([first_url], urls):
+            flat_url = url.replace("/", "_")
+            full_gcs_uri = f"gs://{GOOGLE_ACL_DATA_BUCKET}/{url}"
+            yield f"{full_gcs_uri}\t{flat_url}\n"
 
-    return send_file(
-        buffer,
-        as_attachment=True,
-        attachment_filename="filelist.tsv",
+    return Response(
+        stream_with_context(tsv_rows()),
         mimetype="text/tsv",
+        headers={"Content-Disposition": "attachment; filename=filelist.tsv"},
     )
 
 
@@ -238,6 +337,56 @@ def get_download_url(args):
     return jsonify(download_url)
 
 
+MAX_DOWNLOAD_URL_BATCH = 5000
+
+
+@downloadable_files_bp.route("/download_urls", methods=["POST"])
+@requires_auth(
+    "download_urls",
+    allowed_roles=[role for role in ROLES if role != CIDCRole.NETWORK_VIEWER.value],
+)
+@use_args(
+    {
+        "file_ids": fields.List(
+            fields.Int,
+            required=True,
+            validate=validate.Length(min=1, max=MAX_DOWNLOAD_URL_BATCH),
+        )
+    },
+    location="json",
+)
+def get_download_urls(args):
+    """
+    Get signed GCS download URLs for a batch of files in a single request.
+
+    Files the current user isn't allowed to view are silently omitted. If none
+    of the requested files are found, respond with 404.
+
+    Response: application/json, mapping each file id to its `object_url` and
+    signed `download_url`, e.g.
+    {
+        <file id 1>: {"object_url": ..., "download_url": ...},
+        ...
+    }
+    """
+    user = get_current_user()
+    user_perms_filter = DownloadableFiles.build_file_filter(user=user)
+    urls_by_id = DownloadableFiles.list_object_urls_by_id(
+        args["file_ids"], filter_=user_perms_filter
+    )
+    if len(urls_by_id) == 0:
+        raise NotFound()
+
+    signed_urls = gcloud_client.get_signed_urls(list(urls_by_id.values()))
+
+    return jsonify(
+        {
+            file_id: {"object_url": object_url, "download_url": signed_urls[object_url]}
+            for file_id, object_url in urls_by_id.items()
+        }
+    )
+
+
 @downloadable_files_bp.route("/filter_facets", methods=["GET"])
 @requires_auth("filter_facets")
 @use_args(file_filter_schema, location="query")
@@ -254,12 +403,12 @@ def get_filter_facets(args):
     user = get_current_user()
     trial_ids = DownloadableFiles.get_trial_facets(
         filter_=DownloadableFiles.build_file_filter(
-            facets=args.get("facets"), user=user
+            facets=args.get("facets"), search=args.get("search"), user=user
         )
     )
     facets = DownloadableFiles.get_data_category_facets(
         filter_=DownloadableFiles.build_file_filter(
-            trial_ids=args.get("trial_ids"), user=user
+            trial_ids=args.get("trial_ids"), search=args.get("search"), user=user
         )
     )
     return jsonify({"trial_ids": trial_ids, "facets": facets})
@@ -1,13 +1,14 @@
 """Endpoints providing info related to this API"""
-import os
+import io
 import re
 
-from flask import Blueprint, jsonify, current_app as app, send_file
+from flask import Blueprint, jsonify, current_app as app, request, send_file
 from werkzeug.exceptions import NotFound, BadRequest
 
-from cidc_schemas import prism, template
+from cidc_schemas import prism
 
 from ..shared.auth import public
+from ..shared.template_cache import get_template_cache
 from ..models import TrialMetadata, DownloadableFiles, EXTRA_DATA_TYPES
 
 info_bp = Blueprint("info", __name__)
@@ -75,23 +76,23 @@ def templates(template_family, template_type):
     elif not re.match(_al_under, template_type):
         raise BadRequest(f"Invalid template type: {template_type}")
 
-    schema_path = os.path.join(
-        "templates", template_family, f"{template_type}_template.json"
-    )
     template_filename = f"{template_type}_template.xlsx"
-    template_path = os.path.join(
-        app.config["TEMPLATES_DIR"], template_family, template_filename
+    cached_template = get_template_cache(app.config["TEMPLATES_DIR"]).get(
+        template_family, template_type
     )
-
-    # Generate the empty template if it doesn't exist yet
-    if not os.path.exists(template_path):
-        try:
-            template.generate_empty_template(schema_path, template_path)
-        except FileNotFoundError:
-            raise NotFound(
-                f"No template found for the given template family and template type"
-            )
-
-    return send_file(
-        template_path, as_attachment=True, attachment_filename=template_filename
+    if cached_template is None:
+        raise NotFound(
+            f"No template found for the given template family and template type"
+        )
+
+    # Templates only change when the API is deployed with new schemas, so clients can
+    # cache them for a while, then revalidate them cheaply with their ETags.
+    response = send_file(
+        io.BytesIO(cached_template.data),
+        as_attachment=True,
+        attachment_filename=template_filename,
+        conditional=False,
+        cache_timeout=app.config["TEMPLATES_MAX_AGE"],
     )
+    response.set_etag(cached_template.etag)
+    return response.make_conditional(request)
@@ -2,13 +2,17 @@ import os
 
 os.environ["TZ"] = "UTC"
 import datetime
-from typing import BinaryIO, Tuple, List
+import io
+import time
+from contextlib import contextmanager
+from collections import defaultdict
+from typing import BinaryIO, Dict, List, Tuple, Union
 from functools import wraps
 
-from marshmallow import Schema, INCLUDE
+from marshmallow import Schema, INCLUDE, validate
 from webargs import fields
 from webargs.flaskparser import use_args
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g, make_response, url_for
 from jsonschema.exceptions import ValidationError
 from sqlalchemy.orm.session import Session
 from werkzeug.exceptions import BadRequest, NotFound, Unauthorized, PreconditionRequired
@@ -21,6 +25,9 @@ from cidc_schemas.template_reader import (
 )
 
 from ..shared import gcloud_client, emails
+from ..shared.ingestion_worker import queue_upload
+from ..shared.upload_status import get_upload_status_listener
+from ..shared.validation_cache import CachedValidation, hash_xlsx, validation_cache
 from ..shared.auth import requires_auth, get_current_user, authenticate_and_get_user
 from ..shared.rest_utils import (
     with_lookup,
@@ -31,6 +38,7 @@ from ..shared.rest_utils import (
 )
 from ..config.settings import GOOGLE_UPLOAD_BUCKET, PRISM_ENCRYPT_KEY
 from ..models import (
+    OutboxMessages,
     UploadJobs,
     UploadJobSchema,
     UploadJobListSchema,
@@ -40,6 +48,8 @@ from ..models import (
     CIDCRole,
     Users,
     ValidationMultiError,
+    WorksheetRows,
+    read_worksheet_rows,
 )
 from ..config.logging import get_logger
 
@@ -156,22 +166,27 @@ def update_upload_job(upload_job: UploadJobs, upload_job_updates: dict):
     """Update an upload_job."""
     try:
         if "gcs_file_map" in upload_job_updates and upload_job.gcs_file_map is not None:
-            upload_job_updates["metadata_patch"] = upload_job.metadata_patch.copy()
-            for uri, uuid in upload_job.gcs_file_map.items():
-                if uri not in upload_job_updates["gcs_file_map"]:
-                    upload_job_updates[
-                        "metadata_patch"
-                    ] = _remove_optional_uuid_recursive(
-                        upload_job_updates["metadata_patch"], uuid
-                    )
-
-        upload_job.update(changes=upload_job_updates)
+            dropped_uuids = [
+                uuid
+                for uri, uuid in upload_job.gcs_file_map.items()
+                if uri not in upload_job_updates["gcs_file_map"]
+            ]
+            upload_job_updates["metadata_patch"] = _remove_upload_placeholders(
+                upload_job.metadata_patch, dropped_uuids
+            )
+
+        upload_job.update(changes=upload_job_updates, commit=False)
     except ValueError as e:
         raise BadRequest(str(e))
 
     # If this is a successful upload job, publish this info to Pub/Sub
+    # once the status update commits
+    session = Session.object_session(upload_job)
     if upload_job.status == UploadJobStatus.UPLOAD_COMPLETED.value:
-        gcloud_client.publish_upload_success(upload_job.id)
+        gcloud_client.publish_upload_success(
+            upload_job.id, outbox=OutboxMessages.writer(session)
+        )
+    session.commit()
 
     # Revoke the uploading user's bucket access, since their querying
     # this endpoint indicates a completed / failed upload attempt.
@@ -181,38 +196,73 @@ def update_upload_job(upload_job: UploadJobs, upload_job_updates: dict):
     return upload_job
 
 
-def _remove_optional_uuid_recursive(target: dict, uuid: str):
-    """
-    If target contains an item : dict with {"upload_placeholder":uuid}, removes that item and returns the modified target
-    If no such item is found, continues recursively as depth first search
-    If the uuid is never found, returns the target unchanged
-    """
-    if isinstance(target, dict):
-        if target.get("upload_placeholder") == uuid:
-            return {}
-
-        for k, v in target.items():
-            if (
-                isinstance(v, dict)
-                and "upload_placeholder" in v
-                and v["upload_placeholder"] == uuid
-            ):
-                target.pop(k)
-                return target
-            elif isinstance(v, (dict, list)):
-                temp = _remove_optional_uuid_recursive(v, uuid)
-                if len(temp):
-                    target[k] = temp
-                else:
-                    # drop completely if empty
-                    target.pop(k)
-                    return target
+# The keys and list indices leading to a value in a JSON document
+JSONPath = Tuple[Union[str, int], ...]
+
+# Marks values to remove in the trie built by `_remove_upload_placeholders`
+_REMOVE = object()
+
+
+def _index_upload_placeholders(target: Union[dict, list]) -> Dict[str, List[JSONPath]]:
+    """
+    Map the uuid of each `{"upload_placeholder": uuid, ...}` item in `target`
+    to the paths of the items with that uuid.
+    """
+    index = defaultdict(list)
+
+    def visit(node, path: JSONPath):
+        if isinstance(node, dict):
+            if "upload_placeholder" in node:
+                index[node["upload_placeholder"]].append(path)
+                return
+            for k, v in node.items():
+                visit(v, path + (k,))
+        elif isinstance(node, list):
+            for i, v in enumerate(node):
+                visit(v, path + (i,))
+
+    visit(target, ())
+    return index
+
 
-    elif isinstance(target, list):
-        temp = [_remove_optional_uuid_recursive(i, uuid) for i in target]
-        target = [t for t in temp if t]  # remove None or empty
+def _remove_upload_placeholders(target: dict, uuids: List[str]) -> dict:
+    """
+    Return `target` without any `{"upload_placeholder": uuid, ...}` items with one of
+    the given uuids, dropping any dicts and lists that are left empty as a result.
+
+    Placeholders are found in one pass over `target`, then removed in one pass over just
+    the paths leading to them. Only the containers along those paths are copied, so
+    `target` itself is left unchanged.
+    """
+    index = _index_upload_placeholders(target)
+
+    # Build a trie of the paths to remove, so each container is visited once
+    trie = {}
+    for uuid in uuids:
+        for path in index.get(uuid, []):
+            node = trie
+            for key in path:
+                node = node.setdefault(key, {})
+            node[_REMOVE] = True
+
+    def remove(node, subtrie: dict):
+        if _REMOVE in subtrie:
+            return _REMOVE
+        node = node.copy()
+        # remove list items from the end, so earlier indices stay valid
+        keys = sorted(subtrie, reverse=True) if isinstance(node, list) else subtrie
+        for key in keys:
+            child = remove(node[key], subtrie[key])
+            if child is _REMOVE:
+                del node[key]
+            else:
+                node[key] = child
+        return node if len(node) else _REMOVE
 
-    return target
+    if not trie:
+        return target
+    result = remove(target, trie)
+    return {} if result is _REMOVE else result
 
 
 ### Ingestion endpoints ###
@@ -269,6 +319,50 @@ def extract_schema_and_xlsx(allowed_types: List[str]) -> Tuple[str, BinaryIO]:
     return template, xlsx_file
 
 
+def worksheet_rows_from_reader(xlsx: XlTemplateReader) -> WorksheetRows:
+    """
+    Get the rows that `XlTemplateReader.from_excel` parsed, in the form
+    `MetadataTemplate.read` accepts, so the relational tables can be populated
+    without parsing the Excel file again.
+    """
+    return {
+        worksheet_name: [(row.row_type.value, *row.values) for row in rows]
+        for worksheet_name, rows in xlsx.template.items()
+    }
+
+
+@contextmanager
+def upload_phase(name: str):
+    """
+    Time a phase of processing an upload. Durations are logged, and, within
+    `upload_handler`, reported in the response's Server-Timing header.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        logger.info(f"{name} took {duration:.3f}s")
+        if "upload_timings" in g:
+            g.upload_timings[name] = g.upload_timings.get(name, 0) + duration
+
+
+def insert_relational(template_type: str, xlsx_rows: WorksheetRows):
+    """Insert an upload's spreadsheet into the relational tables, if it has a relational template."""
+    from ..models.templates import TEMPLATE_MAP
+
+    template = TEMPLATE_MAP.get(template_type)
+    if template:
+        with upload_phase("relational"):
+            errs = template.read_and_insert(xlsx_rows)
+        if errs:
+            logger.error(f"Relational errors: {errs}")
+        else:
+            logger.info("Relational success.")
+    else:
+        logger.error(f"Relational error: no template for type {template_type}")
+
+
 def validate(template, xlsx):
     """
     Validate a .xlsx manifest or assay metadata template.
@@ -338,29 +432,53 @@ def upload_handler(allowed_types: List[str]):
         def wrapped(*args, **kwargs):
             logger.info(f"upload_handler({f.__name__}) started")
             template, xlsx_file = extract_schema_and_xlsx(allowed_types)
+            g.upload_timings = {}
 
             errors_so_far = []
 
-            try:
-                xlsx, errors = XlTemplateReader.from_excel(xlsx_file)
-            except SchemasValidationError as e:
-                raise BadRequest({"errors": [str(e)]})
-            logger.info(f"xlsx parsed: {len(errors)} errors")
-            log_multiple_errors(errors)
-            errors_so_far.extend(errors)
-
-            # Run basic validations on the provided Excel file
-            validations = validate(template, xlsx)
-            logger.info(f"xlsx validated: {len(validations.json['errors'])} errors")
-            log_multiple_errors(validations.json["errors"])
-            errors_so_far.extend(validations.json["errors"])
-
-            md_patch, file_infos, errors = prism.prismify(xlsx, template)
-            logger.info(
-                f"prismified: {len(errors)} errors, {len(file_infos)} file_infos"
-            )
-            log_multiple_errors(errors)
-            errors_so_far.extend(errors)
+            # Clients usually validate a spreadsheet before uploading it, so reuse
+            # the checks from validation if this exact spreadsheet was seen recently
+            xlsx_hash = hash_xlsx(xlsx_file)
+            cached = validation_cache.get(xlsx_hash, template.type)
+            if cached:
+                logger.info("reusing cached parse, validation and prismify results")
+                xlsx_rows, md_patch, file_infos = (
+                    cached.xlsx_rows,
+                    cached.md_patch,
+                    cached.file_infos,
+                )
+                errors_so_far.extend(cached.errors)
+            else:
+                # Parse the spreadsheet once, for both prism and the relational tables
+                try:
+                    with upload_phase("parse"):
+                        xlsx, errors = XlTemplateReader.from_excel(xlsx_file)
+                        xlsx_rows = worksheet_rows_from_reader(xlsx)
+                except SchemasValidationError as e:
+                    raise BadRequest({"errors": [str(e)]})
+                logger.info(f"xlsx parsed: {len(errors)} errors")
+                log_multiple_errors(errors)
+                errors_so_far.extend(errors)
+
+                # Run basic validations on the provided Excel file
+                with upload_phase("validate"):
+                    validations = validate(template, xlsx)
+                logger.info(f"xlsx validated: {len(validations.json['errors'])} errors")
+                log_multiple_errors(validations.json["errors"])
+                errors_so_far.extend(validations.json["errors"])
+
+                with upload_phase("prismify"):
+                    md_patch, file_infos, errors = prism.prismify(xlsx, template)
+                logger.info(
+                    f"prismified: {len(errors)} errors, {len(file_infos)} file_infos"
+                )
+                log_multiple_errors(errors)
+                errors_so_far.extend(errors)
+
+                cached = CachedValidation(
+                    xlsx_rows, md_patch, file_infos, list(errors_so_far)
+                )
+                validation_cache.put(xlsx_hash, template.type, cached)
 
             try:
                 trial_id = md_patch[prism.PROTOCOL_ID_FIELD_NAME]
@@ -386,42 +504,70 @@ def upload_handler(allowed_types: List[str]):
                 # unauthorized to pull trial so we can't proceed trying to merge
                 raise Unauthorized({"errors": [str(e) for e in errors_so_far]})
 
-            # Try to merge assay metadata into the existing clinical trial metadata
-            # Ignoring result as we only want to check there's no validation errors
-            try:
-                merged_md, errors = prism.merge_clinical_trial_metadata(
-                    md_patch, trial.metadata_json
+            if cached.merge_errors is not None and cached.trial_etag == trial._etag:
+                logger.info("reusing cached merge results")
+                merged_md = cached.merged_metadata
+                errors_so_far.extend(cached.merge_errors)
+            else:
+                merged_md, merge_errors = None, []
+                # Try to merge assay metadata into the existing clinical trial metadata
+                try:
+                    with upload_phase("merge"):
+                        merged_md, errors = prism.merge_clinical_trial_metadata(
+                            md_patch, trial.metadata_json
+                        )
+                except ValidationError as e:
+                    merge_errors.append(json_validation.format_validation_error(e))
+                except prism.MergeCollisionException as e:
+                    merge_errors.append(str(e))
+                except prism.InvalidMergeTargetException as e:
+                    # we have an invalid MD stored in db - users can't do anything about it.
+                    # So we log it
+                    logger.error(f"Internal error with trial {trial_id!r}\n{e}")
+                    # and return an error. Though it's not BadRequest but rather an
+                    # Internal Server error we report it like that, so it will be displayed
+                    raise BadRequest(
+                        f"Internal error with {trial_id!r}. Please contact a CIDC Administrator."
+                    ) from e
+                else:
+                    merge_errors.extend(errors)
+                logger.info(f"merged: {len(merge_errors)} errors")
+                log_multiple_errors(merge_errors)
+                errors_so_far.extend(merge_errors)
+
+                validation_cache.put(
+                    xlsx_hash,
+                    template.type,
+                    cached._replace(
+                        trial_etag=trial._etag,
+                        merged_metadata=merged_md,
+                        merge_errors=merge_errors,
+                    ),
                 )
-            except ValidationError as e:
-                errors_so_far.append(json_validation.format_validation_error(e))
-            except prism.MergeCollisionException as e:
-                errors_so_far.append(str(e))
-            except prism.InvalidMergeTargetException as e:
-                # we have an invalid MD stored in db - users can't do anything about it.
-                # So we log it
-                logger.error(f"Internal error with trial {trial_id!r}\n{e}")
-                # and return an error. Though it's not BadRequest but rather an
-                # Internal Server error we report it like that, so it will be displayed
-                raise BadRequest(
-                    f"Internal error with {trial_id!r}. Please contact a CIDC Administrator."
-                ) from e
-            logger.info(f"merged: {len(errors)} errors")
-            log_multiple_errors(errors)
-            errors_so_far.extend(errors)
 
             if errors_so_far:
                 raise BadRequest({"errors": [str(e) for e in errors_so_far]})
 
-            return f(
-                user,
-                trial,
-                template.type,
-                xlsx_file,
-                md_patch,
-                file_infos,
-                *args,
-                **kwargs,
+            response = make_response(
+                f(
+                    user,
+                    trial,
+                    template.type,
+                    xlsx_file,
+                    xlsx_rows,
+                    md_patch,
+                    file_infos,
+                    # Let the write path save the merge result, if the trial hasn't changed
+                    (trial._etag, merged_md),
+                    *args,
+                    **kwargs,
+                )
+            )
+            response.headers["Server-Timing"] = ", ".join(
+                f"{name};dur={duration * 1000:.0f}"
+                for name, duration in g.upload_timings.items()
             )
+            return response
 
         return wrapped
 
@@ -449,8 +595,10 @@ def upload_manifest(
     trial: TrialMetadata,
     template_type: str,
     xlsx_file: BinaryIO,
+    xlsx_rows: WorksheetRows,
     md_patch: dict,
     file_infos: List[prism.LocalFileUploadEntry],
+    trial_merge: Tuple[str, dict],
 ):
     """
     Ingest manifest data from an excel spreadsheet.
@@ -464,11 +612,59 @@ def upload_manifest(
     Request: multipart/form
         schema: the schema identifier for this template
         template: the .xlsx file to process'
+        async: if "true", queue the upload to be merged in the background
     Response:
         201 if the upload succeeds. Otherwise, some error status code and message.
+        If `async` is "true", 202 once the upload has been checked and queued, with:
+            job_id: the unique identifier for the queued upload job
+            job_etag: the job record's etag
+            status: the job's status ("queued")
+            token: the upload job's token, for polling its status
+            status_url: the URL to poll for the job's status
     """
+    if request.form.get("async", "").lower() == "true":
+        # Checking the spreadsheet and the user's permissions is done, so hand off
+        # the merge (which locks the trial), notifications and relational inserts.
+        manifest_upload = UploadJobs.create(
+            upload_type=template_type,
+            uploader_email=user.email,
+            metadata=md_patch,
+            gcs_xlsx_uri="",  # not saving xlsx so we won't have phi-ish stuff in it
+            gcs_file_map=None,
+            commit=False,
+        )
+        session = Session.object_session(manifest_upload)
+        xlsx_file.seek(0)
+        queue_upload(manifest_upload, xlsx_file.read(), session)
+        session.commit()
+
+        res = jsonify(
+            {
+                "job_id": manifest_upload.id,
+                "job_etag": manifest_upload._etag,
+                "status": manifest_upload.status,
+                "token": manifest_upload.token,
+                "status_url": url_for(
+                    "ingestion.poll_upload_merge_status",
+                    upload_job=manifest_upload.id,
+                    token=manifest_upload.token,
+                    _external=True,
+                ),
+            }
+        )
+        res.status_code = 202
+        return res
+
+    merged_etag, merged_md = trial_merge
     try:
-        trial = TrialMetadata.patch_manifest(trial.trial_id, md_patch, commit=False)
+        with upload_phase("patch_manifest"):
+            trial = TrialMetadata.patch_manifest(
+                trial.trial_id,
+                md_patch,
+                commit=False,
+                merged_metadata=merged_md,
+                merged_etag=merged_etag,
+            )
     except ValidationError as e:
         raise BadRequest(json_validation.format_validation_error(e))
     except ValidationMultiError as e:
@@ -484,29 +680,52 @@ def upload_manifest(
         gcs_xlsx_uri="",  # not saving xlsx so we won't have phi-ish stuff in it
         gcs_file_map=None,
         session=session,
+        commit=False,
         send_email=True,
         status=UploadJobStatus.MERGE_COMPLETED.value,
     )
 
-    # Publish that a manifest upload has been received
-    gcloud_client.publish_patient_sample_update(manifest_upload.id)
+    # Publish that a manifest upload has been received, along with the upload itself
+    gcloud_client.publish_patient_sample_update(
+        manifest_upload.id, outbox=OutboxMessages.writer(session)
+    )
+    session.commit()
 
     # Relational db hook
-    from ..models.templates import TEMPLATE_MAP
-
-    template = TEMPLATE_MAP.get(template_type)
-    if template:
-        errs = template.read_and_insert(xlsx_file)
-        if errs:
-            logger.error(f"Relational errors: {errs}")
-        else:
-            logger.info("Relational success.")
-    else:
-        logger.error(f"Relational error: no template for type {template_type}")
+    insert_relational(template_type, xlsx_rows)
 
     return jsonify({"metadata_json_patch": md_patch})
 
 
+def ingest_queued_manifest(manifest_upload: UploadJobs, session: Session):
+    """
+    Merge a manifest upload queued by `upload_manifest` into its trial's metadata, then
+    notify about it and insert it into the relational tables, as `upload_manifest`
+    does for synchronous uploads. Runs in an ingestion worker, in the transaction that
+    claimed `manifest_upload`. Raises if the merge fails.
+    """
+    trial = TrialMetadata.patch_manifest(
+        manifest_upload.trial_id,
+        manifest_upload.metadata_patch,
+        session=session,
+        commit=False,
+    )
+    manifest_upload.status = UploadJobStatus.MERGE_COMPLETED.value
+    xlsx = manifest_upload.queued_xlsx
+    manifest_upload.queued_xlsx = None
+
+    manifest_upload.alert_upload_success(trial, session=session)
+    gcloud_client.publish_patient_sample_update(
+        manifest_upload.id, outbox=OutboxMessages.writer(session)
+    )
+    session.commit()
+
+    # Relational db hook
+    insert_relational(
+        manifest_upload.upload_type, read_worksheet_rows(io.BytesIO(xlsx))
+    )
+
+
 @ingestion_bp.route("/upload_assay", methods=["POST"])
 @requires_auth(
     "ingestion/upload_assay", [CIDCRole.ADMIN.value, CIDCRole.CIMAC_BIOFX_USER.value]
@@ -532,8 +751,10 @@ def upload_data_files(
     trial: TrialMetadata,
     template_type: str,
     xlsx_file: BinaryIO,
+    xlsx_rows: WorksheetRows,
     md_patch: dict,
     file_infos: List[prism.LocalFileUploadEntry],
+    trial_merge: Tuple[str, dict],
 ):
     """
     Initiate a data ingestion job.
@@ -581,9 +802,10 @@ def upload_data_files(
         if file_info.allow_empty:
             optional_files.append(file_info.local_path)
 
-    gcs_blob = gcloud_client.upload_xlsx_to_gcs(
-        trial.trial_id, "assays", template_type, xlsx_file, upload_moment
-    )
+    with upload_phase("upload_xlsx"):
+        gcs_blob = gcloud_client.upload_xlsx_to_gcs(
+            trial.trial_id, "assays", template_type, xlsx_file, upload_moment
+        )
 
     # Save the upload job to the database
     job = UploadJobs.create(
@@ -594,17 +816,7 @@ def upload_data_files(
     gcloud_client.grant_upload_access(user.email)
 
     # Relational db hook
-    from ..models.templates import TEMPLATE_MAP
-
-    template = TEMPLATE_MAP.get(template_type)
-    if template:
-        errs = template.read_and_insert(xlsx_file)
-        if errs:
-            logger.error(f"Relational errors: {errs}")
-        else:
-            logger.info("Relational success.")
-    else:
-        logger.error(f"Relational error: no template for type {template_type}")
+    insert_relational(template_type, xlsx_rows)
 
     response = {
         "job_id": job.id,
@@ -622,29 +834,68 @@ def upload_data_files(
     return jsonify(response)
 
 
+# The longest a client can wait for an upload job's status to change in one request
+MAX_POLL_WAIT_SECONDS = 25
+
+poll_args_schema = Schema.from_dict(
+    {"wait": fields.Int(validate=validate.Range(min=0), missing=0)}
+)(
+    # The upload job's "token" is also passed as a query param
+    unknown=INCLUDE
+)
+
+
 @ingestion_bp.route("/poll_upload_merge_status/<int:upload_job>", methods=["GET"])
 @requires_upload_token_auth
-def poll_upload_merge_status(upload_job: UploadJobs):
+@use_args(poll_args_schema, location="query")
+def poll_upload_merge_status(args, upload_job: UploadJobs):
     """
     Check an assay upload's status, and supply the client with directions on when to retry the check.
 
+    Query params:
+        wait {int}: if the upload hasn't finished merging, wait up to this many seconds
+            (at most MAX_POLL_WAIT_SECONDS) for its status to change before responding.
     Response: application/json
         status {str or None}: the current status of the assay_upload (empty if not MERGE_FAILED or MERGE_COMPLETED)
         status_details {str or None}: information about `status` (e.g., error details). Only present if `status` is present.
         retry_in {str or None}: the time in seconds to wait before making another request to this endpoint (empty if `status` has a value)
     Raises:
         400: no "id" query parameter is supplied
+        422: "wait" is not a non-negative integer
         401: the requesting user did not create the requested upload job
         404: no upload job with id "id" is found
     """
-    if upload_job.status in [
-        UploadJobStatus.MERGE_COMPLETED.value,
-        UploadJobStatus.MERGE_FAILED.value,
-    ]:
+
+    def merge_finished() -> bool:
+        return upload_job.status in [
+            UploadJobStatus.MERGE_COMPLETED.value,
+            UploadJobStatus.MERGE_FAILED.value,
+        ]
+
+    wait = min(args["wait"], MAX_POLL_WAIT_SECONDS)
+    listener = get_upload_status_listener()
+    waited = False
+    if wait and listener and not merge_finished():
+        session = Session.object_session(upload_job)
+        with listener.watch(upload_job.id) as status_changed:
+            # Ending the transaction expires `upload_job`, so this re-check (made only
+            # once watching, so no change is missed) reloads its status
+            session.rollback()
+            if not merge_finished():
+                # Return the connection to the pool while this request waits
+                session.rollback()
+                status_changed.wait(wait)
+                waited = True
+
+    if merge_finished():
         return jsonify(
             {"status": upload_job.status, "status_details": upload_job.status_details}
         )
 
+    # Long-polling clients can check again right away
+    if waited:
+        return jsonify({"retry_in": 0})
+
     # TODO: get smarter about retry-scheduling
     return jsonify({"retry_in": 5})
 
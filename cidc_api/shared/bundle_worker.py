@@ -0,0 +1,185 @@
+"""Background building of compressed file bundles queued in the `bundle_jobs` table."""
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.orm.session import Session
+
+from ..config.db import db
+from ..config.settings import BUNDLE_WORKERS, TESTING
+from ..config.logging import get_logger
+from ..models import BundleJobs, BundleJobStatus
+
+logger = get_logger(__name__)
+
+# How often to check for queued bundles if no commit has signalled that there are some
+POLL_INTERVAL_SECONDS = 10
+# A job still running after this long is assumed to have been lost with its instance
+STALE_AFTER = timedelta(hours=1)
+
+# Job failures are reported to clients with these messages, and logged in full
+FAILED_DETAILS = "The bundle could not be built. Please try again."
+EXPIRED_DETAILS = "The bundle job was interrupted. Please try again."
+
+# Builds a bundle of the given object URLs, returning the bundle's name
+BuildFunction = Callable[[List[str]], str]
+
+
+def expire_stale_jobs(session: Session) -> int:
+    """
+    Fail running jobs that were claimed more than `STALE_AFTER` ago, whose workers
+    have presumably died, so their clients stop polling. Returns the number expired.
+    """
+    jobs = (
+        session.query(BundleJobs)
+        .filter(
+            BundleJobs.status == BundleJobStatus.RUNNING.value,
+            BundleJobs._updated < datetime.now() - STALE_AFTER,
+        )
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for job in jobs:
+        logger.error(f"Expiring stale bundle job {job.id}")
+        job.set_status(
+            BundleJobStatus.FAILED.value,
+            status_details=EXPIRED_DETAILS,
+            session=session,
+            commit=False,
+        )
+    session.commit()
+    return len(jobs)
+
+
+def process_next(session: Session, build: BuildFunction) -> Optional[int]:
+    """
+    Claim the oldest queued bundle job and `build` its bundle. Returns the job's id,
+    or None if there were no queued jobs. If `build` raises, the job is marked as failed.
+
+    Jobs are claimed with `FOR UPDATE SKIP LOCKED` and marked as running in the same
+    transaction, so any number of workers can run at once without building a bundle
+    twice. Building a bundle can take minutes, so the claim is committed before it
+    starts rather than holding the lock (and a connection) throughout; jobs lost
+    mid-build are failed by `expire_stale_jobs` instead.
+    """
+    job = (
+        session.query(BundleJobs)
+        .filter(BundleJobs.status == BundleJobStatus.QUEUED.value)
+        .order_by(BundleJobs.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if job is None:
+        session.commit()
+        return None
+
+    job_id = job.id
+    object_urls = job.object_urls
+    job.set_status(BundleJobStatus.RUNNING.value, session=session)
+
+    try:
+        bundle_name = build(object_urls)
+    except Exception as e:
+        logger.error(f"Failed to build bundle job {job_id}: {e!r}")
+        job.set_status(
+            BundleJobStatus.FAILED.value, status_details=FAILED_DETAILS, session=session
+        )
+    else:
+        logger.info(f"Built bundle job {job_id}: {bundle_name}")
+        job.set_status(
+            BundleJobStatus.COMPLETED.value, bundle_name=bundle_name, session=session
+        )
+
+    return job_id
+
+
+class BundleWorker:
+    """
+    Builds queued bundles from a background thread (a greenlet, under gunicorn's
+    gevent workers). The worker wakes up whenever a transaction that queued a bundle
+    commits, and otherwise polls every `poll_interval` seconds to pick up bundles
+    queued by other processes and to expire stale jobs.
+    """
+
+    def __init__(
+        self,
+        app: Flask,
+        build: BuildFunction,
+        poll_interval: float = POLL_INTERVAL_SECONDS,
+    ):
+        self.app = app
+        self.build = build
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, name: str = "bundle-worker"):
+        """Start processing in a background daemon thread."""
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        """Signal the worker to check for queued bundles now."""
+        self._wakeup.set()
+
+    def process(self) -> int:
+        """Build queued bundles until there are none left. Returns the number processed."""
+        total = 0
+        with self.app.app_context():
+            try:
+                expire_stale_jobs(db.session)
+                while process_next(db.session, self.build) is not None:
+                    total += 1
+            finally:
+                db.session.remove()
+        return total
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                self.process()
+            except Exception as e:
+                logger.error(f"Bundle building failed: {e}")
+
+
+_workers: List[BundleWorker] = []
+
+
+def queue_bundle(job: BundleJobs, session: Session):
+    """
+    Queue `job` for a background worker.
+    Workers in this process are woken once `session` commits.
+    """
+    job.status = BundleJobStatus.QUEUED.value
+    session.info["bundles_pending"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_workers_on_commit(session: Session):
+    """Wake this process's workers when a transaction that queued a bundle commits."""
+    if session.info.pop("bundles_pending", False):
+        for worker in _workers:
+            worker.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_pending_on_rollback(session: Session):
+    """Bundles queued in a rolled-back transaction were discarded along with it."""
+    session.info.pop("bundles_pending", None)
+
+
+def init_bundle_workers(app: Flask, build: BuildFunction):
+    """Start `BUNDLE_WORKERS` background workers that `build` queued bundles for `app`."""
+    # Tests process queued bundles explicitly, so don't start any workers
+    if TESTING:
+        return
+
+    for i in range(BUNDLE_WORKERS):
+        worker = BundleWorker(app, build)
+        worker.start(name=f"bundle-worker-{i}")
+        _workers.append(worker)
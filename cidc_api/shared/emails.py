@@ -14,14 +14,15 @@ CIDC_MAILING_LIST = "cidc@jimmy.harvard.edu"
 def sendable(email_template):
     """
     Adds the `send` kwarg to an email template. If send_email=True, 
-    send the email on function call.
+    send the email on function call. If an `outbox` is provided, the email
+    is staged there instead of being published directly.
     """
 
     @wraps(email_template)
-    def wrapped(*args, send_email=False, **kwargs):
+    def wrapped(*args, send_email=False, outbox=None, **kwargs):
         email = email_template(*args, **kwargs)
         if send_email:
-            gcloud_client.send_email(**email)
+            gcloud_client.send_email(**email, outbox=outbox)
         return email
 
     return wrapped
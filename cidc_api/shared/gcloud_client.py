@@ -6,12 +6,26 @@ os.environ["TZ"] = "UTC"
 import datetime
 import warnings
 import hashlib
+import threading
 from collections import namedtuple
-from concurrent.futures import Future
-from typing import Any, BinaryIO, Callable, Dict, List, Optional, Union
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import requests
-from google.cloud import storage, pubsub
+from google.api_core.exceptions import Conflict, PreconditionFailed
+from google.cloud import storage
 from werkzeug.datastructures import FileStorage
 
 from ..config.settings import (
@@ -32,22 +46,50 @@ from ..config.settings import (
     ENV,
     DEV_CFUNCTIONS_SERVER,
     INACTIVE_USER_DAYS,
+    MAX_THREADPOOL_WORKERS,
+    GCLOUD_BACKEND,
+    LOCAL_GCLOUD_ROOT,
+    LOCAL_GCLOUD_LATENCY,
+    LOCAL_GCLOUD_BANDWIDTH,
 )
 from ..config.logging import get_logger
 
 logger = get_logger(__name__)
 
+# A function that accepts a message and a topic name. Publish helpers take an optional
+# `outbox` of this type to stage messages (e.g., in a database transaction) rather than
+# publishing them directly; see `models.OutboxMessages.writer`.
+Outbox = Callable[[str, str], None]
+
 _storage_client = None
 
+# Whether to use the local stand-ins for GCS and Pub/Sub (see `local_gcloud`)
+USE_LOCAL_BACKEND = GCLOUD_BACKEND == "local"
+
+
+def _get_local_latency():
+    from .local_gcloud import Latency
+
+    return Latency(LOCAL_GCLOUD_LATENCY, LOCAL_GCLOUD_BANDWIDTH)
+
 
 def _get_storage_client() -> storage.Client:
     """
     the project which the client acts on behalf of falls back to the default inferred from the environment
     see: https://googleapis.dev/python/storage/latest/client.html#google.cloud.storage.client.Client
+
+    If GCLOUD_BACKEND is "local", this is a filesystem-backed `LocalStorageClient` instead.
     """
     global _storage_client
     if _storage_client is None:
-        _storage_client = storage.Client()
+        if USE_LOCAL_BACKEND:
+            from .local_gcloud import LocalStorageClient
+
+            _storage_client = LocalStorageClient(
+                LOCAL_GCLOUD_ROOT, latency=_get_local_latency()
+            )
+        else:
+            _storage_client = storage.Client()
     return _storage_client
 
 
@@ -95,7 +137,7 @@ def upload_xlsx_to_gcs(
         upload_moment=upload_moment,
     )
 
-    if ENV == "dev":
+    if ENV == "dev" and not USE_LOCAL_BACKEND:
         logger.info(
             f"Would've saved {blob_name} to {GOOGLE_UPLOAD_BUCKET} and {GOOGLE_ACL_DATA_BUCKET}"
         )
@@ -170,6 +212,13 @@ def get_intake_bucket_name(user_email: str) -> str:
     return bucket_name
 
 
+def list_intake_bucket_names() -> List[str]:
+    """List the names of all existing user intake buckets."""
+    storage_client = _get_storage_client()
+    buckets = storage_client.list_buckets(prefix=f"{GOOGLE_INTAKE_BUCKET}-")
+    return [bucket.name for bucket in buckets]
+
+
 def create_intake_bucket(user_email: str) -> storage.Bucket:
     """
     Create a new data intake bucket for this user, or get the existing one.
@@ -234,6 +283,12 @@ def upload_xlsx_to_intake_bucket(
     return f"https://console.cloud.google.com/storage/browser/_details/{bucket_name}/{blob_name}"
 
 
+# Log progress on multi-blob ACL changes every this many blobs
+ACL_CHANGE_PROGRESS_INTERVAL = 1000
+# Name at most this many failed blobs when a multi-blob ACL change fails
+ACL_CHANGE_FAILURE_SAMPLE_SIZE = 10
+
+
 def _execute_multiblob_acl_change(
     user_email_list: List[str],
     blob_list: List[storage.Blob],
@@ -245,6 +300,11 @@ def _execute_multiblob_acl_change(
         See see https://googleapis.dev/python/storage/latest/acl.html
     After processing all of the users for each blob, blob.acl.save() is called.
 
+    Blobs are processed concurrently on up to MAX_THREADPOOL_WORKERS threads. A failure
+    on one blob doesn't stop the others; failures are logged as they happen, and an
+    exception with the number of failed blobs (naming up to ACL_CHANGE_FAILURE_SAMPLE_SIZE
+    of them) is raised once all blobs have been processed.
+
     Parameters
     ----------
     user_email_list : List[str]
@@ -253,35 +313,72 @@ def _execute_multiblob_acl_change(
     callback_fun : Callable[google.cloud.storage.acl._ACLEntity]
         each blob / user ACL entry is passed in turn
     """
-    for blob in blob_list:
+
+    def change_acl(blob: storage.Blob):
         for user_email in user_email_list:
             blob_user = blob.acl.user(user_email)
             callback_fn(blob_user)
 
         blob.acl.save()
 
+    total = len(blob_list)
+    failures: Dict[str, Exception] = {}
+    with ThreadPoolExecutor(MAX_THREADPOOL_WORKERS) as pool:
+        futures = {pool.submit(change_acl, blob): blob.name for blob in blob_list}
+        for done, future in enumerate(as_completed(futures), start=1):
+            error = future.exception()
+            if error is not None:
+                failures[futures[future]] = error
+                logger.error(f"Failed to change ACL on {futures[future]}: {error}")
+            if done % ACL_CHANGE_PROGRESS_INTERVAL == 0 or done == total:
+                logger.info(
+                    f"Changed ACLs on {done - len(failures)} of {total} blobs ({len(failures)} failed)"
+                )
 
-def get_blob_names(trial_id: Optional[str], upload_type: Optional[str]) -> List[str]:
-    prefixes = _build_trial_upload_prefixes(trial_id, upload_type)
+    if failures:
+        sample = sorted(failures)[:ACL_CHANGE_FAILURE_SAMPLE_SIZE]
+        more = len(failures) - len(sample)
+        raise Exception(
+            f"Failed to change ACLs on {len(failures)} of {total} blobs: {sample}"
+            + (f" and {more} more" if more else "")
+        )
 
-    # https://googleapis.dev/python/storage/latest/client.html#google.cloud.storage.client.Client.list_blobs
-    blob_list = []
+
+def get_blob_names(
+    trial_id: Optional[str], upload_type: Optional[str]
+) -> Iterator[str]:
+    """
+    Yield the names of all blobs in the data bucket for this trial and upload type.
+    Prefixes are listed concurrently, and each prefix's names are yielded as soon as
+    its listing finishes, so names aren't yielded in any particular order.
+    """
+    prefixes = _build_trial_upload_prefixes(trial_id, upload_type)
+    if not prefixes:
+        return
     storage_client = _get_storage_client()
-    for prefix in prefixes:
-        blob_list.extend(
-            storage_client.list_blobs(GOOGLE_ACL_DATA_BUCKET, prefix=prefix)
+
+    def list_names(prefix: str) -> List[str]:
+        # https://googleapis.dev/python/storage/latest/client.html#google.cloud.storage.client.Client.list_blobs
+        # Only request blob names, rather than full blob metadata
+        blobs = storage_client.list_blobs(
+            GOOGLE_ACL_DATA_BUCKET, prefix=prefix, fields="items(name),nextPageToken"
         )
-    return [blob.name for blob in blob_list]
+        return [blob.name for blob in blobs]
+
+    with ThreadPoolExecutor(min(len(prefixes), MAX_THREADPOOL_WORKERS)) as pool:
+        for names in as_completed([pool.submit(list_names, p) for p in prefixes]):
+            yield from names.result()
 
 
 def grant_download_access_to_blob_names(
-    user_email_list: List[str], blob_name_list: List[str],
+    user_email_list: List[str], blob_name_list: Iterable[str],
 ) -> None:
     """
     Using ACL, grant download access to all blobs given to the user(s) given.
     """
     bucket = _get_bucket(GOOGLE_ACL_DATA_BUCKET)
-    blob_list = [bucket.get_blob(name) for name in blob_name_list]
+    # Build blobs locally rather than fetching each one's metadata, since only the ACL is needed
+    blob_list = [bucket.blob(name) for name in blob_name_list]
 
     if isinstance(user_email_list, str):
         user_email_list = [user_email_list]
@@ -297,7 +394,8 @@ def grant_download_access(
     user_email_list: Union[List[str], str],
     trial_id: Optional[str],
     upload_type: Optional[str],
-) -> None:
+    outbox: Optional[Outbox] = None,
+) -> Optional[Future]:
     """
     Gives users download access to all objects in a trial of a particular upload type.
 
@@ -323,20 +421,20 @@ def grant_download_access(
         "user_email_list": user_email_list,
         "revoke": False,
     }
-    report = _encode_and_publish(str(kwargs), GOOGLE_GRANT_DOWNLOAD_PERMISSIONS_TOPIC)
-    # Wait for response from pub/sub
-    if report:
-        report.result()
+    return (outbox or _encode_and_publish)(
+        str(kwargs), GOOGLE_GRANT_DOWNLOAD_PERMISSIONS_TOPIC
+    )
 
 
 def revoke_download_access_from_blob_names(
-    user_email_list: List[str], blob_name_list: List[str],
+    user_email_list: List[str], blob_name_list: Iterable[str],
 ) -> None:
     """
     Using ACL, grant download access to all blobs given to the users given.
     """
     bucket = _get_bucket(GOOGLE_ACL_DATA_BUCKET)
-    blob_list = [bucket.get_blob(name) for name in blob_name_list]
+    # Build blobs locally rather than fetching each one's metadata, since only the ACL is needed
+    blob_list = [bucket.blob(name) for name in blob_name_list]
 
     def revoke(blob_user: storage.acl._ACLEntity):
         blob_user.revoke_owner()
@@ -352,7 +450,8 @@ def revoke_download_access(
     user_email_list: Union[str, List[str]],
     trial_id: Optional[str],
     upload_type: Optional[str],
-) -> None:
+    outbox: Optional[Outbox] = None,
+) -> Optional[Future]:
     """
     Revoke users' download access to all objects in a trial of a particular upload type.
 
@@ -375,10 +474,9 @@ def revoke_download_access(
         "user_email_list": user_email_list,
         "revoke": True,
     }
-    report = _encode_and_publish(str(kwargs), GOOGLE_GRANT_DOWNLOAD_PERMISSIONS_TOPIC)
-    # Wait for response from pub/sub
-    if report:
-        report.result()
+    return (outbox or _encode_and_publish)(
+        str(kwargs), GOOGLE_GRANT_DOWNLOAD_PERMISSIONS_TOPIC
+    )
 
 
 def _build_trial_upload_prefixes(
@@ -408,6 +506,102 @@ def _build_trial_upload_prefixes(
         ]
 
 
+# A function that modifies an IAM policy in place
+IAMChange = Callable[[storage.bucket.Policy], None]
+
+# How many times to re-read and re-apply IAM changes to a bucket whose policy
+# was modified by someone else between our read and our write
+MAX_IAM_ETAG_RETRIES = 5
+
+
+def _apply_iam_changes(bucket: storage.Bucket, changes: List[IAMChange]) -> None:
+    """
+    Apply `changes` to `bucket`'s IAM policy in one read-modify-write. If the policy's
+    etag changed before our write landed, re-read the policy and try again.
+    """
+    # see https://cloud.google.com/storage/docs/access-control/using-iam-permissions#code-samples_3
+    for attempt in range(1, MAX_IAM_ETAG_RETRIES + 1):
+        policy = bucket.get_iam_policy(requested_policy_version=3)
+        policy.version = 3
+
+        for change in changes:
+            change(policy)
+
+        try:
+            bucket.set_iam_policy(policy)
+            return
+        except (Conflict, PreconditionFailed) as e:
+            if attempt == MAX_IAM_ETAG_RETRIES:
+                logger.error(str(e))
+                raise e
+            logger.info(
+                f"IAM policy for {bucket.name} changed concurrently, retrying ({attempt}): {e}"
+            )
+        except Exception as e:
+            logger.error(str(e))
+            raise e
+
+
+class IAMBatch:
+    """
+    IAM binding changes collected per bucket, to be applied with one policy
+    read-modify-write per bucket when flushed. See `batch_iam_changes`.
+    """
+
+    def __init__(self):
+        self._changes: Dict[str, Tuple[storage.Bucket, List[IAMChange]]] = {}
+
+    def add(self, bucket: storage.Bucket, change: IAMChange) -> None:
+        """Queue `change` to `bucket`'s IAM policy."""
+        self._changes.setdefault(bucket.name, (bucket, []))[1].append(change)
+
+    def flush(self) -> None:
+        """Apply and clear all queued changes."""
+        changes, self._changes = self._changes, {}
+        for bucket, bucket_changes in changes.values():
+            logger.info(
+                f"applying {len(bucket_changes)} IAM changes to {bucket.name} at once"
+            )
+            _apply_iam_changes(bucket, bucket_changes)
+
+
+# The active IAMBatch, if any, for the current thread (greenlet, under gevent)
+_iam_batch_state = threading.local()
+
+
+@contextmanager
+def batch_iam_changes():
+    """
+    Within this block, queue bucket IAM changes made by `grant_gcs_access` and
+    `revoke_*_gcs_access` (and the `grant_*`/`revoke_*` helpers built on them)
+    instead of applying them one at a time. On exiting the block without an error,
+    the changes are applied with one policy read-modify-write per bucket.
+
+    Yields the `IAMBatch`, whose `flush` method applies the changes queued so far.
+    Nested blocks join the outermost batch.
+    """
+    batch = getattr(_iam_batch_state, "batch", None)
+    if batch is not None:
+        yield batch
+        return
+
+    batch = _iam_batch_state.batch = IAMBatch()
+    try:
+        yield batch
+    finally:
+        _iam_batch_state.batch = None
+    batch.flush()
+
+
+def _change_iam_policy(bucket: storage.Bucket, change: IAMChange) -> None:
+    """Queue `change` on the active IAM batch if there is one, otherwise apply it now."""
+    batch = getattr(_iam_batch_state, "batch", None)
+    if batch is not None:
+        batch.add(bucket, change)
+    else:
+        _apply_iam_changes(bucket, [change])
+
+
 def grant_gcs_access(
     obj: Union[storage.Blob, storage.Bucket],
     role: str,
@@ -422,26 +616,19 @@ def grant_gcs_access(
     `expiring` only matters if `iam`, set to False for IAM permissions on ACL-controlled buckets
     """
     if iam:
-        # see https://cloud.google.com/storage/docs/access-control/using-iam-permissions#code-samples_3
-        policy = obj.get_iam_policy(requested_policy_version=3)
-        policy.version = 3
-
-        # remove the existing binding if one exists so that we can recreate it with an updated TTL.
-        _find_and_pop_iam_binding(policy, role, user_email)
-
         if not expiring:
             # special value -1 for non-expiring
             binding = _build_iam_binding(obj.name, role, user_email, ttl_days=-1)
         else:
             binding = _build_iam_binding(obj.name, role, user_email)  # use default
-        # insert the binding into the policy
-        policy.bindings.append(binding)
 
-        try:
-            obj.set_iam_policy(policy)
-        except Exception as e:
-            logger.error(str(e))
-            raise e
+        def grant(policy: storage.bucket.Policy):
+            # remove the existing binding if one exists so that we can recreate it with an updated TTL.
+            _find_and_pop_iam_binding(policy, role, user_email)
+            # insert the binding into the policy
+            policy.bindings.append(binding)
+
+        _change_iam_policy(obj, grant)
 
     else:
         assert role in [
@@ -471,56 +658,42 @@ def grant_gcs_access(
 MAX_REVOKE_ALL_ITERATIONS = 250
 
 
+def _revoke_iam_binding(role: str, user_email: str, max_bindings: int) -> IAMChange:
+    """Build an IAM change that removes up to `max_bindings` of `user_email`'s bindings for `role`."""
+
+    def revoke(policy: storage.bucket.Policy):
+        # find and remove all matching policy bindings for this user if any exist
+        for i in range(max_bindings):
+            removed_binding = _find_and_pop_iam_binding(policy, role, user_email)
+            if removed_binding is None:
+                if i == 0:
+                    warnings.warn(
+                        f"Tried to revoke a non-existent download IAM permission for {user_email}"
+                    )
+                break
+
+    return revoke
+
+
 def revoke_nonexpiring_gcs_access(
     bucket: storage.Bucket, role: str, user_email: str
 ) -> None:
     """Revoke a bucket IAM policy change made by calling `grant_gcs_access` with expiring=False."""
-    # see https://cloud.google.com/storage/docs/access-control/using-iam-permissions#code-samples_3
-    policy = bucket.get_iam_policy(requested_policy_version=3)
-    policy.version = 3
-
-    # find and remove all matching policy bindings for this user if any exist
-    for i in range(GOOGLE_MAX_DOWNLOAD_PERMISSIONS):
-        removed_binding = _find_and_pop_iam_binding(policy, role, user_email)
-
-        if removed_binding is None:
-            if i == 0:
-                warnings.warn(
-                    f"Tried to revoke a non-existent download IAM permission for {user_email}"
-                )
-            break
-
-    try:
-        bucket.set_iam_policy(policy)
-    except Exception as e:
-        logger.error(str(e))
-        raise e
+    _change_iam_policy(
+        bucket, _revoke_iam_binding(role, user_email, GOOGLE_MAX_DOWNLOAD_PERMISSIONS),
+    )
 
 
 def revoke_iam_gcs_access(bucket: storage.Bucket, role: str, user_email: str) -> None:
     """Revoke a bucket IAM policy made by calling `grant_gcs_access` with iam=True."""
-    # see https://cloud.google.com/storage/docs/access-control/using-iam-permissions#code-samples_3
-    policy = bucket.get_iam_policy(requested_policy_version=3)
-    policy.version = 3
-
-    # find and remove any matching policy binding for this user
-    for i in range(MAX_REVOKE_ALL_ITERATIONS):
-        removed_binding = _find_and_pop_iam_binding(policy, role, user_email)
-        if removed_binding is None:
-            if i == 0:
-                warnings.warn(
-                    f"Tried to revoke a non-existent download IAM permission for {user_email}"
-                )
-            break
-
-    try:
-        bucket.set_iam_policy(policy)
-    except Exception as e:
-        logger.error(str(e))
-        raise e
+    _change_iam_policy(
+        bucket, _revoke_iam_binding(role, user_email, MAX_REVOKE_ALL_ITERATIONS)
+    )
 
 
-def revoke_all_download_access(user_email: str) -> None:
+def revoke_all_download_access(
+    user_email: str, outbox: Optional[Outbox] = None
+) -> Optional[Future]:
     """
     Completely revoke a user's download access to all objects in the data bucket.
     Download access is controlled by ACL.
@@ -533,10 +706,9 @@ def revoke_all_download_access(user_email: str) -> None:
         "user_email_list": [user_email],
         "revoke": True,
     }
-    report = _encode_and_publish(str(kwargs), GOOGLE_GRANT_DOWNLOAD_PERMISSIONS_TOPIC)
-    # Wait for response from pub/sub
-    if report:
-        report.result()
+    return (outbox or _encode_and_publish)(
+        str(kwargs), GOOGLE_GRANT_DOWNLOAD_PERMISSIONS_TOPIC
+    )
 
 
 user_member = lambda email: f"user:{email}"
@@ -620,6 +792,23 @@ def _find_and_pop_iam_binding(
     return binding
 
 
+def _sign_url(
+    bucket: storage.Bucket,
+    object_name: str,
+    method: str,
+    expiration: datetime.timedelta,
+) -> str:
+    """Sign a v2 URL for `object_name` in `bucket`. This is done locally and makes no HTTP requests."""
+    blob = bucket.blob(object_name)
+    full_filename = object_name.replace("/", "_").replace('"', "_").replace(" ", "_")
+    return blob.generate_signed_url(
+        version="v2",
+        expiration=expiration,
+        method=method,
+        response_disposition=f'attachment; filename="{full_filename}"',
+    )
+
+
 def get_signed_url(
     object_name: str,
     bucket_name: str = GOOGLE_ACL_DATA_BUCKET,
@@ -632,32 +821,100 @@ def get_signed_url(
     Using v2 signed urls because v4 is in Beta and response_disposition doesn't work.
     https://cloud.google.com/storage/docs/access-control/signing-urls-with-helpers
     """
-    storage_client = _get_storage_client()
-    bucket = storage_client.get_bucket(bucket_name)
-    blob = bucket.blob(object_name)
+    bucket = _get_bucket(bucket_name)
 
     # Generate the signed URL, allowing a client to use `method` for `expiry_mins` minutes
     expiration = datetime.timedelta(minutes=expiry_mins)
-    full_filename = object_name.replace("/", "_").replace('"', "_").replace(" ", "_")
-    url = blob.generate_signed_url(
-        version="v2",
-        expiration=expiration,
-        method=method,
-        response_disposition=f'attachment; filename="{full_filename}"',
-    )
+    url = _sign_url(bucket, object_name, method, expiration)
     logger.info(f"generated signed URL for {object_name}: {url}")
 
     return url
 
 
+def get_signed_urls(
+    object_names: List[str],
+    bucket_name: str = GOOGLE_ACL_DATA_BUCKET,
+    method: str = "GET",
+    expiry_mins: int = 30,
+) -> Dict[str, str]:
+    """
+    Generate signed URLs for many objects in `bucket_name` at once, returning
+    a mapping from object name to signed URL.
+
+    Signing uses the storage client's cached service account credentials and
+    doesn't fetch the bucket, so no network requests are made per object.
+    """
+    bucket = _get_bucket(bucket_name)
+    expiration = datetime.timedelta(minutes=expiry_mins)
+    urls = {
+        object_name: _sign_url(bucket, object_name, method, expiration)
+        for object_name in object_names
+    }
+    logger.info(f"generated {len(urls)} signed URLs in {bucket_name}")
+
+    return urls
+
+
+# Batch settings for the shared publisher: flush a batch after 100 messages, 1MB,
+# or 50ms - whichever comes first - so request handlers never wait on a round trip.
+# (Kept as plain keyword arguments so that importing this module doesn't import pubsub.)
+PUBSUB_BATCH_SETTINGS = dict(max_messages=100, max_bytes=1024 * 1024, max_latency=0.05)
+
+_pubsub_publisher = None
+_pubsub_publisher_pid = None
+
+
+def _get_pubsub_publisher() -> "pubsub.PublisherClient":
+    """
+    Get the process-wide Pub/Sub publisher, creating it on first use. The publisher
+    is recreated after a fork (e.g., in a new gunicorn worker), since gRPC channels
+    can't be shared across processes. The Pub/Sub client library (and gRPC) is only
+    imported here, on first use, since it's slow to import and most requests don't publish.
+
+    If GCLOUD_BACKEND is "local", this is an in-process `LocalPublisherClient` instead.
+    """
+    global _pubsub_publisher, _pubsub_publisher_pid
+    if _pubsub_publisher is None or _pubsub_publisher_pid != os.getpid():
+        if USE_LOCAL_BACKEND:
+            from .local_gcloud import LocalPublisherClient
+
+            _pubsub_publisher = LocalPublisherClient(latency=_get_local_latency())
+        else:
+            from google.cloud import pubsub
+
+            _pubsub_publisher = pubsub.PublisherClient(
+                batch_settings=pubsub.types.BatchSettings(**PUBSUB_BATCH_SETTINGS)
+            )
+        _pubsub_publisher_pid = os.getpid()
+    return _pubsub_publisher
+
+
+def _log_publish_result(content: str, topic: str) -> Callable[[Future], None]:
+    """Build a done-callback that logs the outcome of publishing `content` to `topic`."""
+
+    def callback(report: Future):
+        error = report.exception()
+        if error:
+            logger.error(
+                f"Failed to publish message {content!r} to topic {topic}: {error}"
+            )
+        else:
+            logger.debug(f"Published message {report.result()} to topic {topic}")
+
+    return callback
+
+
 def _encode_and_publish(content: str, topic: str) -> Future:
-    """Convert `content` to bytes and publish it to `topic`."""
-    pubsub_publisher = pubsub.PublisherClient()
+    """
+    Convert `content` to bytes and publish it to `topic` using the shared, batching publisher.
+    Returns immediately with a future for the publish; its outcome is logged when it resolves.
+    """
+    pubsub_publisher = _get_pubsub_publisher()
     topic = pubsub_publisher.topic_path(GOOGLE_CLOUD_PROJECT, topic)
     data = bytes(content, "utf-8")
 
-    # Don't actually publish to Pub/Sub if running locally
-    if ENV == "dev":
+    # Don't actually publish to Pub/Sub if running locally, unless using the local backend
+    if ENV == "dev" and not USE_LOCAL_BACKEND:
         if DEV_CFUNCTIONS_SERVER:
             logger.info(
                 f"Publishing message {content!r} to topic {DEV_CFUNCTIONS_SERVER}/{topic}"
@@ -686,39 +943,55 @@ def _encode_and_publish(content: str, topic: str) -> Future:
     # The Pub/Sub publisher client returns a concurrent.futures.Future
     # containing info about whether the publishing was successful.
     report = pubsub_publisher.publish(topic, data=data)
+    report.add_done_callback(_log_publish_result(content, topic))
 
     return report
 
 
-def publish_upload_success(job_id: int) -> None:
+def publish_upload_success(
+    job_id: int, outbox: Optional[Outbox] = None
+) -> Optional[Future]:
     """Publish to the uploads topic that the upload job with the provided `job_id` succeeded."""
-    report = _encode_and_publish(str(job_id), GOOGLE_UPLOAD_TOPIC)
-
-    # For now, we wait await this Future. Going forward, maybe
-    # we should look for a way to leverage asynchrony here.
-    if report:
-        report.result()
+    return (outbox or _encode_and_publish)(str(job_id), GOOGLE_UPLOAD_TOPIC)
 
 
-def publish_patient_sample_update(manifest_upload_id: int) -> None:
+def publish_patient_sample_update(
+    manifest_upload_id: int, outbox: Optional[Outbox] = None
+) -> Optional[Future]:
     """Publish to the patient_sample_update topic that a new manifest has been uploaded."""
-    report = _encode_and_publish(str(manifest_upload_id), GOOGLE_PATIENT_SAMPLE_TOPIC)
-
-    # Wait for response from pub/sub
-    if report:
-        report.result()
+    return (outbox or _encode_and_publish)(
+        str(manifest_upload_id), GOOGLE_PATIENT_SAMPLE_TOPIC
+    )
 
 
-def publish_artifact_upload(file_id: int) -> None:
+def publish_artifact_upload(
+    file_id: int, outbox: Optional[Outbox] = None
+) -> Optional[Future]:
     """Publish a downloadable file ID to the artifact_upload topic"""
-    report = _encode_and_publish(str(file_id), GOOGLE_ARTIFACT_UPLOAD_TOPIC)
+    return (outbox or _encode_and_publish)(str(file_id), GOOGLE_ARTIFACT_UPLOAD_TOPIC)
 
-    # Wait for response from pub/sub
-    if report:
-        report.result()
 
+def publish_artifact_uploads(
+    object_urls: List[str], outbox: Optional[Outbox] = None
+) -> List[Optional[Future]]:
+    """
+    Publish many downloadable file object URLs to the artifact_upload topic.
+    The shared publisher batches these into as few requests as possible.
+    """
+    publish = outbox or _encode_and_publish
+    return [
+        publish(str(object_url), GOOGLE_ARTIFACT_UPLOAD_TOPIC)
+        for object_url in object_urls
+    ]
 
-def send_email(to_emails: List[str], subject: str, html_content: str, **kw) -> None:
+
+def send_email(
+    to_emails: List[str],
+    subject: str,
+    html_content: str,
+    outbox: Optional[Outbox] = None,
+    **kw,
+) -> Optional[Future]:
     """
     Publish an email-to-send to the emails topic.
     `kw` are expected to be sendgrid json api style additional email parameters. 
@@ -732,8 +1005,4 @@ def send_email(to_emails: List[str], subject: str, html_content: str, **kw) -> N
         dict(to_emails=to_emails, subject=subject, html_content=html_content, **kw)
     )
 
-    report = _encode_and_publish(email_json, GOOGLE_EMAILS_TOPIC)
-
-    # Await confirmation that the published message was received.
-    if report:
-        report.result()
+    return (outbox or _encode_and_publish)(email_json, GOOGLE_EMAILS_TOPIC)
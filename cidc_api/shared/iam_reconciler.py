@@ -0,0 +1,206 @@
+"""
+Reconcile GCS bucket IAM bindings with the access the database says users should have.
+
+Rather than replaying grants and revokes, the reconciler computes the desired set of
+members for each managed role from the `users`, `permissions` and `upload_jobs` tables,
+diffs that against the bucket's live policy, and writes only the difference back in a
+single `set_iam_policy` call per bucket.
+
+Only single-member `user:` bindings for the managed role are considered, since those
+are the only kind the API creates. Other bindings are never touched. A binding whose
+expiry condition has passed doesn't grant access, so it's replaced with a fresh one if
+its user should still have access.
+"""
+import re
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Set, Tuple
+
+from google.cloud import storage
+from sqlalchemy.orm.session import Session
+
+from . import gcloud_client
+from .gcloud_client import (
+    _apply_iam_changes,
+    _build_iam_binding,
+    get_intake_bucket_name,
+    user_member,
+)
+from ..config.settings import (
+    GOOGLE_ACL_DATA_BUCKET,
+    GOOGLE_INTAKE_ROLE,
+    GOOGLE_LISTER_ROLE,
+    GOOGLE_UPLOAD_BUCKET,
+    GOOGLE_UPLOAD_ROLE,
+    INACTIVE_USER_DAYS,
+)
+from ..config.logging import get_logger
+from ..models import (
+    CIDCRole,
+    Permissions,
+    UploadJobs,
+    UploadJobStatus,
+    Users,
+    with_default_session,
+)
+
+logger = get_logger(__name__)
+
+
+class BindingDiff(NamedTuple):
+    """The bindings for `role` on `bucket` that need to be added or removed."""
+
+    bucket: str
+    role: str
+    to_add: List[str]
+    to_remove: List[str]
+
+
+def _active_users(session: Session):
+    """Query for users who may hold GCS access at all."""
+    return session.query(Users).filter(
+        Users.disabled == False, Users.role != CIDCRole.NETWORK_VIEWER.value
+    )
+
+
+def desired_lister_members(session: Session) -> Set[str]:
+    """Users who should be able to list the data bucket: active users with any permissions."""
+    users = _active_users(session).filter(
+        Users.id.in_(session.query(Permissions.granted_to_user))
+    )
+    return {user.email for user in users}
+
+
+def desired_upload_members(session: Session) -> Set[str]:
+    """Users who should be able to write to the upload bucket: those with an upload in progress."""
+    uploaders = session.query(UploadJobs.uploader_email).filter(
+        UploadJobs.status == UploadJobStatus.STARTED.value
+    )
+    users = _active_users(session).filter(Users.email.in_(uploaders))
+    return {user.email for user in users}
+
+
+def _managed_member(binding: dict, role: str) -> Optional[str]:
+    """If `binding` is a single-user binding for `role`, return the user's email."""
+    if binding.get("role") != role:
+        return None
+    members = list(binding.get("members", ()))
+    if len(members) != 1 or not members[0].startswith(user_member("")):
+        return None
+    return members[0][len(user_member("")) :]
+
+
+# Matches the expiry condition `_build_iam_binding` puts on expiring bindings
+EXPIRY_CONDITION = re.compile(r'request\.time < timestamp\("([^"]+)"\)')
+
+
+def _is_expired(binding: dict) -> bool:
+    """Whether `binding` has an expiry condition that has already passed."""
+    expression = (binding.get("condition") or {}).get("expression", "")
+    match = EXPIRY_CONDITION.fullmatch(expression.strip())
+    if not match:
+        return False
+    expiry = datetime.strptime(match.group(1), "%Y-%m-%dT%H:%M:%SZ")
+    return expiry <= datetime.utcnow()
+
+
+def _is_stale(binding: dict, role: str, desired: Set[str]) -> bool:
+    """Whether `binding` is a managed binding that should be removed."""
+    member = _managed_member(binding, role)
+    return member is not None and (member not in desired or _is_expired(binding))
+
+
+def diff_bindings(
+    policy: storage.bucket.Policy, role: str, desired: Set[str]
+) -> Tuple[Set[str], Set[str]]:
+    """
+    Return the (to_add, to_remove) user emails that would make `policy` match `desired`.
+    Users with expired bindings are in both, if they should still have access.
+    """
+    current = {
+        _managed_member(b, role) for b in policy.bindings if not _is_expired(b)
+    } - {None}
+    stale = {
+        _managed_member(b, role) for b in policy.bindings if _is_stale(b, role, desired)
+    }
+    return desired - current, stale
+
+
+def reconcile_bucket(
+    bucket: storage.Bucket,
+    role: str,
+    desired: Set[str],
+    expiring: bool = False,
+    dry_run: bool = False,
+) -> BindingDiff:
+    """
+    Make the single-user bindings for `role` on `bucket` match the `desired` user emails.
+    New bindings expire after INACTIVE_USER_DAYS if `expiring`, matching `grant_gcs_access`.
+    If `dry_run`, only compute the difference.
+    """
+    policy = bucket.get_iam_policy(requested_policy_version=3)
+    to_add, to_remove = diff_bindings(policy, role, desired)
+    diff = BindingDiff(bucket.name, role, sorted(to_add), sorted(to_remove))
+    if dry_run or not (to_add or to_remove):
+        return diff
+
+    ttl_days = INACTIVE_USER_DAYS if expiring else -1
+
+    def reconcile(policy: storage.bucket.Policy):
+        # Recompute against the policy being written, in case it changed since we read it
+        to_add, to_remove = diff_bindings(policy, role, desired)
+        policy.bindings[:] = [
+            b for b in policy.bindings if not _is_stale(b, role, desired)
+        ]
+        for email in sorted(to_add):
+            policy.bindings.append(
+                _build_iam_binding(bucket.name, role, email, ttl_days=ttl_days)
+            )
+
+    logger.info(
+        f"reconciling {role} on {bucket.name}: adding {diff.to_add}, removing {diff.to_remove}"
+    )
+    _apply_iam_changes(bucket, [reconcile])
+
+    return diff
+
+
+@with_default_session
+def reconcile_iam(session: Session, dry_run: bool = False) -> List[BindingDiff]:
+    """
+    Reconcile lister bindings on the data bucket, uploader bindings on the upload bucket,
+    and each intake bucket's owner binding with the database. Returns the non-empty diffs,
+    which were applied unless `dry_run`.
+    """
+    diffs = [
+        reconcile_bucket(
+            gcloud_client._get_bucket(GOOGLE_ACL_DATA_BUCKET),
+            GOOGLE_LISTER_ROLE,
+            desired_lister_members(session),
+            dry_run=dry_run,
+        ),
+        reconcile_bucket(
+            gcloud_client._get_bucket(GOOGLE_UPLOAD_BUCKET),
+            GOOGLE_UPLOAD_ROLE,
+            desired_upload_members(session),
+            dry_run=dry_run,
+        ),
+    ]
+
+    # Intake buckets belong to a single user, who should have access as long as they're active
+    owners = {
+        get_intake_bucket_name(user.email): user.email
+        for user in _active_users(session)
+    }
+    for bucket_name in gcloud_client.list_intake_bucket_names():
+        owner = owners.get(bucket_name)
+        diffs.append(
+            reconcile_bucket(
+                gcloud_client._get_bucket(bucket_name),
+                GOOGLE_INTAKE_ROLE,
+                {owner} if owner else set(),
+                expiring=True,
+                dry_run=dry_run,
+            )
+        )
+
+    return [diff for diff in diffs if diff.to_add or diff.to_remove]
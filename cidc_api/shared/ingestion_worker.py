@@ -0,0 +1,159 @@
+"""Background processing of manifest uploads queued in the `upload_jobs` table."""
+import threading
+from typing import Callable, List, Optional
+
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.orm.session import Session
+
+from ..config.db import db
+from ..config.settings import INGESTION_WORKERS, TESTING
+from ..config.logging import get_logger
+from ..models import UploadJobs, UploadJobStatus
+
+logger = get_logger(__name__)
+
+# How often to check for queued uploads if no commit has signalled that there are some
+POLL_INTERVAL_SECONDS = 10
+
+# Processes a claimed upload job within the given session, committing when done
+IngestFunction = Callable[[UploadJobs, Session], None]
+
+
+def process_next(session: Session, ingest: IngestFunction) -> Optional[int]:
+    """
+    Claim the oldest queued upload job and `ingest` it. Returns the job's id, or None
+    if there were no queued jobs. If `ingest` raises, the job is marked as failed.
+
+    Jobs are claimed with `FOR UPDATE SKIP LOCKED`, and stay locked until `ingest`
+    commits, so any number of workers (e.g., several per gunicorn worker) can run at
+    once without processing a job twice. A job whose worker dies mid-ingestion is
+    unlocked by the rollback and picked up again by another worker.
+    """
+    job = (
+        session.query(UploadJobs)
+        .filter(UploadJobs._status == UploadJobStatus.QUEUED.value)
+        .order_by(UploadJobs.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if job is None:
+        session.commit()
+        return None
+
+    job_id = job.id
+    try:
+        ingest(job, session)
+    except Exception as e:
+        logger.error(f"Failed to ingest upload job {job_id}: {e}")
+        session.rollback()
+        # Record the failure in a fresh transaction, so nothing from `ingest` is kept,
+        # unless another worker has claimed the job since the rollback unlocked it
+        job = (
+            session.query(UploadJobs)
+            .filter(
+                UploadJobs.id == job_id,
+                UploadJobs._status == UploadJobStatus.QUEUED.value,
+            )
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if job is not None:
+            job.status = UploadJobStatus.MERGE_FAILED.value
+            job.status_details = str(e)
+            job.queued_xlsx = None
+        session.commit()
+    else:
+        logger.info(f"Ingested upload job {job_id}")
+
+    return job_id
+
+
+class IngestionWorker:
+    """
+    Processes queued upload jobs from a background thread (a greenlet, under gunicorn's
+    gevent workers). The worker wakes up whenever a transaction that queued an upload
+    commits, and otherwise polls every `poll_interval` seconds to pick up uploads
+    queued by other processes.
+    """
+
+    def __init__(
+        self,
+        app: Flask,
+        ingest: IngestFunction,
+        poll_interval: float = POLL_INTERVAL_SECONDS,
+    ):
+        self.app = app
+        self.ingest = ingest
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, name: str = "ingestion-worker"):
+        """Start processing in a background daemon thread."""
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        """Signal the worker to check for queued uploads now."""
+        self._wakeup.set()
+
+    def process(self) -> int:
+        """Process queued uploads until there are none left. Returns the number processed."""
+        total = 0
+        with self.app.app_context():
+            try:
+                while process_next(db.session, self.ingest) is not None:
+                    total += 1
+            finally:
+                db.session.remove()
+        return total
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                self.process()
+            except Exception as e:
+                logger.error(f"Upload ingestion failed: {e}")
+
+
+_workers: List[IngestionWorker] = []
+
+
+def queue_upload(job: UploadJobs, xlsx: bytes, session: Session):
+    """
+    Queue `job`, whose spreadsheet is `xlsx`, for a background worker.
+    Workers in this process are woken once `session` commits.
+    """
+    job.status = UploadJobStatus.QUEUED.value
+    job.queued_xlsx = xlsx
+    session.info["ingestion_pending"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_workers_on_commit(session: Session):
+    """Wake this process's workers when a transaction that queued an upload commits."""
+    if session.info.pop("ingestion_pending", False):
+        for worker in _workers:
+            worker.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_pending_on_rollback(session: Session):
+    """Uploads queued in a rolled-back transaction were discarded along with it."""
+    session.info.pop("ingestion_pending", None)
+
+
+def init_ingestion_workers(app: Flask, ingest: IngestFunction):
+    """Start `INGESTION_WORKERS` background workers that `ingest` queued uploads for `app`."""
+    # Tests process queued uploads explicitly, so don't start any workers
+    if TESTING:
+        return
+
+    for i in range(INGESTION_WORKERS):
+        worker = IngestionWorker(app, ingest)
+        worker.start(name=f"ingestion-worker-{i}")
+        _workers.append(worker)
@@ -0,0 +1,414 @@
+"""
+Local stand-ins for the Google Cloud Storage and Pub/Sub clients used by `gcloud_client`.
+
+`LocalStorageClient` keeps buckets, objects, ACLs and IAM policies in a directory on disk,
+and `LocalPublisherClient` delivers published messages to in-process queues. Both inject
+a configurable `Latency` into every operation that would be an API request, so that
+throughput-sensitive code paths can be benchmarked realistically without network access.
+
+Set `GCLOUD_BACKEND=local` to make `gcloud_client` use these instead of the real clients.
+Only the parts of the client APIs that the CIDC API uses are implemented.
+"""
+import base64
+import datetime
+import hashlib
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Union
+from urllib.parse import quote, unquote
+
+import google_crc32c
+from google.api_core.exceptions import NotFound, PreconditionFailed
+from google.api_core.iam import Policy
+
+
+class Latency(NamedTuple):
+    """
+    Simulated network cost of an API call: a fixed delay per request, plus transfer
+    time at `bytes_per_second` for requests that upload or download object data.
+    """
+
+    per_request: float = 0.0
+    bytes_per_second: Optional[float] = None
+
+    def wait(self, nbytes: int = 0):
+        delay = self.per_request
+        if self.bytes_per_second:
+            delay += nbytes / self.bytes_per_second
+        if delay > 0:
+            time.sleep(delay)
+
+
+# Objects are stored one file per object, named by their URL-quoted object name,
+# so this prefix (which URL-quoting always escapes) can't collide with an object.
+_TMP_PREFIX = "#tmp"
+
+
+def _write_atomic(path: str, data: bytes):
+    """Write `data` to `path` so that concurrent readers never see a partial file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=_TMP_PREFIX)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class LocalACLEntity:
+    """An ACL entry for a single user, like `google.cloud.storage.acl._ACLEntity`."""
+
+    def __init__(self, roles: set):
+        self.roles = roles
+
+    def grant_read(self):
+        self.roles.add("READER")
+
+    def grant_write(self):
+        self.roles.add("WRITER")
+
+    def grant_owner(self):
+        self.roles.add("OWNER")
+
+    def revoke_read(self):
+        self.roles.discard("READER")
+
+    def revoke_write(self):
+        self.roles.discard("WRITER")
+
+    def revoke_owner(self):
+        self.roles.discard("OWNER")
+
+
+class LocalObjectACL:
+    """
+    A blob's ACL, like `google.cloud.storage.acl.ObjectACL`: it's loaded with one
+    request the first time an entry is accessed, and saved with another.
+    """
+
+    def __init__(self, blob: "LocalBlob"):
+        self.blob = blob
+        self.entries: Dict[str, set] = {}
+        self.loaded = False
+
+    @property
+    def _path(self) -> str:
+        return self.blob.bucket._meta_path("acls", self.blob.name)
+
+    def reload(self):
+        self.blob.bucket.client.latency.wait()
+        if not self.blob.exists(_request=False):
+            raise NotFound(f"No such object: {self.blob.bucket.name}/{self.blob.name}")
+        try:
+            with open(self._path) as f:
+                self.entries = {
+                    entity: set(roles) for entity, roles in json.load(f).items()
+                }
+        except FileNotFoundError:
+            self.entries = {}
+        self.loaded = True
+
+    def user(self, email: str) -> LocalACLEntity:
+        if not self.loaded:
+            self.reload()
+        return LocalACLEntity(self.entries.setdefault(f"user-{email}", set()))
+
+    def get_entities(self) -> List[str]:
+        if not self.loaded:
+            self.reload()
+        return [entity for entity, roles in self.entries.items() if roles]
+
+    def save(self):
+        self.blob.bucket.client.latency.wait()
+        if not self.blob.exists(_request=False):
+            raise NotFound(f"No such object: {self.blob.bucket.name}/{self.blob.name}")
+        entries = {entity: sorted(roles) for entity, roles in self.entries.items()}
+        _write_atomic(self._path, json.dumps(entries).encode("utf-8"))
+
+
+class LocalBlob:
+    """An object in a `LocalBucket`, like `google.cloud.storage.Blob`."""
+
+    def __init__(self, bucket: "LocalBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+        self.acl = LocalObjectACL(self)
+        self.size: Optional[int] = None
+        self.md5_hash: Optional[str] = None
+        self.crc32c: Optional[str] = None
+        self.time_created: Optional[datetime.datetime] = None
+
+    @property
+    def _path(self) -> str:
+        return os.path.join(self.bucket._path, "objects", quote(self.name, safe=""))
+
+    def _load_properties(self):
+        with open(self._path, "rb") as f:
+            data = f.read()
+        self.size = len(data)
+        self.md5_hash = base64.b64encode(hashlib.md5(data).digest()).decode("utf-8")
+        crc = google_crc32c.Checksum(data)
+        self.crc32c = base64.b64encode(crc.digest()).decode("utf-8")
+        self.time_created = datetime.datetime.fromtimestamp(
+            os.path.getmtime(self._path), tz=datetime.timezone.utc
+        )
+
+    def exists(self, _request: bool = True) -> bool:
+        if _request:
+            self.bucket.client.latency.wait()
+        return os.path.isfile(self._path)
+
+    def reload(self):
+        self.bucket.client.latency.wait()
+        if not self.exists(_request=False):
+            raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+        self._load_properties()
+
+    def upload_from_string(self, data: Union[str, bytes], content_type: str = None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.bucket.client.latency.wait(len(data))
+        _write_atomic(self._path, data)
+        self._load_properties()
+
+    def upload_from_file(self, file_obj: BinaryIO, **kw):
+        self.upload_from_string(file_obj.read())
+
+    def upload_from_filename(self, filename: str, **kw):
+        with open(filename, "rb") as f:
+            self.upload_from_string(f.read())
+
+    def download_as_bytes(self) -> bytes:
+        if not self.exists(_request=False):
+            raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+        with open(self._path, "rb") as f:
+            data = f.read()
+        self.bucket.client.latency.wait(len(data))
+        return data
+
+    download_as_string = download_as_bytes
+
+    def download_to_filename(self, filename: str):
+        data = self.download_as_bytes()
+        with open(filename, "wb") as f:
+            f.write(data)
+
+    def generate_signed_url(
+        self,
+        expiration: datetime.timedelta,
+        method: str = "GET",
+        version: str = "v2",
+        response_disposition: str = None,
+        **kw,
+    ) -> str:
+        """Like real URL signing, this is done locally and takes no simulated latency."""
+        expires = int(time.time() + expiration.total_seconds())
+        return f"file://{self._path}?method={method}&expires={expires}"
+
+
+class LocalBucket:
+    """A directory of objects, like `google.cloud.storage.Bucket`."""
+
+    def __init__(self, client: "LocalStorageClient", name: str):
+        self.client = client
+        self.name = name
+        self.iam_configuration = SimpleNamespace(
+            uniform_bucket_level_access_enabled=False
+        )
+
+    @property
+    def _path(self) -> str:
+        return os.path.join(self.client.root, self.name)
+
+    def _meta_path(self, kind: str, name: str) -> str:
+        return os.path.join(self._path, kind, f"{quote(name, safe='')}.json")
+
+    def exists(self) -> bool:
+        self.client.latency.wait()
+        return os.path.isdir(self._path)
+
+    def blob(self, name: str) -> LocalBlob:
+        return LocalBlob(self, name)
+
+    def get_blob(self, name: str) -> Optional[LocalBlob]:
+        blob = self.blob(name)
+        try:
+            blob.reload()
+        except NotFound:
+            return None
+        return blob
+
+    def list_blobs(self, prefix: str = None, **kw) -> Iterator[LocalBlob]:
+        return self.client.list_blobs(self, prefix=prefix, **kw)
+
+    def copy_blob(
+        self, blob: LocalBlob, destination_bucket: "LocalBucket", new_name: str = None
+    ) -> LocalBlob:
+        # Copies happen within GCS, so they don't pay for data transfer
+        self.client.latency.wait()
+        if not blob.exists(_request=False):
+            raise NotFound(f"No such object: {self.name}/{blob.name}")
+        new_blob = destination_bucket.blob(new_name or blob.name)
+        with open(blob._path, "rb") as f:
+            _write_atomic(new_blob._path, f.read())
+        new_blob._load_properties()
+        return new_blob
+
+    def get_iam_policy(self, requested_policy_version: int = None) -> Policy:
+        self.client.latency.wait()
+        return self._read_iam_policy()
+
+    def _read_iam_policy(self) -> Policy:
+        try:
+            with open(self._meta_path("iam", "policy")) as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            stored = {"etag": "0", "bindings": []}
+        policy = Policy(etag=stored["etag"], version=3)
+        policy.bindings = [
+            {**binding, "members": set(binding["members"])}
+            for binding in stored["bindings"]
+        ]
+        return policy
+
+    def set_iam_policy(self, policy: Policy) -> Policy:
+        """Like GCS, reject writes whose etag shows they were based on a stale read."""
+        self.client.latency.wait()
+        with self.client._lock(self.name):
+            current = self._read_iam_policy()
+            if policy.etag != current.etag:
+                raise PreconditionFailed(f"stale etag for {self.name} IAM policy")
+            stored = {
+                "etag": str(int(current.etag) + 1),
+                "bindings": [
+                    {**binding, "members": sorted(binding["members"])}
+                    for binding in policy.bindings
+                ],
+            }
+            _write_atomic(
+                self._meta_path("iam", "policy"), json.dumps(stored).encode("utf-8")
+            )
+        return policy
+
+
+class LocalStorageClient:
+    """
+    Buckets in directories under `root`, like `google.cloud.storage.Client`.
+    Every simulated API request waits on `latency`.
+    """
+
+    # How many blobs GCS returns per page when listing
+    PAGE_SIZE = 1000
+
+    def __init__(self, root: str, latency: Latency = Latency()):
+        self.root = root
+        self.latency = latency
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _lock(self, bucket_name: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(bucket_name, threading.Lock())
+
+    def bucket(self, bucket_name: str) -> LocalBucket:
+        return LocalBucket(self, bucket_name)
+
+    def get_bucket(self, bucket_name: str) -> LocalBucket:
+        bucket = self.bucket(bucket_name)
+        if not bucket.exists():
+            raise NotFound(f"No such bucket: {bucket_name}")
+        return bucket
+
+    def create_bucket(self, bucket_or_name: Union[LocalBucket, str]) -> LocalBucket:
+        self.latency.wait()
+        bucket = (
+            self.bucket(bucket_or_name)
+            if isinstance(bucket_or_name, str)
+            else bucket_or_name
+        )
+        os.makedirs(os.path.join(bucket._path, "objects"), exist_ok=True)
+        return bucket
+
+    def list_buckets(self, prefix: str = "", **kw) -> Iterator[LocalBucket]:
+        self.latency.wait()
+        for name in sorted(os.listdir(self.root)):
+            if name.startswith(prefix):
+                yield self.bucket(name)
+
+    def list_blobs(
+        self,
+        bucket_or_name: Union[LocalBucket, str],
+        prefix: str = None,
+        fields: str = None,
+        **kw,
+    ) -> Iterator[LocalBlob]:
+        """List blobs in name order, waiting on `latency` once per page like GCS."""
+        bucket = (
+            self.bucket(bucket_or_name)
+            if isinstance(bucket_or_name, str)
+            else bucket_or_name
+        )
+        try:
+            filenames = os.listdir(os.path.join(bucket._path, "objects"))
+        except FileNotFoundError:
+            raise NotFound(f"No such bucket: {bucket.name}")
+        names = sorted(
+            unquote(filename)
+            for filename in filenames
+            if not filename.startswith(_TMP_PREFIX)
+        )
+        names = [name for name in names if name.startswith(prefix or "")]
+
+        self.latency.wait()
+        for i, name in enumerate(names):
+            if i and i % self.PAGE_SIZE == 0:
+                self.latency.wait()
+            blob = bucket.blob(name)
+            # Only load properties if the caller asked for more than names
+            if fields is None or "items(name)" not in fields:
+                blob._load_properties()
+            yield blob
+
+
+class LocalPublisherClient:
+    """
+    Delivers published messages to in-process queues, one per topic, like
+    `google.cloud.pubsub.PublisherClient`. Publishing returns a future immediately;
+    the message is enqueued and the future resolved after `latency`, on one of
+    `max_workers` background threads.
+    """
+
+    def __init__(self, latency: Latency = Latency(), max_workers: int = 10):
+        self.latency = latency
+        self.topics: Dict[str, queue.Queue] = {}
+        self._topics_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._next_message_id = 0
+
+    def topic_path(self, project: str, topic: str) -> str:
+        return f"projects/{project}/topics/{topic}"
+
+    def topic_queue(self, topic: str) -> queue.Queue:
+        """Get the queue that messages published to `topic` are delivered to."""
+        with self._topics_lock:
+            return self.topics.setdefault(topic, queue.Queue())
+
+    def _deliver(self, topic: str, data: bytes) -> str:
+        self.latency.wait(len(data))
+        with self._topics_lock:
+            self._next_message_id += 1
+            message_id = str(self._next_message_id)
+        self.topic_queue(topic).put(data)
+        return message_id
+
+    def publish(self, topic: str, data: bytes, **attrs) -> Future:
+        if not isinstance(data, bytes):
+            raise TypeError(
+                "Data being published to Pub/Sub must be sent as a bytestring."
+            )
+        return self._executor.submit(self._deliver, topic, data)
@@ -0,0 +1,166 @@
+"""Background dispatch of Pub/Sub messages staged in the `outbox_messages` table."""
+import threading
+import time
+from datetime import timedelta
+from typing import Optional
+
+from flask import Flask
+from sqlalchemy import event, func
+from sqlalchemy.orm.session import Session
+
+from . import gcloud_client
+from ..config.db import db
+from ..config.settings import TESTING
+from ..config.logging import get_logger
+from ..models import OutboxMessages
+
+logger = get_logger(__name__)
+
+# The maximum number of messages to claim and publish at once
+BATCH_SIZE = 100
+# How often to check for messages if no commit has signalled that there are some
+POLL_INTERVAL_SECONDS = 10
+# How long to wait on Pub/Sub to acknowledge a batch of claimed messages
+PUBLISH_TIMEOUT_SECONDS = 30
+# Failed messages are retried with exponential backoff, capped at this delay
+MAX_RETRY_DELAY_SECONDS = 600
+
+
+def dispatch_pending(session: Session, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Claim up to `batch_size` messages that are ready to publish, publish them all,
+    then delete the ones that were published and reschedule the ones that weren't.
+    Returns the number of messages claimed.
+
+    Rows are claimed with `FOR UPDATE SKIP LOCKED`, so any number of dispatchers
+    (e.g., one per gunicorn worker) can run at once without double-publishing.
+    """
+    messages = (
+        session.query(OutboxMessages)
+        .filter(OutboxMessages.available_at <= func.now())
+        .order_by(OutboxMessages.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not messages:
+        session.commit()
+        return 0
+
+    # Send everything before waiting on anything, so the shared publisher can batch
+    reports = []
+    for message in messages:
+        try:
+            reports.append(
+                gcloud_client._encode_and_publish(message.data, message.topic)
+            )
+        except Exception as e:
+            reports.append(e)
+
+    # Wait on the whole batch against one deadline, so a stalled Pub/Sub can't hold
+    # the claimed rows' locks for longer than that. Anything unacknowledged by then
+    # is rescheduled.
+    deadline = time.monotonic() + PUBLISH_TIMEOUT_SECONDS
+    for message, report in zip(messages, reports):
+        try:
+            if isinstance(report, Exception):
+                raise report
+            if report:
+                report.result(timeout=max(deadline - time.monotonic(), 0))
+        except Exception as e:
+            delay = min(2 ** message.attempts, MAX_RETRY_DELAY_SECONDS)
+            logger.error(
+                f"Failed to publish outbox message {message.id} to {message.topic} "
+                f"(attempt {message.attempts + 1}), retrying in {delay}s: {e}"
+            )
+            message.attempts += 1
+            message.last_error = str(e)
+            message.available_at = func.now() + timedelta(seconds=delay)
+        else:
+            session.delete(message)
+
+    session.commit()
+    return len(messages)
+
+
+class OutboxDispatcher:
+    """
+    Publishes outbox messages from a background thread (a greenlet, under gunicorn's
+    gevent workers). The dispatcher wakes up whenever a transaction that staged
+    messages commits, and otherwise polls every `poll_interval` seconds to pick up
+    retries and messages staged by other processes.
+    """
+
+    def __init__(
+        self,
+        app: Flask,
+        poll_interval: float = POLL_INTERVAL_SECONDS,
+        batch_size: int = BATCH_SIZE,
+    ):
+        self.app = app
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start dispatching in a background daemon thread."""
+        self._thread = threading.Thread(
+            target=self._run, name="outbox-dispatcher", daemon=True
+        )
+        self._thread.start()
+
+    def wake(self):
+        """Signal the dispatcher to check for messages now."""
+        self._wakeup.set()
+
+    def dispatch(self) -> int:
+        """Publish all ready messages. Returns the number of messages claimed."""
+        total = 0
+        with self.app.app_context():
+            try:
+                while True:
+                    claimed = dispatch_pending(db.session, self.batch_size)
+                    total += claimed
+                    if claimed < self.batch_size:
+                        break
+            finally:
+                db.session.remove()
+        return total
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                self.dispatch()
+            except Exception as e:
+                logger.error(f"Outbox dispatch failed: {e}")
+
+
+_dispatcher: Optional[OutboxDispatcher] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_dispatcher_on_commit(session: Session):
+    """Wake this process's dispatcher when a transaction that staged messages commits."""
+    if session.info.pop("outbox_pending", False) and _dispatcher is not None:
+        _dispatcher.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_pending_on_rollback(session: Session):
+    """Messages staged in a rolled-back transaction were discarded along with it."""
+    session.info.pop("outbox_pending", None)
+
+
+def init_outbox(app: Flask):
+    """Start publishing outbox messages in the background for `app`."""
+    global _dispatcher
+
+    # Tests publish nothing, so don't start a dispatcher
+    if TESTING:
+        return
+
+    _dispatcher = OutboxDispatcher(app)
+    _dispatcher.start()
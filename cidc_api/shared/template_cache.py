@@ -0,0 +1,154 @@
+"""
+Empty Excel templates, generated once and then served from memory.
+
+Generating a template from its schema is slow, so `build_template_cache` generates every
+supported template in parallel into a directory once per instance, in the background as
+the server starts (see `on_starting` in gunicorn.conf.py). Each worker's `TemplateCache`
+then loads a template from that directory - or, if it isn't there yet, generates it there -
+on first request, and keeps its bytes and ETag in memory. Since all workers serve the same
+bytes, their ETags agree.
+
+Usage:
+    python -m cidc_api.shared.template_cache <directory>
+"""
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from cidc_schemas import prism, template
+
+TEMPLATE_FAMILIES = ["manifests", "metadata", "analyses"]
+
+
+class CachedTemplate(NamedTuple):
+    data: bytes
+    etag: str
+
+
+def generate_template(template_family: str, template_type: str) -> Optional[bytes]:
+    """Generate an empty Excel template, returning None if no such template exists."""
+    schema_path = os.path.join(
+        "templates", template_family, f"{template_type}_template.json"
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        template_path = os.path.join(tmp_dir, f"{template_type}_template.xlsx")
+        try:
+            template.generate_empty_template(schema_path, template_path)
+        except FileNotFoundError:
+            return None
+        with open(template_path, "rb") as f:
+            return f.read()
+
+
+def _get_template_path(directory: str, template_family: str, template_type: str):
+    return os.path.join(directory, template_family, f"{template_type}_template.xlsx")
+
+
+def _write_template(path: str, data: bytes):
+    """Write `data` to a temporary file, then move it into place, so readers never see a partial template."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build_template_cache(directory: str, max_workers: Optional[int] = None) -> int:
+    """
+    Generate every supported template into `directory`, in parallel processes,
+    replacing any templates already there. Returns the number of templates generated.
+
+    Workers may be reading from and writing to `directory` meanwhile, so templates
+    are built in a temporary directory and then moved into place one by one.
+    """
+    parent_dir = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent_dir, exist_ok=True)
+    # Build alongside `directory`, so that templates can be moved into place atomically
+    build_dir = tempfile.mkdtemp(dir=parent_dir)
+    try:
+        # Template types don't say which family they belong to, so try each family
+        families, types = zip(
+            *[
+                (family, template_type)
+                for family in TEMPLATE_FAMILIES
+                for template_type in prism.SUPPORTED_TEMPLATES
+            ]
+        )
+        built = []
+        with ProcessPoolExecutor(max_workers) as pool:
+            for family, template_type, data in zip(
+                families, types, pool.map(generate_template, families, types)
+            ):
+                if data is not None:
+                    build_path = _get_template_path(build_dir, family, template_type)
+                    os.makedirs(os.path.dirname(build_path), exist_ok=True)
+                    with open(build_path, "wb") as f:
+                        f.write(data)
+                    built.append((family, template_type))
+
+        for family, template_type in built:
+            path = _get_template_path(directory, family, template_type)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(_get_template_path(build_dir, family, template_type), path)
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+    return len(built)
+
+
+class TemplateCache:
+    """In-memory cache of empty Excel templates, backed by the templates in `directory`."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._templates: Dict[Tuple[str, str], CachedTemplate] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, template_family: str, template_type: str) -> Optional[bytes]:
+        path = _get_template_path(self.directory, template_family, template_type)
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+
+        data = generate_template(template_family, template_type)
+        if data is not None:
+            # Share the generated template with the other workers on this instance
+            _write_template(path, data)
+        return data
+
+    def get(self, template_family: str, template_type: str) -> Optional[CachedTemplate]:
+        """Get a template, returning None if no such template exists."""
+        key = (template_family, template_type)
+        if key not in self._templates:
+            with self._lock:
+                if key not in self._templates:
+                    data = self._load(template_family, template_type)
+                    # Don't cache misses, since template names come from request URLs
+                    if data is None:
+                        return None
+                    etag = hashlib.sha256(data).hexdigest()
+                    self._templates[key] = CachedTemplate(data, etag)
+        return self._templates[key]
+
+
+# Templates are expensive to load, so share one cache per templates directory
+_template_caches: Dict[str, TemplateCache] = {}
+
+
+def get_template_cache(directory: str) -> TemplateCache:
+    if directory not in _template_caches:
+        _template_caches[directory] = TemplateCache(directory)
+    return _template_caches[directory]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit(__doc__.split("\n\n")[-1])
+    print(f"Generated {build_template_cache(sys.argv[1])} templates in {sys.argv[1]}")
@@ -0,0 +1,149 @@
+"""
+Notifications of upload job status changes, for long-polling clients.
+
+A trigger on `upload_jobs` sends a Postgres notification on the `upload_job_status`
+channel, with the job's id as payload, whenever a job's status changes - whether the
+change is made by this API or by the cloud functions. Each process runs one
+`UploadStatusListener`, which listens on that channel over a dedicated connection and
+wakes any requests waiting on the job, so a single connection serves every waiting
+request in the process.
+"""
+import select
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Set
+
+from flask import Flask
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from ..config.db import db
+from ..config.settings import TESTING
+from ..config.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Notified by the `upload_jobs_status_notify` trigger (see migrations)
+CHANNEL = "upload_job_status"
+# How long to wait for a notification before checking that the connection is alive
+KEEPALIVE_SECONDS = 60
+# How long to wait before reconnecting after the listening connection fails
+RECONNECT_SECONDS = 5
+
+
+class UploadStatusListener:
+    """
+    Listens for upload job status changes from a background thread (a greenlet, under
+    gunicorn's gevent workers, where `select` and psycopg2 are patched to cooperate).
+    """
+
+    def __init__(self, app: Flask):
+        self.app = app
+        self.connected = threading.Event()
+        self._waiters: Dict[int, Set[threading.Event]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start listening in a background daemon thread."""
+        self._thread = threading.Thread(
+            target=self._run, name="upload-status-listener", daemon=True
+        )
+        self._thread.start()
+
+    @contextmanager
+    def watch(self, job_id: int) -> Iterator[threading.Event]:
+        """
+        Get an event that is set when upload job `job_id`'s status changes. Check the
+        job's status after starting to watch it, so no change can be missed.
+        """
+        changed = threading.Event()
+        with self._lock:
+            self._waiters[job_id].add(changed)
+        try:
+            yield changed
+        finally:
+            with self._lock:
+                self._waiters[job_id].discard(changed)
+                if not self._waiters[job_id]:
+                    del self._waiters[job_id]
+
+    def notify(self, job_id: int):
+        """Wake everything watching upload job `job_id`."""
+        with self._lock:
+            waiters = list(self._waiters.get(job_id, []))
+        for changed in waiters:
+            changed.set()
+
+    def _notify_all(self):
+        with self._lock:
+            waiters = [changed for w in self._waiters.values() for changed in w]
+        for changed in waiters:
+            changed.set()
+
+    def _listen(self):
+        with self.app.app_context():
+            # Take a connection out of the pool for good, since it's never returned
+            connection = db.engine.raw_connection()
+        connection.detach()
+        dbapi_connection = connection.connection
+        try:
+            dbapi_connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            self.connected.set()
+            logger.info(f"Listening for notifications on {CHANNEL}")
+
+            while True:
+                readable, _, _ = select.select(
+                    [dbapi_connection], [], [], KEEPALIVE_SECONDS
+                )
+                if not readable:
+                    # Check that the connection is still alive
+                    with dbapi_connection.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                    continue
+
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    notification = dbapi_connection.notifies.pop(0)
+                    try:
+                        self.notify(int(notification.payload))
+                    except ValueError:
+                        logger.error(f"Unexpected {CHANNEL} payload: {notification}")
+        finally:
+            self.connected.clear()
+            dbapi_connection.close()
+
+    def _run(self):
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                logger.error(f"Listening on {CHANNEL} failed: {e}")
+            # Notifications may have been missed, so have waiting requests check now
+            self._notify_all()
+            time.sleep(RECONNECT_SECONDS)
+
+
+_listener: Optional[UploadStatusListener] = None
+
+
+def get_upload_status_listener() -> Optional[UploadStatusListener]:
+    """Get this process's listener, or None if it isn't currently listening."""
+    if _listener is not None and _listener.connected.is_set():
+        return _listener
+    return None
+
+
+def init_upload_status_listener(app: Flask):
+    """Start listening for upload job status changes in the background for `app`."""
+    global _listener
+
+    # Tests don't long-poll, so don't hold a connection open for listening
+    if TESTING:
+        return
+
+    _listener = UploadStatusListener(app)
+    _listener.start()
@@ -0,0 +1,97 @@
+"""
+Results of checking uploaded spreadsheets, kept so that uploading a spreadsheet right
+after validating it doesn't repeat the work.
+
+Clients usually call `/ingestion/validate` and then upload the same file. Parsing,
+validating and prismifying a spreadsheet depend only on its contents and template type,
+so they're cached under those. The dry-run merge also depends on the trial's metadata,
+so its result and errors are cached along with the `_etag` of the trial they were merged
+into, and are only reused while the trial is unchanged. Permissions are never cached.
+
+The cache is in-memory, so it only helps when both requests reach the same worker; on
+a miss, the upload is checked from scratch as usual.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, BinaryIO, List, NamedTuple, Optional, Tuple
+
+from cidc_schemas.prism import LocalFileUploadEntry
+
+# Spreadsheets can be large once parsed, so only keep the most recent few
+MAX_ENTRIES = 16
+# Validation is usually followed by an upload within a few minutes
+TTL_SECONDS = 15 * 60
+
+
+class CachedValidation(NamedTuple):
+    xlsx_rows: dict
+    md_patch: dict
+    file_infos: List[LocalFileUploadEntry]
+    errors: List[Any]
+    # The `_etag` of the trial the patch was dry-run merged into, and the merge's results
+    trial_etag: Optional[str] = None
+    merged_metadata: Optional[dict] = None
+    merge_errors: Optional[List[Any]] = None
+
+
+def hash_xlsx(xlsx_file: BinaryIO) -> str:
+    """Get the sha256 hex digest of an uploaded file, leaving it at its start."""
+    xlsx_file.seek(0)
+    digest = hashlib.sha256(xlsx_file.read()).hexdigest()
+    xlsx_file.seek(0)
+    return digest
+
+
+def _copy_documents(entry: CachedValidation) -> CachedValidation:
+    return entry._replace(
+        md_patch=copy.deepcopy(entry.md_patch),
+        merged_metadata=copy.deepcopy(entry.merged_metadata),
+    )
+
+
+class ValidationCache:
+    """A size- and age-bounded LRU cache of `CachedValidation`s."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: float = TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, CachedValidation]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get(self, xlsx_hash: str, template_type: str) -> Optional[CachedValidation]:
+        """
+        Get the cached validation of a spreadsheet, if there is one. The patch and merged
+        metadata are copies, so callers are free to modify them.
+        """
+        key = (xlsx_hash, template_type)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            cached_at, entry = self._entries[key]
+            if time.monotonic() - cached_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return _copy_documents(entry)
+
+    def put(self, xlsx_hash: str, template_type: str, entry: CachedValidation):
+        """Cache the validation of a spreadsheet, evicting the least recently used if full."""
+        key = (xlsx_hash, template_type)
+        entry = _copy_documents(entry)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+validation_cache = ValidationCache()
@@ -1,8 +1,11 @@
 """Configuration for the gunicorn WSGI server."""
 import os
+import subprocess
+import sys
 
 from gevent.monkey import patch_all
 from psycogreen.gevent import patch_psycopg
+from grpc.experimental import gevent as grpc_gevent
 
 # The "gevent" worker class that we select below uses
 # greenlets under the hood. Greenlets monkeypatch I/O
@@ -10,6 +13,10 @@ from psycogreen.gevent import patch_psycopg
 # gevent docs: http://www.gevent.org/
 patch_all()
 patch_psycopg()  # our postgres db driver needs to be patched directly
+# gRPC's C-core doesn't use python sockets, so it must be told to cooperate with
+# the gevent hub; otherwise the shared Pub/Sub publisher's background batch commits
+# block the worker's event loop.
+grpc_gevent.init_gevent()
 
 # Use async workers: https://docs.gunicorn.org/en/stable/design.html#async-workers
 worker_class = "gevent"
@@ -23,3 +30,21 @@ loglevel = "DEBUG" if reload else "INFO"
 timeout = 500
 # Send all logs to stdout (where App Engine reads them from)
 errorlog = "-"
+
+
+def on_starting(server):
+    """
+    Start generating the empty Excel templates, in parallel, in the background, so
+    that workers can load them instead of each generating their own. Workers don't
+    wait for it: until a template has been generated, the first worker to need it
+    generates it on request, as before.
+    """
+    # This must match TEMPLATES_DIR in cidc_api/config/settings.py. It runs in a separate
+    # process so that the settings, and their secrets, aren't loaded in the master process.
+    templates_dir = os.path.join("/tmp", "templates")
+    try:
+        subprocess.Popen(
+            [sys.executable, "-m", "cidc_api.shared.template_cache", templates_dir]
+        )
+    except OSError as e:
+        server.log.warning(f"Failed to start pregenerating Excel templates: {e}")
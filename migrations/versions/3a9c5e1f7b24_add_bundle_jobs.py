@@ -0,0 +1,58 @@
+"""add bundle_jobs
+
+Revision ID: 3a9c5e1f7b24
+Revises: b5edaa4713e3
+Create Date: 2022-01-31 10:12:44.517203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "3a9c5e1f7b24"
+down_revision = "b5edaa4713e3"
+branch_labels = None
+depends_on = None
+
+
+bundle_job_status = postgresql.ENUM(
+    "queued", "running", "completed", "failed", name="bundle_job_status"
+)
+
+
+def upgrade():
+    op.create_table(
+        "bundle_jobs",
+        sa.Column("_created", sa.DateTime(), nullable=True),
+        sa.Column("_updated", sa.DateTime(), nullable=True),
+        sa.Column("_etag", sa.String(length=40), nullable=True),
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("status", bundle_job_status, nullable=False),
+        sa.Column("status_details", sa.String(), nullable=True),
+        sa.Column("requester_email", sa.String(), nullable=False),
+        sa.Column(
+            "object_urls", postgresql.JSONB(astext_type=sa.Text()), nullable=False
+        ),
+        sa.Column("bundle_name", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["requester_email"],
+            ["users.email"],
+            name="bundle_jobs_requester_email_fkey",
+            onupdate="CASCADE",
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_bundle_jobs_requester_email"),
+        "bundle_jobs",
+        ["requester_email"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_bundle_jobs_requester_email"), table_name="bundle_jobs")
+    op.drop_table("bundle_jobs")
+    bundle_job_status.drop(op.get_bind())
@@ -0,0 +1,41 @@
+"""add queued upload jobs
+
+Revision ID: 5d8f2c6a9b13
+Revises: e41b8d7a6c05
+Create Date: 2022-02-14 10:02:31.117284
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "5d8f2c6a9b13"
+down_revision = "e41b8d7a6c05"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Postgres (before 12) can't add enum values inside a transaction
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE upload_job_status ADD VALUE IF NOT EXISTS 'queued'")
+
+    op.add_column(
+        "upload_jobs", sa.Column("queued_xlsx", sa.LargeBinary(), nullable=True)
+    )
+    # Workers claim the oldest queued job, so index just the queued ones
+    op.create_index(
+        "upload_jobs_queued_idx",
+        "upload_jobs",
+        ["id"],
+        postgresql_where=sa.text("status = 'queued'"),
+    )
+
+
+def downgrade():
+    op.drop_index("upload_jobs_queued_idx", table_name="upload_jobs")
+    op.drop_column("upload_jobs", "queued_xlsx")
+    # Postgres can't drop enum values, so fail any jobs that were still queued
+    op.execute(
+        "UPDATE upload_jobs SET status = 'merge-failed', status_details = 'queued job abandoned by downgrade' WHERE status = 'queued'"
+    )
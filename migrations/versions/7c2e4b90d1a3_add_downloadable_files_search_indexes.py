@@ -0,0 +1,37 @@
+"""add trigram search indexes to downloadable_files
+
+Revision ID: 7c2e4b90d1a3
+Revises: 3a9c5e1f7b24
+Create Date: 2022-02-03 15:41:08.210947
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "7c2e4b90d1a3"
+down_revision = "3a9c5e1f7b24"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "CREATE INDEX downloadable_files_object_url_trgm_idx "
+        "ON downloadable_files USING gin (object_url gin_trgm_ops)"
+    )
+    op.execute(
+        "CREATE INDEX downloadable_files_additional_metadata_trgm_idx "
+        "ON downloadable_files USING gin ((CAST(additional_metadata AS TEXT)) gin_trgm_ops)"
+    )
+
+
+def downgrade():
+    op.drop_index(
+        "downloadable_files_additional_metadata_trgm_idx",
+        table_name="downloadable_files",
+    )
+    op.drop_index(
+        "downloadable_files_object_url_trgm_idx", table_name="downloadable_files"
+    )
@@ -0,0 +1,45 @@
+"""notify upload job status changes
+
+Revision ID: 8b3e1f4d7c20
+Revises: 5d8f2c6a9b13
+Create Date: 2022-02-21 09:41:12.503218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "8b3e1f4d7c20"
+down_revision = "5d8f2c6a9b13"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Notify listeners on the `upload_job_status` channel with the id of any upload job
+    # whose status changes, including changes made outside the API (e.g., by the
+    # cloud functions)
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_upload_job_status() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('upload_job_status', NEW.id::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER upload_jobs_status_notify
+        AFTER UPDATE OF status ON upload_jobs
+        FOR EACH ROW
+        WHEN (OLD.status IS DISTINCT FROM NEW.status)
+        EXECUTE PROCEDURE notify_upload_job_status()
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS upload_jobs_status_notify ON upload_jobs")
+    op.execute("DROP FUNCTION IF EXISTS notify_upload_job_status()")
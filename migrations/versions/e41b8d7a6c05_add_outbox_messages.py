@@ -0,0 +1,42 @@
+"""add outbox_messages
+
+Revision ID: e41b8d7a6c05
+Revises: 7c2e4b90d1a3
+Create Date: 2022-02-07 11:26:53.904418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "e41b8d7a6c05"
+down_revision = "7c2e4b90d1a3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "outbox_messages",
+        sa.Column("_created", sa.DateTime(), nullable=True),
+        sa.Column("_updated", sa.DateTime(), nullable=True),
+        sa.Column("_etag", sa.String(length=40), nullable=True),
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("topic", sa.String(), nullable=False),
+        sa.Column("data", sa.String(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.Column("available_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_outbox_messages_available_at"),
+        "outbox_messages",
+        ["available_at"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_outbox_messages_available_at"), table_name="outbox_messages")
+    op.drop_table("outbox_messages")
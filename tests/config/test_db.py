@@ -0,0 +1,63 @@
+from unittest.mock import MagicMock
+
+import pytest
+from flask import Flask
+
+from cidc_api.config import db as db_module
+from cidc_api.config.db import (
+    DatabaseNotMigratedError,
+    check_db_revision,
+    db,
+    init_db,
+)
+from cidc_api.config.settings import MIGRATIONS_PATH
+
+OLDER_REVISION = "7c2e4b90d1a3"
+
+
+def set_db_revision(revision: str) -> str:
+    """Set the database's alembic revision, returning the revision it was at."""
+    current = db.session.execute("select version_num from alembic_version").scalar()
+    db.session.execute(
+        "update alembic_version set version_num = :revision", {"revision": revision}
+    )
+    db.session.commit()
+    return current
+
+
+def test_check_db_revision(cidc_api):
+    """Check that serving instances refuse to start on an unmigrated database"""
+    with cidc_api.app_context():
+        # The test database is migrated when the app is imported
+        check_db_revision(MIGRATIONS_PATH)
+
+        head = set_db_revision(OLDER_REVISION)
+        try:
+            with pytest.raises(DatabaseNotMigratedError, match=OLDER_REVISION):
+                check_db_revision(MIGRATIONS_PATH)
+
+            # A revision newer than any this code knows about is fine
+            set_db_revision("from-the-future")
+            check_db_revision(MIGRATIONS_PATH)
+        finally:
+            set_db_revision(head)
+
+
+def test_init_db_skips_migrations(cidc_api, monkeypatch):
+    """Check that init_db only checks the revision if MIGRATE_ON_STARTUP is off"""
+    upgrade = MagicMock()
+    monkeypatch.setattr(db_module, "upgrade", upgrade)
+    check = MagicMock()
+    monkeypatch.setattr(db_module, "check_db_revision", check)
+
+    app = Flask(__name__)
+    app.config.update(cidc_api.config)
+    app.config["MIGRATE_ON_STARTUP"] = False
+    init_db(app)
+    upgrade.assert_not_called()
+    check.assert_called_once_with(MIGRATIONS_PATH)
+
+    app = Flask(__name__)
+    app.config.update(cidc_api.config)
+    init_db(app)
+    upgrade.assert_called_once_with(MIGRATIONS_PATH)
@@ -0,0 +1,80 @@
+from unittest.mock import MagicMock
+
+import pytest
+from cryptography.fernet import Fernet
+from google.api_core.exceptions import NotFound
+
+from cidc_api.config import secrets
+from cidc_api.config.secrets import (
+    CloudStorageSecretManager,
+    SecretNotFoundError,
+    SecretsFileCache,
+)
+
+
+def mock_secrets_bucket(monkeypatch, contents: dict) -> MagicMock:
+    """Mock the secrets bucket, returning a mock that records the secrets downloaded."""
+    downloaded = MagicMock()
+
+    def blob(name):
+        def download_as_bytes():
+            downloaded(name)
+            if name not in contents:
+                raise NotFound(name)
+            return contents[name].encode("utf-8")
+
+        return MagicMock(download_as_bytes=download_as_bytes)
+
+    client = MagicMock()
+    client.bucket.return_value.blob = blob
+    monkeypatch.setattr(secrets.storage, "Client", lambda: client)
+    return downloaded
+
+
+def test_get_secrets(monkeypatch):
+    """Check that secrets are fetched together, and only once"""
+    downloaded = mock_secrets_bucket(monkeypatch, {"a": "1", "b": "2", "c": "3"})
+    manager = CloudStorageSecretManager("secrets")
+
+    assert manager.get_many(["a", "b"]) == {"a": "1", "b": "2"}
+    assert downloaded.call_count == 2
+    assert manager.get("b") == "2"
+    assert manager.get("c") == "3"
+    assert downloaded.call_count == 3
+
+    with pytest.raises(SecretNotFoundError, match="no secret"):
+        manager.get("d")
+
+
+def test_secrets_file_cache(monkeypatch, tmp_path):
+    """Check that secrets are cached encrypted on disk until they expire"""
+    downloaded = mock_secrets_bucket(monkeypatch, {"a": "secret-a"})
+    key = Fernet.generate_key()
+    cache = SecretsFileCache(str(tmp_path / "secrets"), key, ttl=3600)
+
+    assert CloudStorageSecretManager("secrets", cache=cache).get("a") == "secret-a"
+    assert b"secret-a" not in (tmp_path / "secrets").read_bytes()
+
+    # A new manager using the same cache doesn't need to download anything
+    assert CloudStorageSecretManager("secrets", cache=cache).get("a") == "secret-a"
+    assert downloaded.call_count == 1
+
+    # Expired or undecryptable caches are ignored
+    expired = SecretsFileCache(cache.path, key, ttl=-1)
+    assert expired.load() == {}
+    rekeyed = SecretsFileCache(cache.path, Fernet.generate_key(), ttl=3600)
+    assert rekeyed.load() == {}
+    assert CloudStorageSecretManager("secrets", cache=rekeyed).get("a") == "secret-a"
+    assert downloaded.call_count == 2
+
+
+def test_get_secrets_manager(monkeypatch):
+    """Check that one secrets manager is shared per secrets bucket"""
+    mock_secrets_bucket(monkeypatch, {})
+    monkeypatch.setattr(secrets, "_secrets_managers", {})
+    monkeypatch.setenv("GOOGLE_SECRETS_BUCKET", "secrets")
+    monkeypatch.delenv("SECRETS_CACHE_KEY", raising=False)
+
+    manager = secrets.get_secrets_manager()
+    assert manager is secrets.get_secrets_manager()
+    assert manager.cache is None
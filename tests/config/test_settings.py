@@ -13,6 +13,7 @@ def test_google_app_credentials(monkeypatch):
     get_secret_manager = MagicMock()
     get_secret_manager.return_value = secret_manager = MagicMock()
     secret_manager.get.return_value = "foobar"
+    secret_manager.get_many.side_effect = lambda names: {n: "foobar" for n in names}
     monkeypatch.setattr(
         "cidc_api.config.secrets.get_secrets_manager", get_secret_manager
     )
@@ -11,7 +11,10 @@ os.environ["TESTING"] = "True"
 os.environ["DEBUG"] = "False"
 
 from cidc_api.app import app
+from cidc_api.shared.validation_cache import validation_cache
 from cidc_api.models import (
+    BundleJobs,
+    OutboxMessages,
     UploadJobs,
     Users,
     DownloadableFiles,
@@ -68,6 +71,8 @@ def clean_db(cidc_api):
         session = cidc_api.extensions["sqlalchemy"].db.session
         with session.no_autoflush:
             session.query(UploadJobs).delete()
+            session.query(BundleJobs).delete()
+            session.query(OutboxMessages).delete()
             session.query(NGSAssayFiles)  # before Files and NGSUpload
             session.query(HandeRecord).delete()  # before HandeUpload and HandeImage
             session.query(HandeImage).delete()  # before File
@@ -91,4 +96,7 @@ def clean_db(cidc_api):
             session.query(Permissions).delete()
             session.commit()
 
+    # Cached validations would refer to trials from previous tests
+    validation_cache.clear()
+
     return session
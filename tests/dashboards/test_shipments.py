@@ -2,6 +2,7 @@ import os
 
 os.environ["TZ"] = "UTC"
 from datetime import datetime
+from unittest.mock import MagicMock
 
 from dash.testing.composite import DashComposite
 
@@ -13,6 +14,8 @@ from cidc_api.models import (
     CIDCRole,
     TrialMetadata,
 )
+from cidc_api import dashboards
+from cidc_api.dashboards import LazyDashboards, init_dashboard_servers
 from cidc_api.dashboards.shipments import (
     get_manifest_samples,
     get_trial_shipments,
@@ -161,6 +164,7 @@ def test_shipments_dashboard(cidc_api, clean_db, monkeypatch, dash_duo: DashComp
     Check that the shipments dashboard behaves as expected.
     """
     user, _, _ = setup_data(cidc_api, clean_db)
+    init_dashboard_servers(cidc_api)
 
     for role in ROLES:
         make_role(user.id, role, cidc_api)
@@ -217,3 +221,35 @@ def test_get_trial_shipments(cidc_api, clean_db):
             assert shipment["cidc_received"] in [u._created for u in upload_jobs]
             assert shipment["participant_count"] == num_participants
             assert shipment["sample_count"] == sum(num_samples)
+
+
+def test_lazy_dashboards(cidc_api, monkeypatch):
+    """Check that dashboards are only loaded once a dashboard is requested"""
+    init_servers = MagicMock(wraps=init_dashboard_servers)
+    monkeypatch.setattr(dashboards, "init_dashboard_servers", init_servers)
+    monkeypatch.setattr(cidc_api, "wsgi_app", LazyDashboards(cidc_api))
+    client = cidc_api.test_client()
+
+    client.get("/info/assays")
+    init_servers.assert_not_called()
+
+    res = client.get("/dashboards/upload_jobs/")
+    assert res.status_code == 200
+    assert b"_dash-renderer" in res.data
+    client.get("/dashboards/upload_jobs/_dash-layout")
+    init_servers.assert_called_once()
+
+
+def test_dashboard_servers(cidc_api):
+    """Check that dashboard servers share the app's CORS policy and error handlers"""
+    servers = init_dashboard_servers(cidc_api)
+    server = servers[shipments_dashboard.config.url_base_pathname]
+
+    handle_errors = cidc_api.error_handler_spec[None][None][Exception]
+    assert server.error_handler_spec[None][None][Exception] is handle_errors
+
+    origin = "http://localhost:3000"
+    res = server.test_client().get(
+        "/dashboards/upload_jobs/", headers={"Origin": origin}
+    )
+    assert res.headers["Access-Control-Allow-Origin"] == origin
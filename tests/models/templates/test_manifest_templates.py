@@ -45,6 +45,19 @@ def test_pbmc_template(clean_db, cidc_api, tmp_path):
     assert_pbmc_worked(cidc_api, clean_db)
 
 
+def test_pbmc_template_bulk_insert(clean_db, cidc_api):
+    """Check that bulk inserts insert the same records as merges, and can be repeated"""
+    with cidc_api.app_context():
+        set_up_example_trial(clean_db, cidc_api)
+
+        for _ in range(2):
+            records = PbmcManifest.read(os.path.join(EXAMPLE_DIR, "pbmc_manifest.xlsx"))
+            errors = insert_record_batch(records, bulk=True)
+            assert len(errors) == 0, "\n".join(str(e) for e in errors)
+
+    assert_pbmc_worked(cidc_api, clean_db)
+
+
 def assert_pbmc_worked(cidc_api, clean_db):
     with cidc_api.app_context():
         shipments = clean_db.query(Shipment).all()
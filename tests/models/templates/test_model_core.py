@@ -1,10 +1,13 @@
 from unittest.mock import MagicMock
 import pytest
 
-from cidc_api.models import MetadataModel
+from cidc_api.models import MetadataModel, NGSUpload, Upload, WESUpload
+from cidc_api.models.templates import model_core
 
 
-def test_metadata_model():
+def test_metadata_model(monkeypatch):
+    # column metadata is cached per class, so give MetadataModel itself a table
+    monkeypatch.setattr(model_core, "_model_infos", {})
     md = MetadataModel()
     tbl = MagicMock()
     tbl.columns = [
@@ -19,8 +22,8 @@ def test_metadata_model():
     tbl.columns[2].primary_key = False
     tbl.columns[2].unique = False
 
-    setattr(md, "__table__", tbl)
-    setattr(md, "__tablename__", "table")
+    monkeypatch.setattr(MetadataModel, "__table__", tbl, raising=False)
+    monkeypatch.setattr(MetadataModel, "__tablename__", "table", raising=False)
     setattr(md, "foo", "foo")
     setattr(md, "bar", "bar")
     setattr(md, "baz", "baz")
@@ -31,7 +34,6 @@ def test_metadata_model():
         md.merge(MagicMock())
 
     other = MetadataModel()
-    setattr(other, "__table__", tbl)
     setattr(other, "foo", None)
     setattr(other, "bar", "bar")
     setattr(other, "baz", None)
@@ -43,3 +45,20 @@ def test_metadata_model():
     setattr(other, "bar", "bag")
     with pytest.raises(Exception, match="found conflicting values for"):
         md.merge(other)
+
+
+def test_model_info():
+    """Check that model_info covers a model's own and its superclasses' tables"""
+    info = WESUpload.model_info
+    assert WESUpload.model_info is info
+    assert info.bases.issuperset({NGSUpload, Upload, MetadataModel})
+    assert info.tablenames == {"wes_uploads", "ngs_uploads", "uploads"}
+    assert [c.table.name for c in info.columns][0] == "wes_uploads"
+    assert {c.table.name for c in info.columns} == info.tablenames
+    assert {(c.table.name, c.name) for c in info.primary_key_columns} == {
+        (table, column) for table in info.tablenames for column in ["id", "trial_id"]
+    }
+    assert set(info.primary_key_columns).issubset(info.unique_columns)
+    assert {fk.column.table.name for fk in info.foreign_keys}.issuperset(
+        {"ngs_uploads", "uploads", "clinical_trials"}
+    )
@@ -2,7 +2,12 @@ import os.path
 from collections import OrderedDict
 from unittest.mock import MagicMock
 
-from cidc_api.models.templates import in_single_transaction, PbmcManifest, TEMPLATE_MAP
+from cidc_api.models.templates import (
+    in_single_transaction,
+    read_worksheet_rows,
+    PbmcManifest,
+    TEMPLATE_MAP,
+)
 
 from .utils import set_up_example_trial
 from .examples import EXAMPLE_DIR
@@ -81,3 +86,28 @@ def test_error_handling(cidc_api, clean_db):
         )
         assert len(errors) == 1
         assert "Missing required value" in str(errors[0])
+
+
+def test_read_worksheet_rows(cidc_api, clean_db):
+    """Check that templates can be read from already-parsed worksheet rows"""
+    pbmc_path = os.path.join(EXAMPLE_DIR, "pbmc_manifest.xlsx")
+    worksheet_rows = read_worksheet_rows(pbmc_path)
+    samples = worksheet_rows["Samples"]
+    assert all(isinstance(row, tuple) for row in samples)
+    assert len(set(len(row) for row in samples)) == 1
+    # Annotated but empty data rows at the end of the worksheet are dropped
+    assert len(samples) < PbmcManifest.DATA_ROWS
+    assert any(value is not None for value in samples[-1][1:])
+
+    with cidc_api.app_context():
+        set_up_example_trial(clean_db, cidc_api)
+
+        from_file = PbmcManifest.read(pbmc_path)
+        from_rows = PbmcManifest.read(worksheet_rows)
+        assert list(from_rows) == list(from_file)
+        assert [len(v) for v in from_rows.values()] == [
+            len(v) for v in from_file.values()
+        ]
+
+        errors = PbmcManifest.read_and_insert(worksheet_rows)
+        assert len(errors) == 0, "\n".join(str(e) for e in errors)
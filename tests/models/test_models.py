@@ -8,7 +8,7 @@ import os
 
 os.environ["TZ"] = "UTC"
 from datetime import datetime, timedelta
-from unittest.mock import MagicMock, call
+from unittest.mock import ANY, MagicMock, call
 
 import pytest
 from sqlalchemy.exc import IntegrityError, InvalidRequestError
@@ -320,6 +320,16 @@ def test_create_trial_metadata(clean_db):
         TrialMetadata(trial_id="foo", metadata_json={"buzz": "bazz"}).insert()
 
 
+def test_trial_metadata_validator():
+    """Check that the trial metadata validator is still importable by its old name"""
+    from cidc_api.models.models import (
+        get_trial_metadata_validator,
+        trial_metadata_validator,
+    )
+
+    assert trial_metadata_validator is get_trial_metadata_validator()
+
+
 @db_test
 def test_trial_metadata_insert(clean_db):
     """Test that metadata validation on insert works as expected"""
@@ -397,6 +407,54 @@ def test_trial_metadata_patch_manifest(clean_db):
     )
 
 
+@db_test
+def test_trial_metadata_patch_manifest_merged(clean_db, monkeypatch):
+    """Check that patch_manifest saves a prior merge result if the trial hasn't changed"""
+    metadata_with_participant = METADATA.copy()
+    metadata_with_participant["participants"] = [
+        {
+            "samples": [],
+            "cimac_participant_id": "CTSTP01",
+            "participant_id": "trial a",
+            "cohort_name": "Arm_Z",
+        }
+    ]
+    trial = TrialMetadata.create(TRIAL_ID, METADATA)
+    merged_md, errs = prism.merge_clinical_trial_metadata(
+        metadata_with_participant, trial.metadata_json
+    )
+    assert not errs
+
+    merge = MagicMock(wraps=prism.merge_clinical_trial_metadata)
+    monkeypatch.setattr(prism, "merge_clinical_trial_metadata", merge)
+
+    # A stale merge result is ignored, and the patch is merged again
+    TrialMetadata.patch_manifest(
+        TRIAL_ID,
+        metadata_with_participant,
+        merged_metadata={**merged_md, "nct_id": "stale"},
+        merged_etag="stale-etag",
+    )
+    merge.assert_called_once()
+    trial = TrialMetadata.find_by_trial_id(TRIAL_ID)
+    assert trial.metadata_json["nct_id"] != "stale"
+
+    # A merge result for the current version of the trial is saved without merging
+    merge.reset_mock()
+    trial.update(changes={"metadata_json": METADATA})
+    etag = trial._etag
+    TrialMetadata.patch_manifest(
+        TRIAL_ID,
+        metadata_with_participant,
+        merged_metadata=merged_md,
+        merged_etag=etag,
+    )
+    merge.assert_not_called()
+    trial = TrialMetadata.find_by_trial_id(TRIAL_ID)
+    assert trial.metadata_json == merged_md
+    assert trial._etag != etag
+
+
 @db_test
 def test_trial_metadata_patch_assay(clean_db):
     """Update assay data in a trial_metadata record"""
@@ -828,7 +886,85 @@ def test_create_downloadable_file_from_metadata(clean_db, monkeypatch):
         additional_metadata=additional_metadata,
         alert_artifact_upload=True,
     )
-    publisher.assert_called_once_with(file_metadata["object_url"])
+    publisher.assert_called_once_with(file_metadata["object_url"], outbox=ANY)
+
+
+@db_test
+def test_bulk_create_downloadable_files_from_metadata(clean_db, monkeypatch):
+    """Try to upsert many downloadable files from artifact_core metadata at once"""
+    publisher = MagicMock()
+    monkeypatch.setattr("cidc_api.models.models.publish_artifact_uploads", publisher)
+
+    TrialMetadata.create(TRIAL_ID, METADATA)
+
+    def file_metadata(i, size=1):
+        return {
+            "object_url": f"{TRIAL_ID}/wes/sample_{i}.bam",
+            "file_size_bytes": size,
+            "md5_hash": f"hash{i}",
+            "facet_group": "foobar",
+            "uploaded_timestamp": datetime.now(),
+            "foo": "bar",  # unsupported column - should be filtered
+        }
+
+    files = [(file_metadata(i), {"sample": i}) for i in range(5)]
+    files.append((file_metadata(5), None))
+    ids_by_url = DownloadableFiles.bulk_create_from_metadata(
+        TRIAL_ID, "wes_bam", files, chunk_size=2
+    )
+    assert len(ids_by_url) == 6
+    publisher.assert_not_called()
+
+    for i in range(5):
+        df = DownloadableFiles.find_by_id(ids_by_url[f"{TRIAL_ID}/wes/sample_{i}.bam"])
+        assert df.additional_metadata == {"sample": i}
+        assert df.md5_hash == f"hash{i}"
+        assert df.upload_type == "wes_bam"
+        assert df.visible == True
+        assert df._etag
+    assert (
+        DownloadableFiles.find_by_id(
+            ids_by_url[f"{TRIAL_ID}/wes/sample_5.bam"]
+        ).additional_metadata
+        == {}
+    )
+
+    # Existing records are updated in place, duplicates resolve to the last entry
+    updates = [
+        (file_metadata(0, size=10), {}),
+        (file_metadata(0, size=20), {}),
+        (file_metadata(6), {}),
+    ]
+    new_ids_by_url = DownloadableFiles.bulk_create_from_metadata(
+        TRIAL_ID, "wes_bam", updates, alert_artifact_upload=True
+    )
+    url_0 = f"{TRIAL_ID}/wes/sample_0.bam"
+    assert new_ids_by_url[url_0] == ids_by_url[url_0]
+    clean_db.expire_all()
+    assert DownloadableFiles.find_by_id(ids_by_url[url_0]).file_size_bytes == 20
+    assert DownloadableFiles.count() == 7
+    publisher.assert_called_once()
+    assert set(publisher.call_args[0][0]) == {url_0, f"{TRIAL_ID}/wes/sample_6.bam"}
+
+    # Entries in a batch can supply different columns, and existing records keep
+    # the values of any columns their entry doesn't supply
+    url_1, url_2 = f"{TRIAL_ID}/wes/sample_1.bam", f"{TRIAL_ID}/wes/sample_2.bam"
+    crc_only = file_metadata(1)
+    del crc_only["md5_hash"]
+    crc_only["crc32c_hash"] = "crc1"
+    DownloadableFiles.bulk_create_from_metadata(
+        TRIAL_ID,
+        "wes_bam",
+        [(crc_only, {"sample": 1}), (file_metadata(2, size=30), {"sample": 2})],
+    )
+    clean_db.expire_all()
+    df_1 = DownloadableFiles.find_by_id(ids_by_url[url_1])
+    assert df_1.crc32c_hash == "crc1"
+    assert df_1.md5_hash == "hash1"
+    df_2 = DownloadableFiles.find_by_id(ids_by_url[url_2])
+    assert df_2.file_size_bytes == 30
+    assert df_2.md5_hash == "hash2"
+    assert df_2.crc32c_hash is None
 
 
 @db_test
@@ -923,7 +1059,7 @@ def test_create_downloadable_file_from_blob(clean_db, monkeypatch):
         fake_blob,
         alert_artifact_upload=True,
     )
-    publisher.assert_called_once_with(fake_blob.name)
+    publisher.assert_called_once_with(fake_blob.name, outbox=ANY)
 
 
 def test_downloadable_files_data_category_prefix():
@@ -991,6 +1127,35 @@ def test_downloadable_files_get_related_files(clean_db):
             assert len(related_files) == len(other_ids)
 
 
+@db_test
+def test_downloadable_files_stream_object_urls(clean_db):
+    TrialMetadata.create(trial_id=TRIAL_ID, metadata_json=METADATA)
+    ids = []
+    for i in range(5):
+        df = DownloadableFiles(
+            trial_id=TRIAL_ID,
+            upload_type="wes_bam" if i % 2 else "cytof",
+            object_url=f"{TRIAL_ID}/file_{i}",
+            facet_group="",
+            uploaded_timestamp=datetime.now(),
+            file_size_bytes=0,
+        )
+        df.insert()
+        ids.append(df.id)
+
+    no_filter = lambda q: q
+    urls = DownloadableFiles.stream_object_urls(ids, filter_=no_filter, batch_size=2)
+    # results are produced lazily
+    assert not isinstance(urls, list)
+    assert sorted(urls) == [f"{TRIAL_ID}/file_{i}" for i in range(5)]
+
+    wes_only = lambda q: q.filter(DownloadableFiles.upload_type == "wes_bam")
+    assert sorted(DownloadableFiles.stream_object_urls(ids, filter_=wes_only)) == [
+        f"{TRIAL_ID}/file_1",
+        f"{TRIAL_ID}/file_3",
+    ]
+
+
 def test_with_default_session(cidc_api, clean_db):
     """Test that the with_default_session decorator provides defaults as expected"""
 
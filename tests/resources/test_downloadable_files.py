@@ -1,22 +1,41 @@
 import os
 
 os.environ["TZ"] = "UTC"
-from datetime import datetime
+from datetime import datetime, timedelta
+import io
 import logging
+import tarfile
 from typing import Tuple
 from unittest.mock import MagicMock, call
 
 from cidc_api.models import (
     Users,
+    BundleJobs,
+    BundleJobStatus,
     DownloadableFiles,
     TrialMetadata,
     Permissions,
     CIDCRole,
 )
-from cidc_api.config.settings import GOOGLE_ACL_DATA_BUCKET
+from cidc_api.config.settings import GOOGLE_ACL_DATA_BUCKET, GOOGLE_EPHEMERAL_BUCKET
+from cidc_api.resources.downloadable_files import build_compressed_batch
 from cidc_api.resources.upload_jobs import log_multiple_errors
+from cidc_api.shared.bundle_worker import (
+    EXPIRED_DETAILS,
+    FAILED_DETAILS,
+    STALE_AFTER,
+    expire_stale_jobs,
+    process_next,
+)
 
-from ..utils import mock_current_user, make_admin, make_role, mock_gcloud_client
+from ..utils import (
+    mock_current_user,
+    make_admin,
+    make_role,
+    mock_gcloud_client,
+    mock_gcs_buckets,
+    FakeBucket,
+)
 
 
 def setup_user(cidc_api, monkeypatch) -> int:
@@ -149,6 +168,35 @@ def test_list_downloadable_files(cidc_api, clean_db, monkeypatch):
         "WES|Source",
     ]
 
+    # Make sure it's possible to search by partial object URL
+    res = client.get(f"/downloadable_files?search=READS_12")
+    assert res.status_code == 200
+    assert [f["id"] for f in res.json["_items"]] == [file_id_1]
+    assert res.json["_meta"]["total"] == 1
+
+    # ...and by additional metadata
+    with cidc_api.app_context():
+        df = DownloadableFiles.find_by_id(file_id_2)
+        df.additional_metadata = {"cytof.cimac_id": "CTTTPPPSS.01"}
+        df.update()
+    res = client.get(f"/downloadable_files?search=tttppps")
+    assert res.status_code == 200
+    assert [f["id"] for f in res.json["_items"]] == [file_id_2]
+
+    # LIKE wildcards in search strings are matched literally
+    res = client.get(f"/downloadable_files?search=%25%25%25")
+    assert res.status_code == 200
+    assert res.json["_items"] == []
+
+    # Search combines with other filters
+    res = client.get(f"/downloadable_files?search=trial&trial_ids={trial_id_2}")
+    assert res.status_code == 200
+    assert [f["id"] for f in res.json["_items"]] == [file_id_2]
+
+    # Search strings must be at least 3 characters long
+    res = client.get(f"/downloadable_files?search=ab")
+    assert res.status_code == 422
+
 
 def test_get_downloadable_file(cidc_api, clean_db, monkeypatch):
     """Check that getting a single file works as expected."""
@@ -384,6 +432,93 @@ def test_create_compressed_batch(cidc_api, clean_db, monkeypatch):
     blob.upload_from_filename.assert_called_once()
 
 
+def test_create_compressed_batch_async(cidc_api, clean_db, monkeypatch):
+    user_id = setup_user(cidc_api, monkeypatch)
+    file_id_1, file_id_2 = setup_downloadable_files(cidc_api)
+    with cidc_api.app_context():
+        url_1 = DownloadableFiles.find_by_id(file_id_1).object_url
+        url_2 = DownloadableFiles.find_by_id(file_id_2).object_url
+
+    make_admin(user_id, cidc_api)
+    client = cidc_api.test_client()
+    url = "/downloadable_files/compressed_batch"
+
+    data_bucket = FakeBucket(
+        GOOGLE_ACL_DATA_BUCKET, {url_1: b"wes data", url_2: b"cytof data"}
+    )
+    ephemeral_bucket = FakeBucket(GOOGLE_EPHEMERAL_BUCKET)
+    mock_gcs_buckets(monkeypatch, data_bucket, ephemeral_bucket)
+    monkeypatch.setattr(
+        "cidc_api.resources.downloadable_files.gcloud_client.get_signed_url",
+        lambda name, bucket: f"signed/{bucket}/{name}",
+    )
+
+    # Batches too large to bundle synchronously can be bundled asynchronously
+    file_ids = {"file_ids": [file_id_1, file_id_2]}
+    res = client.post(url, json=file_ids)
+    assert res.status_code == 400
+    res = client.post(url, json={**file_ids, "async": True})
+    assert res.status_code == 202
+    job_id = res.json["job_id"]
+    assert res.json["status"] == BundleJobStatus.QUEUED.value
+    assert res.json["status_url"].endswith(f"{url}/{job_id}")
+
+    # Until the job runs, clients are told to retry
+    res = client.get(f"{url}/{job_id}")
+    assert res.status_code == 200
+    assert res.json["status"] == BundleJobStatus.QUEUED.value
+    assert res.json["retry_in"] == 5
+    assert "download_url" not in res.json
+
+    # A worker builds the bundle, then there's nothing left to do
+    with cidc_api.app_context():
+        assert process_next(clean_db, build_compressed_batch) == job_id
+        assert process_next(clean_db, build_compressed_batch) is None
+
+    res = client.get(f"{url}/{job_id}")
+    assert res.status_code == 200
+    assert res.json["status"] == BundleJobStatus.COMPLETED.value
+    assert "retry_in" not in res.json
+    [bundle_name] = ephemeral_bucket.objects.keys()
+    assert res.json["download_url"] == f"signed/{GOOGLE_EPHEMERAL_BUCKET}/{bundle_name}"
+    with tarfile.open(fileobj=io.BytesIO(ephemeral_bucket.objects[bundle_name])) as tar:
+        members = {m.name.lstrip("./") for m in tar.getmembers() if m.isfile()}
+    assert members == {url_1.replace("/", "_"), url_2.replace("/", "_")}
+
+    # Failures are recorded on the job
+    data_bucket.objects.pop(url_2)
+    res = client.post(url, json={**file_ids, "async": True})
+    failed_job_id = res.json["job_id"]
+    with cidc_api.app_context():
+        assert process_next(clean_db, build_compressed_batch) == failed_job_id
+    res = client.get(f"{url}/{failed_job_id}")
+    assert res.json["status"] == BundleJobStatus.FAILED.value
+    assert res.json["status_details"] == FAILED_DETAILS
+    assert "retry_in" not in res.json
+
+    # Jobs left running by a worker that died are eventually failed
+    with cidc_api.app_context():
+        job = BundleJobs.create("test@email.com", [url_1])
+        job.set_status(BundleJobStatus.RUNNING.value)
+        stale_job_id = job.id
+        assert expire_stale_jobs(clean_db) == 0
+        job = BundleJobs.find_by_id(stale_job_id)
+        job._updated = datetime.now() - STALE_AFTER - timedelta(minutes=1)
+        clean_db.commit()
+        assert expire_stale_jobs(clean_db) == 1
+    res = client.get(f"{url}/{stale_job_id}")
+    assert res.json["status"] == BundleJobStatus.FAILED.value
+    assert res.json["status_details"] == EXPIRED_DETAILS
+
+    # Other non-admin users can't see this user's bundle jobs
+    other_user = Users(email="other@email.com", role=CIDCRole.CIMAC_USER.value)
+    with cidc_api.app_context():
+        other_user.insert()
+    mock_current_user(other_user, monkeypatch)
+    res = client.get(f"{url}/{job_id}")
+    assert res.status_code == 404
+
+
 def test_get_filter_facets(cidc_api, clean_db, monkeypatch):
     """Check that getting filter facets works as expected"""
     user_id = setup_user(cidc_api, monkeypatch)
@@ -485,6 +620,68 @@ def test_get_download_url(cidc_api, clean_db, monkeypatch):
     assert res.status_code == 401
 
 
+def test_get_download_urls(cidc_api, clean_db, monkeypatch):
+    """Check that generating a batch of GCS signed URLs works as expected"""
+    user_id = setup_user(cidc_api, monkeypatch)
+    file_id_1, file_id_2 = setup_downloadable_files(cidc_api)
+    with cidc_api.app_context():
+        url_1 = DownloadableFiles.find_by_id(file_id_1).object_url
+        url_2 = DownloadableFiles.find_by_id(file_id_2).object_url
+
+    client = cidc_api.test_client()
+    url = "/downloadable_files/download_urls"
+
+    get_signed_urls = MagicMock()
+    get_signed_urls.side_effect = lambda names: {n: f"signed/{n}" for n in names}
+    monkeypatch.setattr(
+        "cidc_api.shared.gcloud_client.get_signed_urls", get_signed_urls
+    )
+
+    # A JSON body containing a non-empty file ID list must be provided
+    res = client.post(url)
+    assert res.status_code == 422
+    res = client.post(url, json={"file_ids": []})
+    assert res.status_code == 422
+
+    # No permission should yield 404
+    file_ids = {"file_ids": [file_id_1, file_id_2]}
+    res = client.post(url, json=file_ids)
+    assert res.status_code == 404
+    get_signed_urls.assert_not_called()
+
+    with cidc_api.app_context():
+        perm = Permissions(
+            granted_to_user=user_id,
+            trial_id=trial_id_1,
+            upload_type=upload_types[0],
+            granted_by_user=user_id,
+        )
+        perm.insert()
+
+    # Only files the user has permission to view are signed
+    res = client.post(url, json=file_ids)
+    assert res.status_code == 200
+    assert res.json == {
+        str(file_id_1): {"object_url": url_1, "download_url": f"signed/{url_1}"}
+    }
+
+    # Admins get URLs for everything, signed in a single call
+    make_admin(user_id, cidc_api)
+    get_signed_urls.reset_mock()
+    res = client.post(url, json=file_ids)
+    assert res.status_code == 200
+    assert res.json == {
+        str(file_id_1): {"object_url": url_1, "download_url": f"signed/{url_1}"},
+        str(file_id_2): {"object_url": url_2, "download_url": f"signed/{url_2}"},
+    }
+    get_signed_urls.assert_called_once()
+
+    # network viewers aren't allowed to get download urls
+    make_role(user_id, CIDCRole.NETWORK_VIEWER.value, cidc_api)
+    res = client.post(url, json=file_ids)
+    assert res.status_code == 401
+
+
 def test_log_multiple_errors(caplog):
     """Check that the log_multiple_errors function doesn't throw an error itself."""
     caplog.set_level(logging.DEBUG)
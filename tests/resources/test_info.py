@@ -105,8 +105,9 @@ def test_info_data_overview(cidc_api, clean_db):
     }
 
 
-def test_templates(cidc_api):
+def test_templates(cidc_api, tmp_path, monkeypatch):
     """Check that the /info/templates endpoint behaves as expected"""
+    monkeypatch.setitem(cidc_api.config, "TEMPLATES_DIR", str(tmp_path))
     client = cidc_api.test_client()
 
     # Invalid URLs
@@ -130,19 +131,31 @@ def test_templates(cidc_api):
     assert res.status_code == 404
 
     # Generate and get a valid manifest
-    pbmc_path = os.path.join(
-        cidc_api.config["TEMPLATES_DIR"], "manifests", "pbmc_template.xlsx"
-    )
+    pbmc_path = os.path.join(str(tmp_path), "manifests", "pbmc_template.xlsx")
     assert not os.path.exists(pbmc_path)
     res = client.get(f"{INFO_ENDPOINT}/templates/manifests/pbmc")
     assert res.status_code == 200
     with open(pbmc_path, "rb") as f:
         assert res.data == f.read()
+    assert res.headers["Cache-Control"] == "public, max-age=86400"
+    etag = res.headers["ETag"]
 
-    # Generate and get a valid assay
-    olink_path = os.path.join(
-        cidc_api.config["TEMPLATES_DIR"], "metadata", "olink_template.xlsx"
+    # A client with a current copy of the template doesn't get it again
+    res = client.get(
+        f"{INFO_ENDPOINT}/templates/manifests/pbmc", headers={"If-None-Match": etag}
+    )
+    assert res.status_code == 304
+    assert res.data == b""
+
+    # A client with an outdated copy does
+    res = client.get(
+        f"{INFO_ENDPOINT}/templates/manifests/pbmc", headers={"If-None-Match": '"foo"'}
     )
+    assert res.status_code == 200
+    assert res.headers["ETag"] == etag
+
+    # Generate and get a valid assay
+    olink_path = os.path.join(str(tmp_path), "metadata", "olink_template.xlsx")
     assert not os.path.exists(olink_path)
     res = client.get(f"{INFO_ENDPOINT}/templates/metadata/olink")
     assert res.status_code == 200
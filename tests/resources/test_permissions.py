@@ -161,6 +161,17 @@ def test_create_permission(cidc_api, clean_db, monkeypatch):
         assert clean_db.query(Permissions).filter_by(**perm).all() == []
     gcloud_client.grant_download_access.side_effect = None
 
+    # Likewise if granting the lister role fails, even though the ACL grant was staged
+    gcloud_client.reset_mocks()
+    gcloud_client.grant_lister_access.side_effect = Exception("oops")
+    res = client.post("permissions", json=perm)
+    assert "IAM grant failed" in res.json["_error"]["message"]
+    assert res.status_code == 500
+    gcloud_client.grant_download_access.assert_called_once()
+    with cidc_api.app_context():
+        assert clean_db.query(Permissions).filter_by(**perm).all() == []
+    gcloud_client.grant_lister_access.side_effect = None
+
     # Admins can't create permissions with invalid upload types
     gcloud_client.reset_mocks()
     res = client.post("permissions", json={**perm, "upload_type": "foo"})
@@ -9,23 +9,28 @@ from datetime import datetime
 from contextlib import contextmanager
 from collections import namedtuple
 import os.path
-from unittest.mock import MagicMock
+from unittest.mock import ANY, MagicMock
 from typing import Tuple
 
 import pytest
 from werkzeug.exceptions import NotFound, Unauthorized, UnprocessableEntity, BadRequest
 from cidc_schemas import prism
 from cidc_schemas.prism import PROTOCOL_ID_FIELD_NAME, LocalFileUploadEntry
-from cidc_schemas.template_reader import ValidationError
+from cidc_schemas.template_reader import ValidationError, XlTemplateReader
 
 from cidc_api.shared import gcloud_client
+from cidc_api.shared.ingestion_worker import process_next
+from cidc_api.shared.upload_status import UploadStatusListener
 from cidc_api.config.settings import GOOGLE_UPLOAD_BUCKET
 from cidc_api.resources.upload_jobs import (
     INTAKE_ROLES,
     extract_schema_and_xlsx,
+    ingest_queued_manifest,
     requires_upload_token_auth,
     upload_data_files,
-    _remove_optional_uuid_recursive,
+    worksheet_rows_from_reader,
+    _index_upload_placeholders,
+    _remove_upload_placeholders,
 )
 from cidc_api.models import (
     TrialMetadata,
@@ -37,6 +42,7 @@ from cidc_api.models import (
     CIDCRole,
     ROLES,
     ValidationMultiError,
+    PbmcManifest,
 )
 
 from ..models.templates.examples import EXAMPLE_DIR
@@ -327,7 +333,7 @@ def test_update_upload_job(cidc_api, clean_db, monkeypatch):
         json={"gcs_file_map": {"foo": "bar"}, **upload_success},
     )
     assert res.status_code == 200
-    publish_success.assert_called_once_with(user_job)
+    publish_success.assert_called_once_with(user_job, outbox=ANY)
     revoke_upload_access.assert_called_once()
     with cidc_api.app_context():
         modified_job = UploadJobs.find_by_id(user_job)
@@ -470,6 +476,24 @@ class UploadMocks:
                 attr.reset_mock()
 
 
+def test_worksheet_rows_from_reader(cidc_api, clean_db):
+    """Check that the rows prism parsed read into the same records as the file itself"""
+    pbmc_path = os.path.join(EXAMPLE_DIR, "pbmc_manifest.xlsx")
+    reader, _ = XlTemplateReader.from_excel(pbmc_path)
+    worksheet_rows = worksheet_rows_from_reader(reader)
+
+    with cidc_api.app_context():
+        set_up_example_trial(clean_db, cidc_api)
+
+        from_file = PbmcManifest.read(pbmc_path)
+        from_rows = PbmcManifest.read(worksheet_rows)
+        assert list(from_rows) == list(from_file)
+        for model in from_file:
+            assert [r.to_dict() for r in from_rows[model]] == [
+                r.to_dict() for r in from_file[model]
+            ]
+
+
 def test_validate_valid_template(cidc_api, some_file, clean_db, monkeypatch):
     """Ensure that the validation endpoint returns no errors for a known-valid .xlsx file"""
     user_id = setup_trial_and_user(cidc_api, monkeypatch)
@@ -691,6 +715,17 @@ def test_upload_manifest(cidc_api, clean_db, monkeypatch, caplog):
     # Check that upload alert email was "sent"
     assert "Would send email with subject '[UPLOAD SUCCESS]" in caplog.text
 
+    # Check that each phase of the upload was timed
+    phases = [t.split(";")[0] for t in res.headers["Server-Timing"].split(", ")]
+    assert phases == [
+        "parse",
+        "validate",
+        "prismify",
+        "merge",
+        "patch_manifest",
+        "relational",
+    ]
+
     # Check that we tried to publish a patient/sample update
     mocks.publish_patient_sample_update.assert_called_once()
 
@@ -698,6 +733,42 @@ def test_upload_manifest(cidc_api, clean_db, monkeypatch, caplog):
     mocks.make_all_assertions()
 
 
+def test_validate_then_upload_manifest(cidc_api, clean_db, monkeypatch):
+    """Ensure that uploading a manifest reuses the checks from validating it"""
+    user_id = setup_trial_and_user(cidc_api, monkeypatch)
+    mocks = UploadMocks(monkeypatch, whitelist_openpyxl=True)
+
+    client = cidc_api.test_client()
+    setup_example(clean_db, cidc_api)
+    make_nci_biobank_user(user_id, cidc_api)
+
+    with open(os.path.join(EXAMPLE_DIR, "pbmc_manifest.xlsx"), "rb") as f:
+        xlsx = f.read()
+
+    def get_phases(res):
+        return [t.split(";")[0] for t in res.headers["Server-Timing"].split(", ")]
+
+    res = client.post(VALIDATE, data=form_data("pbmc.xlsx", io.BytesIO(xlsx), "pbmc"))
+    assert res.status_code == 200
+    assert get_phases(res) == ["parse", "validate", "prismify", "merge"]
+
+    # The trial hasn't changed since validation, so only the write path runs
+    res = client.post(
+        MANIFEST_UPLOAD, data=form_data("pbmc.xlsx", io.BytesIO(xlsx), "pbmc")
+    )
+    assert res.status_code == 200
+    assert get_phases(res) == ["patch_manifest", "relational"]
+    mocks.make_all_assertions()
+    assert_pbmc_worked(cidc_api, clean_db)
+
+    # The upload changed the trial, so the merge is checked again
+    res = client.post(VALIDATE, data=form_data("pbmc.xlsx", io.BytesIO(xlsx), "pbmc"))
+    assert res.status_code == 200
+    assert get_phases(res) == ["merge"]
+
+    mocks.prismify.assert_called_once()
+
+
 def test_upload_manifest_twice(cidc_api, clean_db, monkeypatch):
     """Ensure that doing upload_manifest twice will produce only one DownloadableFiles"""
     user_id = setup_trial_and_user(cidc_api, monkeypatch)
@@ -742,6 +813,69 @@ def test_upload_manifest_twice(cidc_api, clean_db, monkeypatch):
         assert not DownloadableFiles.list()  # manifest is not stored
 
 
+def test_upload_manifest_async(cidc_api, clean_db, monkeypatch):
+    """Ensure that async manifest uploads are queued, then merged by a worker"""
+    user_id = setup_trial_and_user(cidc_api, monkeypatch)
+    mocks = UploadMocks(monkeypatch, whitelist_openpyxl=True)
+
+    client = cidc_api.test_client()
+    setup_example(clean_db, cidc_api)
+    make_nci_biobank_user(user_id, cidc_api)
+
+    with open(os.path.join(EXAMPLE_DIR, "pbmc_manifest.xlsx"), "rb") as f:
+        xlsx = f.read()
+    data = form_data("pbmc.xlsx", io.BytesIO(xlsx), "pbmc")
+    data["async"] = "true"
+    res = client.post(MANIFEST_UPLOAD, data=data)
+    assert res.status_code == 202
+    assert res.json["status"] == UploadJobStatus.QUEUED.value
+    job_id = res.json["job_id"]
+    status_url = res.json["status_url"]
+    assert f"/ingestion/poll_upload_merge_status/{job_id}?token=" in status_url
+
+    # The upload is queued with its spreadsheet, but not merged yet
+    with cidc_api.app_context():
+        job = UploadJobs.find_by_id(job_id)
+        assert job.status == UploadJobStatus.QUEUED.value
+        assert job.queued_xlsx == xlsx
+    mocks.publish_patient_sample_update.assert_not_called()
+    res = client.get(status_url)
+    assert res.json == {"retry_in": 5}
+
+    # A worker merges the upload, then there's nothing left to do
+    with cidc_api.app_context():
+        assert process_next(clean_db, ingest_queued_manifest) == job_id
+        assert process_next(clean_db, ingest_queued_manifest) is None
+
+        job = UploadJobs.find_by_id(job_id)
+        assert job.status == UploadJobStatus.MERGE_COMPLETED.value
+        assert job.queued_xlsx is None
+    mocks.publish_patient_sample_update.assert_called_once_with(job_id, outbox=ANY)
+    assert_pbmc_worked(cidc_api, clean_db)
+    res = client.get(status_url)
+    assert res.json["status"] == UploadJobStatus.MERGE_COMPLETED.value
+
+    # Uploads that fail to merge are marked as failed, with the error
+    data = form_data("pbmc.xlsx", io.BytesIO(xlsx), "pbmc")
+    data["async"] = "true"
+    res = client.post(MANIFEST_UPLOAD, data=data)
+    assert res.status_code == 202
+    job_id = res.json["job_id"]
+
+    def fail_to_ingest(job, session):
+        job.metadata_patch = {}
+        raise ValidationMultiError(["merge failed"])
+
+    with cidc_api.app_context():
+        assert process_next(clean_db, fail_to_ingest) == job_id
+
+        job = UploadJobs.find_by_id(job_id)
+        assert job.status == UploadJobStatus.MERGE_FAILED.value
+        assert "merge failed" in job.status_details
+        assert job.metadata_patch == {PROTOCOL_ID_FIELD_NAME: "test_trial"}
+        assert job.queued_xlsx is None
+
+
 finfo = LocalFileUploadEntry
 
 
@@ -870,7 +1004,7 @@ def test_upload_wes(cidc_api, clean_db, monkeypatch):
         headers={"If-Match": _etag},
     )
     assert res.status_code == 200
-    mocks.publish_success.assert_called_with(job_id)
+    mocks.publish_success.assert_called_with(job_id, outbox=ANY)
 
 
 OLINK_TESTDATA = [
@@ -985,7 +1119,7 @@ def test_upload_olink(cidc_api, clean_db, monkeypatch):
         headers={"If-Match": _etag},
     )
     assert res.status_code == 200
-    mocks.publish_success.assert_called_with(job_id)
+    mocks.publish_success.assert_called_with(job_id, outbox=ANY)
 
 
 def test_poll_upload_merge_status(cidc_api, clean_db, monkeypatch):
@@ -1030,6 +1164,24 @@ def test_poll_upload_merge_status(cidc_api, clean_db, monkeypatch):
     assert "retry_in" in res.json and res.json["retry_in"] == 5
     assert "status" not in res.json
 
+    # Long-polling falls back to polling if no listener is running
+    res = client.get(f"{upload_job_url}&wait=1")
+    assert res.status_code == 200
+    assert res.json == {"retry_in": 5}
+
+    res = client.get(f"{upload_job_url}&wait=-1")
+    assert res.status_code == 422
+
+    # Long-polling waits for a status change, up to the given time
+    listener = UploadStatusListener(cidc_api)
+    listener.connected.set()
+    monkeypatch.setattr(
+        "cidc_api.resources.upload_jobs.get_upload_status_listener", lambda: listener
+    )
+    res = client.get(f"{upload_job_url}&wait=1")
+    assert res.status_code == 200
+    assert res.json == {"retry_in": 0}
+
     test_details = "A human-friendly reason for this "
     for status in [
         UploadJobStatus.MERGE_COMPLETED.value,
@@ -1316,7 +1468,14 @@ def test_upload_data_files(cidc_api, monkeypatch):
 
     with cidc_api.app_context():
         response = upload_data_files(
-            user, trial, template_type, xlsx_file, md_patch, file_infos
+            user,
+            trial,
+            template_type,
+            xlsx_file,
+            {},
+            md_patch,
+            file_infos,
+            ("etag", {}),
         )
     json = response.get_json()
 
@@ -1353,7 +1512,7 @@ def test_upload_data_files(cidc_api, monkeypatch):
     assert "token" in json and json["token"] == "token"
 
 
-def test_remove_optional_uuid_recursive():
+def test_remove_upload_placeholders():
     test = {
         "foo": {"upload_placeholder": "one-deep"},
         "bar": {
@@ -1366,63 +1525,61 @@ def test_remove_optional_uuid_recursive():
         ],
         "int": 4,
     }
+    original = deepcopy(test)
+
+    assert _index_upload_placeholders(test) == {
+        "one-deep": [("foo",)],
+        "two-deep": [("bar", "foo")],
+        "two-deep array": [("bar", "baz", 0)],
+        "one-deep array": [("baz", 0)],
+        "second item": [("baz", 1)],
+    }
 
     this_test = deepcopy(test)
     del this_test["foo"]
-    assert not DeepDiff(
-        this_test, _remove_optional_uuid_recursive(deepcopy(test), "one-deep")
-    )
+    assert not DeepDiff(this_test, _remove_upload_placeholders(test, ["one-deep"]))
 
     this_test = deepcopy(test)
     del this_test["bar"]["foo"]
-    assert not DeepDiff(
-        this_test, _remove_optional_uuid_recursive(deepcopy(test), "two-deep")
-    )
+    assert not DeepDiff(this_test, _remove_upload_placeholders(test, ["two-deep"]))
 
     this_test = deepcopy(test)
     del this_test["bar"]["baz"]
     assert not DeepDiff(
-        this_test, _remove_optional_uuid_recursive(deepcopy(test), "two-deep array")
+        this_test, _remove_upload_placeholders(test, ["two-deep array"])
     )
 
     this_test = deepcopy(test)
     del this_test["baz"][0]
     assert not DeepDiff(
-        this_test, _remove_optional_uuid_recursive(deepcopy(test), "one-deep array")
+        this_test, _remove_upload_placeholders(test, ["one-deep array"])
     )
 
     this_test = deepcopy(test)
     del this_test["baz"][1]
-    assert not DeepDiff(
-        this_test, _remove_optional_uuid_recursive(deepcopy(test), "second item")
-    )
+    assert not DeepDiff(this_test, _remove_upload_placeholders(test, ["second item"]))
 
+    # containers left empty are dropped
     this_test = deepcopy(test)
     del this_test["baz"]
-    temp = _remove_optional_uuid_recursive(deepcopy(test), "one-deep array")
     assert not DeepDiff(
-        _remove_optional_uuid_recursive(deepcopy(temp), "second item"), this_test
+        this_test, _remove_upload_placeholders(test, ["one-deep array", "second item"]),
     )
 
     this_test = deepcopy(test)
     del this_test["bar"]
-    temp = _remove_optional_uuid_recursive(deepcopy(test), "two-deep array")
     assert not DeepDiff(
-        _remove_optional_uuid_recursive(deepcopy(temp), "two-deep"), this_test
+        this_test, _remove_upload_placeholders(test, ["two-deep array", "two-deep"])
     )
 
-    this_test = deepcopy(test)
-    del this_test["foo"]
-    temp = _remove_optional_uuid_recursive(deepcopy(test), "one-deep")
-    assert not DeepDiff(temp, this_test)
-    del this_test["bar"]["foo"]
-    temp = _remove_optional_uuid_recursive(temp, "two-deep")
-    assert not DeepDiff(temp, this_test)
-    del this_test["bar"]
-    temp = _remove_optional_uuid_recursive(temp, "two-deep array")
-    assert not DeepDiff(temp, this_test)
-    del this_test["baz"][0]
-    temp = _remove_optional_uuid_recursive(temp, "one-deep array")
-    assert not DeepDiff(temp, this_test)
-    temp = _remove_optional_uuid_recursive(temp, "second item")
-    assert not DeepDiff(temp, {"int": 4})
+    # unknown uuids are ignored
+    assert not DeepDiff(test, _remove_upload_placeholders(test, ["foo"]))
+
+    all_uuids = ["one-deep", "two-deep", "two-deep array", "one-deep array"]
+    assert not DeepDiff(
+        _remove_upload_placeholders(test, all_uuids + ["second item"]), {"int": 4}
+    )
+    assert _remove_upload_placeholders({"upload_placeholder": "foo"}, ["foo"]) == {}
+
+    # the original is left unchanged
+    assert not DeepDiff(test, original)
@@ -3,15 +3,21 @@ import os
 
 os.environ["TZ"] = "UTC"
 from io import BytesIO
+from concurrent.futures import Future
 from unittest.mock import call, MagicMock
 from datetime import datetime
 
+import pytest
+
 from werkzeug.datastructures import FileStorage
+from google.api_core.exceptions import PreconditionFailed
 from google.api_core.iam import Policy
+from google.cloud import pubsub
 
 from cidc_api.shared import gcloud_client
 from cidc_api.config import settings
 from cidc_api.shared.gcloud_client import (
+    batch_iam_changes,
     create_intake_bucket,
     get_blob_names,
     grant_download_access,
@@ -215,6 +221,82 @@ def test_revoke_upload_access(monkeypatch):
     revoke_upload_access(EMAIL)
 
 
+def test_batch_iam_changes(monkeypatch):
+    """Check that IAM changes in a batch are applied with one policy update per bucket"""
+    bucket = MagicMock()
+    bucket.name = "some-bucket"
+    bucket.get_iam_policy.side_effect = lambda **kw: Policy()
+    bucket.set_iam_policy.side_effect = lambda policy: applied.append(policy)
+    applied = []
+
+    with batch_iam_changes() as batch:
+        for i in range(3):
+            gcloud_client.grant_gcs_access(
+                bucket, GOOGLE_LISTER_ROLE, f"user{i}@email.com", expiring=False
+            )
+        gcloud_client.revoke_iam_gcs_access(
+            bucket, GOOGLE_LISTER_ROLE, "user1@email.com"
+        )
+        # nested batches join the outer batch
+        with batch_iam_changes() as inner_batch:
+            assert inner_batch is batch
+            gcloud_client.grant_gcs_access(
+                bucket, GOOGLE_LISTER_ROLE, "user3@email.com", expiring=False
+            )
+        bucket.get_iam_policy.assert_not_called()
+        bucket.set_iam_policy.assert_not_called()
+
+    bucket.get_iam_policy.assert_called_once()
+    bucket.set_iam_policy.assert_called_once()
+    members = [b["members"] for b in applied[0].bindings]
+    assert members == [
+        {"user:user0@email.com"},
+        {"user:user2@email.com"},
+        {"user:user3@email.com"},
+    ]
+
+    # Changes aren't applied if the batch raises an error
+    bucket.reset_mock()
+    with pytest.raises(Exception, match="oops"):
+        with batch_iam_changes():
+            gcloud_client.grant_gcs_access(
+                bucket, GOOGLE_LISTER_ROLE, EMAIL, expiring=False
+            )
+            raise Exception("oops")
+    bucket.set_iam_policy.assert_not_called()
+
+    # Without a batch, changes are applied immediately
+    gcloud_client.grant_gcs_access(bucket, GOOGLE_LISTER_ROLE, EMAIL, expiring=False)
+    bucket.set_iam_policy.assert_called_once()
+
+
+def test_apply_iam_changes_retries_on_etag_mismatch(monkeypatch):
+    bucket = MagicMock()
+    bucket.get_iam_policy.side_effect = lambda **kw: Policy()
+    bucket.set_iam_policy.side_effect = [PreconditionFailed("etag mismatch"), None]
+
+    grant = lambda: gcloud_client.grant_gcs_access(
+        bucket, GOOGLE_LISTER_ROLE, EMAIL, expiring=False
+    )
+    grant()
+    assert bucket.get_iam_policy.call_count == 2
+    assert bucket.set_iam_policy.call_count == 2
+
+    # Give up after MAX_IAM_ETAG_RETRIES attempts
+    bucket.reset_mock()
+    bucket.set_iam_policy.side_effect = PreconditionFailed("etag mismatch")
+    with pytest.raises(PreconditionFailed):
+        grant()
+    assert bucket.set_iam_policy.call_count == gcloud_client.MAX_IAM_ETAG_RETRIES
+
+    # Other errors aren't retried
+    bucket.reset_mock()
+    bucket.set_iam_policy.side_effect = Exception("oops")
+    with pytest.raises(Exception, match="oops"):
+        grant()
+    bucket.set_iam_policy.assert_called_once()
+
+
 def test_create_intake_bucket(monkeypatch):
     policy = Policy()
     bucket = MagicMock()
@@ -298,6 +380,30 @@ def test_revoke_intake_access(monkeypatch):
     assert args[1:] == (GOOGLE_INTAKE_ROLE, EMAIL)
 
 
+def test_get_blob_names(monkeypatch):
+    """Check that get_blob_names lists every prefix, requesting only blob names"""
+    monkeypatch.setattr(
+        gcloud_client,
+        "_build_trial_upload_prefixes",
+        lambda *args: ["trial1/wes", "trial2/wes", "trial3/wes"],
+    )
+    storage_client = MagicMock()
+
+    def list_blobs(bucket_name, prefix, fields):
+        assert fields == "items(name),nextPageToken"
+        for i in range(2):
+            blob = MagicMock()
+            blob.name = f"{prefix}/{i}"
+            yield blob
+
+    storage_client.list_blobs = list_blobs
+    monkeypatch.setattr(gcloud_client, "_get_storage_client", lambda: storage_client)
+
+    names = get_blob_names(None, "wes")
+    assert not isinstance(names, list)
+    assert sorted(names) == [f"trial{t}/wes/{i}" for t in range(1, 4) for i in range(2)]
+
+
 def test_grant_download_access_by_names(monkeypatch):
     """
     Check that get_blob_name returns the name of the blob to have the correct input
@@ -307,10 +413,10 @@ def test_grant_download_access_by_names(monkeypatch):
 
     _get_bucket = MagicMock()
     _get_bucket.return_value = bucket = MagicMock()
-    bucket.get_blob.return_value = client.blobs[0]
+    bucket.blob.return_value = client.blobs[0]
     monkeypatch.setattr("cidc_api.shared.gcloud_client._get_bucket", _get_bucket)
 
-    blob_names = get_blob_names("10021", "wes_analysis")
+    blob_names = list(get_blob_names("10021", "wes_analysis"))
     assert blob_names == [client.blobs[0].name]
 
     grant_download_access_to_blob_names([EMAIL], blob_name_list=blob_names)
@@ -348,10 +454,10 @@ def test_revoke_download_access_from_names(monkeypatch):
 
     _get_bucket = MagicMock()
     _get_bucket.return_value = bucket = MagicMock()
-    bucket.get_blob.return_value = client.blobs[0]
+    bucket.blob.return_value = client.blobs[0]
     monkeypatch.setattr(gcloud_client, "_get_bucket", _get_bucket)
 
-    blob_name_list = get_blob_names("10021", "wes_analysis")
+    blob_name_list = list(get_blob_names("10021", "wes_analysis"))
     assert blob_name_list == [client.blobs[0].name]
 
     revoke_download_access_from_blob_names([EMAIL], blob_name_list=blob_name_list)
@@ -364,6 +470,35 @@ def test_revoke_download_access_from_names(monkeypatch):
     client.blobs[1].acl.save.assert_not_called()
 
 
+def test_execute_multiblob_acl_change_failures(monkeypatch):
+    """Check that a failed ACL change on one blob doesn't stop the others"""
+    blobs = [MagicMock() for _ in range(5)]
+    for i, blob in enumerate(blobs):
+        blob.name = f"blob{i}"
+    blobs[2].acl.save.side_effect = Exception("not found")
+
+    with pytest.raises(Exception, match="1 of 5 blobs: \\['blob2'\\]"):
+        gcloud_client._execute_multiblob_acl_change(
+            [EMAIL], blobs, lambda obj: obj.grant_read()
+        )
+
+    for blob in blobs:
+        blob.acl.user.assert_called_once_with(EMAIL)
+        blob.acl.user.return_value.grant_read.assert_called_once()
+        blob.acl.save.assert_called_once()
+
+    # Only a sample of the failed blobs is named
+    monkeypatch.setattr(gcloud_client, "ACL_CHANGE_FAILURE_SAMPLE_SIZE", 2)
+    for blob in blobs:
+        blob.acl.save.side_effect = Exception("not found")
+    with pytest.raises(
+        Exception, match="5 of 5 blobs: \\['blob0', 'blob1'\\] and 3 more$"
+    ):
+        gcloud_client._execute_multiblob_acl_change(
+            [EMAIL], blobs, lambda obj: obj.grant_read()
+        )
+
+
 def test_revoke_download_access(monkeypatch):
     """Check that revoke_download_access publishes to ACL grant/revoke download permissions topic"""
     client = _mock_gcloud_storage_client(monkeypatch)
@@ -473,7 +608,7 @@ def test_upload_xlsx_to_intake_bucket(monkeypatch):
 
 def test_get_signed_url(monkeypatch):
     storage_client = MagicMock()
-    storage_client.get_bucket.return_value = bucket = MagicMock()
+    storage_client.bucket.return_value = bucket = MagicMock()
     bucket.blob.return_value = blob = MagicMock()
     blob.generate_signed_url = lambda **kwargs: kwargs["response_disposition"]
 
@@ -484,14 +619,38 @@ def test_get_signed_url(monkeypatch):
     object_name = "path/to/obj"
     signed_url = gcloud_client.get_signed_url(object_name)
     assert signed_url == 'attachment; filename="path_to_obj"'
+    # signing shouldn't fetch bucket metadata
+    storage_client.get_bucket.assert_not_called()
+
+
+def test_get_signed_urls(monkeypatch):
+    storage_client = MagicMock()
+    storage_client.bucket.return_value = bucket = MagicMock()
+    bucket.blob = lambda name: MagicMock(
+        generate_signed_url=lambda **kwargs: kwargs["response_disposition"]
+    )
+
+    monkeypatch.setattr(
+        "cidc_api.shared.gcloud_client._get_storage_client", lambda: storage_client
+    )
+
+    object_names = ["path/to/obj1", "path/to/obj2"]
+    signed_urls = gcloud_client.get_signed_urls(object_names)
+    assert signed_urls == {
+        "path/to/obj1": 'attachment; filename="path_to_obj1"',
+        "path/to/obj2": 'attachment; filename="path_to_obj2"',
+    }
+    storage_client.bucket.assert_called_once_with(GOOGLE_ACL_DATA_BUCKET)
+    storage_client.get_bucket.assert_not_called()
 
 
 def test_encode_and_publish(monkeypatch):
-    pubsub = MagicMock()
-    pubsub.PublisherClient.return_value = pubsub_client = MagicMock()
+    PublisherClient = MagicMock()
+    PublisherClient.return_value = pubsub_client = MagicMock()
     pubsub_client.topic_path = lambda proj, top: top
     pubsub_client.publish.return_value = report = MagicMock()
-    monkeypatch.setattr(gcloud_client, "pubsub", pubsub)
+    monkeypatch.setattr(pubsub, "PublisherClient", PublisherClient)
+    monkeypatch.setattr(gcloud_client, "_pubsub_publisher", None)
 
     # Make sure the ENV = "prod" case publishes
     monkeypatch.setattr(gcloud_client, "ENV", "prod")
@@ -500,6 +659,37 @@ def test_encode_and_publish(monkeypatch):
     res = gcloud_client._encode_and_publish(content, topic)
     assert res == report
     pubsub_client.publish.assert_called_once_with(topic, data=bytes(content, "utf-8"))
+    report.add_done_callback.assert_called_once()
+    report.result.assert_not_called()
+
+    # Subsequent publishes reuse the same batching publisher
+    gcloud_client._encode_and_publish(content, topic)
+    PublisherClient.assert_called_once_with(
+        batch_settings=pubsub.types.BatchSettings(**gcloud_client.PUBSUB_BATCH_SETTINGS)
+    )
+    assert pubsub_client.publish.call_count == 2
+
+    # A forked process gets its own publisher
+    monkeypatch.setattr(gcloud_client, "_pubsub_publisher_pid", -1)
+    gcloud_client._encode_and_publish(content, topic)
+    assert PublisherClient.call_count == 2
+
+
+def test_log_publish_result(monkeypatch):
+    logger = MagicMock()
+    monkeypatch.setattr(gcloud_client, "logger", logger)
+    callback = gcloud_client._log_publish_result("some message", "some-topic")
+
+    report = Future()
+    report.set_result("message-id")
+    callback(report)
+    logger.error.assert_not_called()
+
+    report = Future()
+    report.set_exception(Exception("publish failed"))
+    callback(report)
+    logger.error.assert_called_once()
+    assert "publish failed" in logger.error.call_args[0][0]
 
 
 def mock_encode_and_publish(monkeypatch):
@@ -528,6 +718,20 @@ def test_publish_artifact_upload(monkeypatch):
     _encode_and_publish.assert_called_with("foo", settings.GOOGLE_ARTIFACT_UPLOAD_TOPIC)
 
 
+def test_publish_artifact_uploads(monkeypatch):
+    _encode_and_publish = mock_encode_and_publish(monkeypatch)
+    reports = [MagicMock(), MagicMock()]
+    _encode_and_publish.side_effect = reports
+    assert gcloud_client.publish_artifact_uploads(["foo", "bar"]) == reports
+    assert _encode_and_publish.call_args_list == [
+        call("foo", settings.GOOGLE_ARTIFACT_UPLOAD_TOPIC),
+        call("bar", settings.GOOGLE_ARTIFACT_UPLOAD_TOPIC),
+    ]
+    # Publishing doesn't block on Pub/Sub responses
+    for report in reports:
+        report.result.assert_not_called()
+
+
 def test_send_email(monkeypatch):
     _encode_and_publish = mock_encode_and_publish(monkeypatch)
 
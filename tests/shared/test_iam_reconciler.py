@@ -0,0 +1,216 @@
+from datetime import datetime
+
+from cidc_api.config.settings import (
+    GOOGLE_ACL_DATA_BUCKET,
+    GOOGLE_INTAKE_ROLE,
+    GOOGLE_LISTER_ROLE,
+    GOOGLE_UPLOAD_BUCKET,
+    GOOGLE_UPLOAD_ROLE,
+)
+from cidc_api.models import (
+    CIDCRole,
+    Permissions,
+    TrialMetadata,
+    UploadJobs,
+    UploadJobStatus,
+    Users,
+)
+from cidc_api.shared import gcloud_client
+from cidc_api.shared.gcloud_client import get_intake_bucket_name
+from cidc_api.shared.iam_reconciler import reconcile_bucket, reconcile_iam
+
+from ..utils import FakeBucket, mock_gcloud_client, mock_gcs_buckets
+
+TRIAL_ID = "test-trial"
+LISTER = "lister@email.com"
+UPLOADER = "uploader@email.com"
+DISABLED = "disabled@email.com"
+VIEWER = "viewer@email.com"
+
+
+def binding(role, email):
+    return {"role": role, "members": {f"user:{email}"}}
+
+
+def members(bucket: FakeBucket, role: str) -> set:
+    return {m for b in bucket.bindings if b["role"] == role for m in b["members"]}
+
+
+def setup_users(cidc_api, monkeypatch):
+    mock_gcloud_client(monkeypatch)
+    with cidc_api.app_context():
+        users = [
+            Users(email=LISTER, role=CIDCRole.CIMAC_USER.value),
+            Users(email=UPLOADER, role=CIDCRole.CIMAC_BIOFX_USER.value),
+            Users(email=DISABLED, role=CIDCRole.CIMAC_USER.value, disabled=True),
+            Users(email=VIEWER, role=CIDCRole.NETWORK_VIEWER.value),
+        ]
+        for user in users:
+            user.approval_date = datetime.now()
+            user.insert()
+
+        TrialMetadata.create(
+            TRIAL_ID,
+            {
+                "protocol_identifier": TRIAL_ID,
+                "allowed_collection_event_names": [],
+                "allowed_cohort_names": [],
+                "participants": [],
+            },
+        )
+        for user in [users[0], users[2], users[3]]:
+            Permissions(
+                granted_by_user=user.id,
+                granted_to_user=user.id,
+                trial_id=TRIAL_ID,
+                upload_type="ihc",
+            ).insert()
+
+        UploadJobs.create(
+            upload_type="ihc",
+            uploader_email=UPLOADER,
+            gcs_file_map={},
+            metadata={"protocol_identifier": TRIAL_ID},
+            gcs_xlsx_uri="",
+            status=UploadJobStatus.STARTED.value,
+        )
+
+
+def test_reconcile_iam(cidc_api, clean_db, monkeypatch):
+    """Check that the reconciler makes bucket IAM bindings match the database"""
+    setup_users(cidc_api, monkeypatch)
+
+    untouched = {"role": GOOGLE_LISTER_ROLE, "members": {"group:admins@email.com"}}
+    data_bucket = FakeBucket(
+        GOOGLE_ACL_DATA_BUCKET,
+        bindings=[
+            untouched,
+            binding(GOOGLE_LISTER_ROLE, DISABLED),
+            binding(GOOGLE_LISTER_ROLE, "deleted@email.com"),
+            binding("roles/some.otherRole", DISABLED),
+        ],
+    )
+    upload_bucket = FakeBucket(
+        GOOGLE_UPLOAD_BUCKET, bindings=[binding(GOOGLE_UPLOAD_ROLE, LISTER)]
+    )
+    uploader_intake = FakeBucket(get_intake_bucket_name(UPLOADER))
+    disabled_intake = FakeBucket(
+        get_intake_bucket_name(DISABLED),
+        bindings=[binding(GOOGLE_INTAKE_ROLE, DISABLED)],
+    )
+    mock_gcs_buckets(
+        monkeypatch, data_bucket, upload_bucket, uploader_intake, disabled_intake
+    )
+    monkeypatch.setattr(
+        gcloud_client,
+        "list_intake_bucket_names",
+        lambda: [uploader_intake.name, disabled_intake.name],
+    )
+
+    expected_changes = {
+        (GOOGLE_ACL_DATA_BUCKET, GOOGLE_LISTER_ROLE): (
+            [LISTER],
+            ["deleted@email.com", DISABLED],
+        ),
+        (GOOGLE_UPLOAD_BUCKET, GOOGLE_UPLOAD_ROLE): ([UPLOADER], [LISTER]),
+        (uploader_intake.name, GOOGLE_INTAKE_ROLE): ([UPLOADER], []),
+        (disabled_intake.name, GOOGLE_INTAKE_ROLE): ([], [DISABLED]),
+    }
+
+    # A dry run reports changes without making them
+    with cidc_api.app_context():
+        diffs = reconcile_iam(dry_run=True)
+    assert {(d.bucket, d.role): (d.to_add, d.to_remove) for d in diffs} == (
+        expected_changes
+    )
+    for bucket in [data_bucket, upload_bucket, uploader_intake, disabled_intake]:
+        assert bucket.set_iam_policy_calls == 0
+
+    # A real run makes each bucket's changes in one policy update
+    with cidc_api.app_context():
+        diffs = reconcile_iam()
+    assert {(d.bucket, d.role): (d.to_add, d.to_remove) for d in diffs} == (
+        expected_changes
+    )
+    for bucket in [data_bucket, upload_bucket, uploader_intake, disabled_intake]:
+        assert bucket.set_iam_policy_calls == 1
+
+    assert members(data_bucket, GOOGLE_LISTER_ROLE) == {
+        "group:admins@email.com",
+        f"user:{LISTER}",
+    }
+    assert untouched in data_bucket.bindings
+    assert members(data_bucket, "roles/some.otherRole") == {f"user:{DISABLED}"}
+    assert members(upload_bucket, GOOGLE_UPLOAD_ROLE) == {f"user:{UPLOADER}"}
+    assert members(uploader_intake, GOOGLE_INTAKE_ROLE) == {f"user:{UPLOADER}"}
+    assert "condition" in uploader_intake.bindings[0]
+    assert members(disabled_intake, GOOGLE_INTAKE_ROLE) == set()
+
+    # Reconciling again is a no-op
+    with cidc_api.app_context():
+        assert reconcile_iam() == []
+    assert data_bucket.set_iam_policy_calls == 1
+
+
+def test_reconcile_bucket_concurrent_change():
+    """Check that the reconciler recomputes its changes if the policy changes under it"""
+    bucket = FakeBucket("bucket", bindings=[binding(GOOGLE_LISTER_ROLE, "a@email.com")])
+    get_iam_policy = bucket.get_iam_policy
+    reads = []
+
+    def get_iam_policy_then_race(**kw):
+        policy = get_iam_policy(**kw)
+        reads.append(policy)
+        if len(reads) == 2:
+            # someone else grants b@email.com between our read and our write
+            bucket.bindings.append(binding(GOOGLE_LISTER_ROLE, "b@email.com"))
+            bucket.policy_version += 1
+        return policy
+
+    bucket.get_iam_policy = get_iam_policy_then_race
+
+    diff = reconcile_bucket(bucket, GOOGLE_LISTER_ROLE, {"c@email.com"})
+    assert diff.to_add == ["c@email.com"]
+    assert diff.to_remove == ["a@email.com"]
+    assert bucket.set_iam_policy_calls == 2
+    assert members(bucket, GOOGLE_LISTER_ROLE) == {"user:c@email.com"}
+
+
+def expiring_binding(role, email, expiry_date):
+    return {
+        **binding(role, email),
+        "condition": {
+            "title": f"{role} access",
+            "expression": f'request.time < timestamp("{expiry_date}T00:00:00Z")',
+        },
+    }
+
+
+def test_reconcile_bucket_expired_binding():
+    """Check that expired bindings don't count as access, and are renewed for active users"""
+    live = expiring_binding(GOOGLE_INTAKE_ROLE, "b@email.com", "2999-01-01")
+    bucket = FakeBucket(
+        "bucket",
+        bindings=[
+            expiring_binding(GOOGLE_INTAKE_ROLE, "a@email.com", "2020-01-01"),
+            live,
+            expiring_binding(GOOGLE_INTAKE_ROLE, "c@email.com", "2020-01-01"),
+        ],
+    )
+    desired = {"a@email.com", "b@email.com"}
+
+    diff = reconcile_bucket(bucket, GOOGLE_INTAKE_ROLE, desired, expiring=True)
+    assert diff.to_add == ["a@email.com"]
+    assert diff.to_remove == ["a@email.com", "c@email.com"]
+    assert members(bucket, GOOGLE_INTAKE_ROLE) == {
+        "user:a@email.com",
+        "user:b@email.com",
+    }
+    assert live in bucket.bindings
+    renewed = next(b for b in bucket.bindings if "user:a@email.com" in b["members"])
+    assert "2020-01-01" not in renewed["condition"]["expression"]
+
+    # The renewed binding counts as access
+    diff = reconcile_bucket(bucket, GOOGLE_INTAKE_ROLE, desired, expiring=True)
+    assert diff.to_add == diff.to_remove == []
+    assert bucket.set_iam_policy_calls == 1
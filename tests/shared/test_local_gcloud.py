@@ -0,0 +1,102 @@
+import io
+import time
+
+import pytest
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+from cidc_api.shared import gcloud_client
+from cidc_api.shared.local_gcloud import (
+    Latency,
+    LocalPublisherClient,
+    LocalStorageClient,
+)
+
+EMAIL = "user@email.com"
+
+
+@pytest.fixture
+def local_storage(tmp_path, monkeypatch):
+    client = LocalStorageClient(str(tmp_path))
+    client.create_bucket(gcloud_client.GOOGLE_ACL_DATA_BUCKET)
+    monkeypatch.setattr(gcloud_client, "_storage_client", client)
+    return client
+
+
+def test_local_blobs(local_storage):
+    """Check that local blobs can be uploaded, listed, copied and downloaded"""
+    bucket = local_storage.bucket(gcloud_client.GOOGLE_ACL_DATA_BUCKET)
+    assert bucket.exists()
+    assert bucket.get_blob("trial/wes/a.bam") is None
+
+    bucket.blob("trial/wes/a.bam").upload_from_file(io.BytesIO(b"foo"))
+    bucket.blob("trial/rna/b.bam").upload_from_string("bar")
+
+    blob = bucket.get_blob("trial/wes/a.bam")
+    assert blob.size == 3
+    assert blob.md5_hash == "rL0Y20zC+Fzt72VPzMSk2A=="
+    assert blob.download_as_string() == b"foo"
+
+    names = [b.name for b in local_storage.list_blobs(bucket.name, prefix="trial/")]
+    assert names == ["trial/rna/b.bam", "trial/wes/a.bam"]
+
+    other_bucket = local_storage.create_bucket("other")
+    copy = bucket.copy_blob(blob, other_bucket)
+    assert copy.name == blob.name
+    assert copy.md5_hash == blob.md5_hash
+    with pytest.raises(NotFound):
+        bucket.copy_blob(bucket.blob("missing"), other_bucket)
+
+
+def test_local_acl_changes(local_storage):
+    """Check that ACL changes through gcloud_client are saved on local blobs"""
+    bucket = local_storage.bucket(gcloud_client.GOOGLE_ACL_DATA_BUCKET)
+    names = [f"10021/wes/{i}.bam" for i in range(10)]
+    for name in names:
+        bucket.blob(name).upload_from_string(name)
+
+    assert sorted(gcloud_client.get_blob_names("10021", "wes")) == names
+
+    gcloud_client.grant_download_access_to_blob_names([EMAIL], names)
+    for name in names:
+        assert bucket.blob(name).acl.get_entities() == [f"user-{EMAIL}"]
+
+    gcloud_client.revoke_download_access_from_blob_names([EMAIL], names)
+    for name in names:
+        assert bucket.blob(name).acl.get_entities() == []
+
+    with pytest.raises(Exception, match="1 of 1 blobs"):
+        gcloud_client.grant_download_access_to_blob_names([EMAIL], ["missing"])
+
+
+def test_local_iam_policy(local_storage):
+    """Check that local IAM policy writes based on a stale read are rejected"""
+    bucket = local_storage.bucket(gcloud_client.GOOGLE_ACL_DATA_BUCKET)
+    policy = bucket.get_iam_policy(requested_policy_version=3)
+    stale_policy = bucket.get_iam_policy(requested_policy_version=3)
+
+    policy.bindings.append({"role": "roles/foo", "members": {f"user:{EMAIL}"}})
+    bucket.set_iam_policy(policy)
+    assert bucket.get_iam_policy().bindings == policy.bindings
+
+    with pytest.raises(PreconditionFailed):
+        bucket.set_iam_policy(stale_policy)
+
+
+def test_local_latency(tmp_path):
+    """Check that local clients wait on their configured latency"""
+    client = LocalStorageClient(str(tmp_path), latency=Latency(0.05))
+    bucket = client.create_bucket("bucket")
+    start = time.perf_counter()
+    bucket.blob("foo").upload_from_string("foo")
+    assert time.perf_counter() - start >= 0.05
+
+    publisher = LocalPublisherClient(latency=Latency(0.05))
+    start = time.perf_counter()
+    report = publisher.publish("topic", b"message")
+    assert time.perf_counter() - start < 0.05
+    assert report.result() == "1"
+    assert time.perf_counter() - start >= 0.05
+    assert publisher.topic_queue("topic").get_nowait() == b"message"
+
+    with pytest.raises(TypeError):
+        publisher.publish("topic", "not bytes")
@@ -0,0 +1,96 @@
+import time
+from concurrent.futures import Future
+from unittest.mock import MagicMock
+
+from cidc_api.models import OutboxMessages
+from cidc_api.shared import gcloud_client, outbox
+
+
+def test_outbox_writer(cidc_api, clean_db):
+    """Check that outbox messages are committed or rolled back with their transaction"""
+    with cidc_api.app_context():
+        write = OutboxMessages.writer(clean_db)
+
+        gcloud_client.publish_upload_success(1, outbox=write)
+        clean_db.rollback()
+        assert clean_db.query(OutboxMessages).count() == 0
+
+        gcloud_client.publish_upload_success(2, outbox=write)
+        clean_db.commit()
+        message = clean_db.query(OutboxMessages).one()
+        assert message.topic == gcloud_client.GOOGLE_UPLOAD_TOPIC
+        assert message.data == "2"
+        assert message.attempts == 0
+
+
+def test_dispatch_pending(cidc_api, clean_db, monkeypatch):
+    """Check that dispatching deletes published messages and reschedules failures"""
+    with cidc_api.app_context():
+        write = OutboxMessages.writer(clean_db)
+        for i in range(3):
+            write(str(i), "some-topic")
+        clean_db.commit()
+
+        def fake_publish(content, topic):
+            if content == "2":
+                raise Exception("couldn't connect")
+            report = Future()
+            if content == "1":
+                report.set_exception(Exception("publish failed"))
+            else:
+                report.set_result("message-id")
+            return report
+
+        _encode_and_publish = MagicMock(side_effect=fake_publish)
+        monkeypatch.setattr(gcloud_client, "_encode_and_publish", _encode_and_publish)
+
+        assert outbox.dispatch_pending(clean_db) == 3
+        assert _encode_and_publish.call_count == 3
+
+        failed = clean_db.query(OutboxMessages).order_by(OutboxMessages.data).all()
+        assert [m.data for m in failed] == ["1", "2"]
+        assert [m.last_error for m in failed] == ["publish failed", "couldn't connect"]
+        for message in failed:
+            assert message.attempts == 1
+            assert message.available_at > message._created
+
+        # Failed messages aren't retried until their backoff has elapsed
+        _encode_and_publish.reset_mock()
+        assert outbox.dispatch_pending(clean_db) == 0
+        _encode_and_publish.assert_not_called()
+
+
+def test_dispatch_pending_timeout(cidc_api, clean_db, monkeypatch):
+    """Check that a batch waits on Pub/Sub for one timeout in total, not one per message"""
+    monkeypatch.setattr(outbox, "PUBLISH_TIMEOUT_SECONDS", 0.5)
+    with cidc_api.app_context():
+        write = OutboxMessages.writer(clean_db)
+        for i in range(5):
+            write(str(i), "some-topic")
+        clean_db.commit()
+
+        # Pub/Sub never acknowledges anything
+        monkeypatch.setattr(
+            gcloud_client, "_encode_and_publish", lambda content, topic: Future()
+        )
+
+        start = time.monotonic()
+        assert outbox.dispatch_pending(clean_db) == 5
+        assert time.monotonic() - start < 1.5
+
+        stalled = clean_db.query(OutboxMessages).all()
+        assert len(stalled) == 5
+        assert all(message.attempts == 1 for message in stalled)
+
+
+def test_dispatcher_wakes_on_commit(cidc_api, clean_db, monkeypatch):
+    """Check that committing staged messages wakes this process's dispatcher"""
+    dispatcher = MagicMock()
+    monkeypatch.setattr(outbox, "_dispatcher", dispatcher)
+    with cidc_api.app_context():
+        clean_db.commit()
+        dispatcher.wake.assert_not_called()
+
+        OutboxMessages.writer(clean_db)("foo", "some-topic")
+        clean_db.commit()
+        dispatcher.wake.assert_called_once()
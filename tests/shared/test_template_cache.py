@@ -0,0 +1,61 @@
+import os
+
+from cidc_schemas import prism
+
+from cidc_api.shared import template_cache
+from cidc_api.shared.template_cache import TemplateCache, build_template_cache
+
+
+def test_build_template_cache(tmp_path, monkeypatch):
+    """Check that build_template_cache generates every supported template"""
+    monkeypatch.setattr(prism, "SUPPORTED_TEMPLATES", ["pbmc", "olink"])
+    templates_dir = tmp_path / "templates"
+    # Templates workers generated meanwhile are replaced, without removing the directory
+    worker_path = templates_dir / "manifests" / "pbmc_template.xlsx"
+    worker_path.parent.mkdir(parents=True)
+    worker_path.write_bytes(b"foo")
+
+    assert build_template_cache(str(templates_dir), max_workers=2) == 2
+    assert worker_path.read_bytes() != b"foo"
+    assert (templates_dir / "metadata" / "olink_template.xlsx").exists()
+    # The temporary build directory is cleaned up
+    assert os.listdir(tmp_path) == ["templates"]
+
+
+def test_template_cache(tmp_path, monkeypatch):
+    """Check that TemplateCache loads, generates and caches templates"""
+    generated = []
+
+    def generate_template(template_family, template_type):
+        generated.append((template_family, template_type))
+        return b"generated" if template_type == "pbmc" else None
+
+    monkeypatch.setattr(template_cache, "generate_template", generate_template)
+
+    # Prebuilt templates are loaded rather than generated
+    prebuilt_path = tmp_path / "metadata" / "olink_template.xlsx"
+    prebuilt_path.parent.mkdir()
+    prebuilt_path.write_bytes(b"prebuilt")
+
+    cache = TemplateCache(str(tmp_path))
+    olink = cache.get("metadata", "olink")
+    assert olink.data == b"prebuilt"
+    assert generated == []
+
+    # Missing templates are generated, and shared through the templates directory
+    pbmc = cache.get("manifests", "pbmc")
+    assert pbmc.data == b"generated"
+    assert generated == [("manifests", "pbmc")]
+    assert (tmp_path / "manifests" / "pbmc_template.xlsx").read_bytes() == pbmc.data
+    assert TemplateCache(str(tmp_path)).get("manifests", "pbmc") == pbmc
+
+    # Templates are held in memory once loaded
+    os.remove(prebuilt_path)
+    assert cache.get("metadata", "olink") is olink
+    assert cache.get("manifests", "pbmc") is pbmc
+    assert generated == [("manifests", "pbmc")]
+
+    # Nonexistent templates aren't cached
+    assert cache.get("manifests", "foo") is None
+    assert cache.get("manifests", "foo") is None
+    assert generated[1:] == [("manifests", "foo"), ("manifests", "foo")]
@@ -0,0 +1,35 @@
+from cidc_api.shared import upload_status
+from cidc_api.shared.upload_status import (
+    UploadStatusListener,
+    get_upload_status_listener,
+)
+
+
+def test_upload_status_listener(cidc_api, monkeypatch):
+    """Check that UploadStatusListener wakes the requests watching an upload job"""
+    listener = UploadStatusListener(cidc_api)
+
+    # The listener is only used once it's connected
+    monkeypatch.setattr(upload_status, "_listener", None)
+    assert get_upload_status_listener() is None
+    monkeypatch.setattr(upload_status, "_listener", listener)
+    assert get_upload_status_listener() is None
+    listener.connected.set()
+    assert get_upload_status_listener() is listener
+
+    with listener.watch(1) as changed1, listener.watch(1) as also_changed1:
+        with listener.watch(2) as changed2:
+            listener.notify(1)
+            assert changed1.is_set() and also_changed1.is_set()
+            assert not changed2.is_set()
+
+            # Notifications for jobs no one is watching are ignored
+            listener.notify(3)
+            assert not changed2.is_set()
+
+            # After reconnecting, everything is woken to check for missed changes
+            listener._notify_all()
+            assert changed2.is_set()
+
+    # Watches are removed once they're finished with
+    assert listener._waiters == {}
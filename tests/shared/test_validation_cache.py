@@ -0,0 +1,57 @@
+import io
+import hashlib
+
+from cidc_api.shared import validation_cache as validation_cache_module
+from cidc_api.shared.validation_cache import (
+    CachedValidation,
+    ValidationCache,
+    hash_xlsx,
+)
+
+
+def test_hash_xlsx():
+    """Check that hash_xlsx hashes the whole file and leaves it at its start"""
+    xlsx_file = io.BytesIO(b"foobar")
+    xlsx_file.seek(3)
+    assert hash_xlsx(xlsx_file) == hashlib.sha256(b"foobar").hexdigest()
+    assert xlsx_file.read() == b"foobar"
+
+
+def test_validation_cache(monkeypatch):
+    """Check that ValidationCache caches, copies, expires and evicts validations"""
+    now = 0
+    monkeypatch.setattr(validation_cache_module.time, "monotonic", lambda: now)
+
+    cache = ValidationCache(max_entries=2, ttl=60)
+    entry = CachedValidation({"Samples": []}, {"protocol_identifier": "foo"}, [], [])
+    cache.put("hash1", "pbmc", entry)
+
+    # Entries are keyed by spreadsheet hash and template type
+    assert cache.get("hash1", "pbmc") == entry
+    assert cache.get("hash1", "olink") is None
+    assert cache.get("hash2", "pbmc") is None
+
+    # Modifying a cached patch doesn't modify the cache
+    cache.get("hash1", "pbmc").md_patch["protocol_identifier"] = "bar"
+    assert cache.get("hash1", "pbmc").md_patch == {"protocol_identifier": "foo"}
+
+    # Merge results can be added to an entry
+    merged = entry._replace(trial_etag="etag", merge_errors=["collision"])
+    cache.put("hash1", "pbmc", merged)
+    assert cache.get("hash1", "pbmc") == merged
+
+    # The least recently used entry is evicted once the cache is full
+    cache.put("hash2", "pbmc", entry)
+    cache.get("hash1", "pbmc")
+    cache.put("hash3", "pbmc", entry)
+    assert cache.get("hash2", "pbmc") is None
+    assert cache.get("hash1", "pbmc") == merged
+
+    # Entries expire
+    now = 61
+    assert cache.get("hash1", "pbmc") is None
+    assert cache.get("hash3", "pbmc") is None
+
+    cache.put("hash1", "pbmc", entry)
+    cache.clear()
+    assert cache.get("hash1", "pbmc") is None
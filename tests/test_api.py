@@ -429,10 +429,13 @@ def test_endpoint_urls(cidc_api):
         "/",
         "/admin/test_csms",
         "/admin/load_from_blobs",
+        "/admin/reconcile_iam",
         "/downloadable_files/",
         "/downloadable_files/filelist",
         "/downloadable_files/compressed_batch",
+        "/downloadable_files/compressed_batch/<int:bundle_job>",
         "/downloadable_files/download_url",
+        "/downloadable_files/download_urls",
         "/downloadable_files/filter_facets",
         "/downloadable_files/<int:downloadable_file>",
         "/downloadable_files/<int:downloadable_file>/related_files",
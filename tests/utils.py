@@ -1,6 +1,9 @@
 """Shortcuts that are useful across API tests."""
 from unittest.mock import MagicMock
 
+from google.api_core.exceptions import PreconditionFailed
+from google.api_core.iam import Policy
+
 from cidc_api.models import Users, CIDCRole
 
 
@@ -62,3 +65,65 @@ def mock_gcloud_client(monkeypatch) -> MagicMock:
     )
 
     return gcloud_client
+
+
+class FakeBlob:
+    """An in-process stand-in for `google.cloud.storage.Blob`."""
+
+    def __init__(self, bucket: "FakeBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+
+    def download_to_filename(self, filename: str):
+        with open(filename, "wb") as f:
+            f.write(self.bucket.objects[self.name])
+
+    def upload_from_filename(self, filename: str):
+        with open(filename, "rb") as f:
+            self.bucket.objects[self.name] = f.read()
+
+
+class FakeBucket:
+    """
+    An in-process stand-in for `google.cloud.storage.Bucket`, backed by a dict.
+    Its IAM policy behaves like GCS's: writes with a stale etag are rejected.
+    """
+
+    def __init__(self, name: str, objects: dict = None, bindings: list = None):
+        self.name = name
+        self.objects = dict(objects or {})
+        self.policy_version = 0
+        self.bindings = [dict(b) for b in bindings or []]
+        self.set_iam_policy_calls = 0
+
+    def exists(self) -> bool:
+        return True
+
+    def get_iam_policy(self, requested_policy_version: int = None) -> Policy:
+        policy = Policy(etag=str(self.policy_version), version=3)
+        policy.bindings = [{**b, "members": set(b["members"])} for b in self.bindings]
+        return policy
+
+    def set_iam_policy(self, policy: Policy) -> Policy:
+        self.set_iam_policy_calls += 1
+        if policy.etag != str(self.policy_version):
+            raise PreconditionFailed(f"stale etag for {self.name} IAM policy")
+        self.bindings = [{**b, "members": set(b["members"])} for b in policy.bindings]
+        self.policy_version += 1
+        return policy
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self, name)
+
+    def get_blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self, name) if name in self.objects else None
+
+
+def mock_gcs_buckets(monkeypatch, *buckets: FakeBucket):
+    """Make `gcloud_client._get_bucket` return the given fake buckets by name."""
+    by_name = {b.name: b for b in buckets}
+    monkeypatch.setattr(
+        "cidc_api.shared.gcloud_client._get_bucket",
+        lambda name: by_name.setdefault(name, FakeBucket(name)),
+    )
+    return by_name